@@ -1,10 +1,11 @@
 import os
+from contextlib import asynccontextmanager
 from typing import Optional, Dict
 from pathlib import Path
 
 from fastapi import FastAPI, Request, Query, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
@@ -15,14 +16,43 @@ from slowapi.util import get_remote_address
 import httpx
 
 # serviços locais
-from .services.regions import load_regions_geojson
+from .services.http_pool import start_http_pool, close_http_pool
+from .services.nominatim_scheduler import nominatim_scheduler
+from .services.ibge_catalog import (
+    catalog_info,
+    catalog_version,
+    ensure_ibge_catalog,
+    list_municipalities,
+    list_states as ibge_states,
+    load_gazetteer,
+    load_ibge_catalog,
+    lookup_municipality,
+)
+from .services.regions import load_regions, regions_payload, regions_tag
+from .services.risk_areas import get_risk_areas_geojson, load_risk_areas
+from .services.tiles import LAYERS as TILE_LAYERS, TILE_MAX_AGE, render_tile, tile_cache_stats
+from .services.geocode_store import geocode_store
+from .services.district_jobs import district_jobs
 from .services.geocode import (
+    _normalize,
     nominatim_lookup,
     nominatim_lookup_states,
     nominatim_lookup_structured_city_uf,
 )
-from .services.weather_client import fetch_hourly_forecast
-from .utils.risk_engine import compute_risk
+from .services.weather_client import (
+    OPEN_METEO_MAX_DAYS,
+    fetch_hourly_forecast,
+    forecast_cell,
+    forecast_flight_stats,
+    forecast_status,
+)
+from .services.forecast_warmer import forecast_warmer
+from .services.uf_risk import RISK_UF_DEADLINE_S, compute_uf_risk, iter_uf_risk
+from .utils.compression import compressed_response, compression_info
+from .utils.conditional import make_etag, not_modified, with_validators
+from .utils.json_cache import encode_json, encoded_cache, json_bytes_response
+from .utils.streaming import streaming_response
+from .utils.risk_engine import compute_risk, compute_risk_timeline
 
 # ---------------------------------------------------------------------
 # Config
@@ -30,16 +60,44 @@ from .utils.risk_engine import compute_risk
 HOST = os.getenv("HOST", "0.0.0.0")
 PORT = int(os.getenv("PORT", "8000"))
 RATE_LIMIT = os.getenv("RATE_LIMIT", "60/minute")
+# Cache-Control (s) das respostas com ETag: geometrias quase nunca mudam; o risco
+# muda a cada atualização da previsão (o cliente revalida com If-None-Match)
+REGIONS_MAX_AGE_S = int(os.getenv("REGIONS_MAX_AGE_S", "86400"))
+RISK_MAX_AGE_S = int(os.getenv("RISK_MAX_AGE_S", "60"))
+REGIONS_CACHE_CONTROL = f"public, max-age={REGIONS_MAX_AGE_S}"
+RISK_CACHE_CONTROL = f"public, max-age={RISK_MAX_AGE_S}, must-revalidate"
 
 limiter = Limiter(key_func=get_remote_address, default_limits=[])
 
-app = FastAPI(title="AlagAlert API", version="0.7.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Um cliente HTTP (pool keep-alive) por host upstream, reutilizado por todos os serviços
+    start_http_pool()
+    load_gazetteer()
+    load_ibge_catalog()
+    load_regions()
+    load_risk_areas()
+    geocode_store.purge_expired()
+    # Atualiza em segundo plano as previsões mais acessadas antes de vencerem
+    forecast_warmer.start()
+    # Geocodificação de bairros em segundo plano (fila persistente)
+    district_jobs.start()
+    try:
+        yield
+    finally:
+        await district_jobs.stop()
+        await forecast_warmer.stop()
+        await nominatim_scheduler.stop()
+        await close_http_pool()
+        geocode_store.close()
+
+
+# orjson em todas as respostas (mais rápido que o json da stdlib em GeoJSON grande)
+app = FastAPI(title="AlagAlert API", version="0.7.0", lifespan=lifespan, default_response_class=ORJSONResponse)
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
-# Cache simples para coordenadas por cidade/UF (evita repetir geocodificações no Nominatim)
-CITY_COORD_CACHE: Dict[str, Dict[str, float]] = {}
-
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -62,7 +120,16 @@ class RiskBody(BaseModel):
 @app.get("/health")
 @limiter.limit(RATE_LIMIT)
 def health(request: Request):
-    return JSONResponse({"ok": True})
+    return ORJSONResponse({
+        "ok": True,
+        "forecast_singleflight": forecast_flight_stats(),
+        "forecast_warmer": dict(forecast_warmer.stats),
+        "ibge_catalog": catalog_info(),
+        "encoded_cache": dict(encoded_cache.stats),
+        "tiles": tile_cache_stats(),
+        "compression": compression_info(),
+        "district_jobs": district_jobs.info(),
+    })
 
 # ---------------------------------------------------------------------
 # Geocode (cidades)
@@ -113,7 +180,7 @@ async def geocode_states(
     results = await nominatim_lookup_states(query=q, country=country or None, limit=limit)
     if not results:
         raise HTTPException(404, detail="Nenhum estado encontrado")
-    return JSONResponse(results)
+    return ORJSONResponse(results)
 
 # ---------------------------------------------------------------------
 # IBGE – estados e cidades
@@ -121,16 +188,16 @@ async def geocode_states(
 @app.get("/states")
 @limiter.limit(RATE_LIMIT)
 async def list_states(request: Request):
-    url = "https://servicodados.ibge.gov.br/api/v1/localidades/estados"
+    # Catálogo IBGE em memória (carregado uma vez, revalidado em segundo plano)
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            r = await client.get(url)
-            r.raise_for_status()
-            data = r.json()
-            data = sorted(data, key=lambda x: x.get("nome", ""))
-            return [{"sigla": uf["sigla"], "nome": uf["nome"]} for uf in data]
-    except httpx.HTTPError as e:
+        await ensure_ibge_catalog()
+    except (httpx.HTTPError, ValueError) as e:
         raise HTTPException(502, detail=f"Falha IBGE estados: {e}")
+    payload = encoded_cache.get_or_encode(
+        ("states", catalog_version()),
+        lambda: [{"sigla": uf["sigla"], "nome": uf["nome"]} for uf in ibge_states()],
+    )
+    return json_bytes_response(payload)
 
 @app.get("/cities")
 @limiter.limit(RATE_LIMIT)
@@ -139,16 +206,15 @@ async def list_cities_by_state(
     uf: str = Query(..., min_length=2, max_length=2),
 ):
     uf = uf.upper()
-    url = f"https://servicodados.ibge.gov.br/api/v1/localidades/estados/{uf}/municipios"
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            r = await client.get(url)
-            r.raise_for_status()
-            data = r.json()
-            data = sorted(data, key=lambda x: x.get("nome", ""))
-            return [{"nome": m["nome"]} for m in data]
-    except httpx.HTTPError as e:
+        await ensure_ibge_catalog()
+    except (httpx.HTTPError, ValueError) as e:
         raise HTTPException(502, detail=f"Falha IBGE municípios: {e}")
+    payload = encoded_cache.get_or_encode(
+        ("cities", uf, catalog_version()),
+        lambda: [{"nome": m["nome"]} for m in list_municipalities(uf)],
+    )
+    return json_bytes_response(payload)
 
 # ---------------------------------------------------------------------
 # Risco por cidade
@@ -161,15 +227,23 @@ async def risk_by_city(
     city: str = Query(..., min_length=1),
     forecast_days: int = Query(1, ge=1, le=7, description="Número de dias de previsão (1-7)"),
     date: Optional[str] = Query(None, description="Filtrar por data (YYYY-MM-DD)"),
+    timeline: bool = Query(False, description="Incluir a série de risco hora a hora em todo o horizonte da previsão (janela móvel de 6h)"),
 ):
     uf = uf.upper()
     city_clean = city.strip()
-    cache_key = f"{city_clean.lower()}|{uf.lower()}"
+    # Cache persistente de coordenadas por cidade/UF (evita repetir geocodificações no Nominatim)
+    cache_key = f"{_normalize(city_clean)}|{uf.lower()}"
 
     lat: Optional[float] = None
     lon: Optional[float] = None
 
-    cached = CITY_COORD_CACHE.get(cache_key)
+    # Gazetteer local (catálogo IBGE com coordenadas) primeiro; Nominatim só quando o município não é encontrado
+    known = lookup_municipality(city_clean, uf)
+    if known:
+        lat = known["lat"]
+        lon = known["lon"]
+
+    cached = (await geocode_store.aget("city", cache_key))[1] if lat is None else None
     if cached:
         lat = cached.get("lat")
         lon = cached.get("lon")
@@ -201,7 +275,7 @@ async def risk_by_city(
         if nomi:
             lat = float(nomi[0]["lat"])
             lon = float(nomi[0]["lon"])
-            CITY_COORD_CACHE[cache_key] = {"lat": lat, "lon": lon}
+            await geocode_store.aset("city", cache_key, {"lat": lat, "lon": lon})
 
     if lat is None or lon is None:
         from .services.neighborhood_weather import KNOWN_NEIGHBORHOODS
@@ -220,32 +294,57 @@ async def risk_by_city(
             if valid_points:
                 lat = sum(lat_ for lat_, _ in valid_points) / len(valid_points)
                 lon = sum(lon_ for _, lon_ in valid_points) / len(valid_points)
-                CITY_COORD_CACHE[cache_key] = {"lat": lat, "lon": lon}
+                await geocode_store.aset("city", cache_key, {"lat": lat, "lon": lon})
 
     if lat is None or lon is None:
         raise HTTPException(503, detail="Geocodificação indisponível no momento. Tente novamente em instantes.")
 
-    hourly = await fetch_hourly_forecast(lat=lat, lon=lon, forecast_days=forecast_days)
-
-    # Filtra por data se especificado
-    if date:
-        from .services.weather_client import filter_forecast_by_date
-        hourly = filter_forecast_by_date(hourly, date)
+    # Fatia do horizonte cacheado; com date, só as horas desse dia (índice por dia)
+    hourly = await fetch_hourly_forecast(lat=lat, lon=lon, forecast_days=forecast_days, date=date)
+    status = forecast_status(hourly)
+    # série sobre o horizonte inteiro: mesma entrada do cache, nenhuma chamada extra ao Open-Meteo
+    horizon = await fetch_hourly_forecast(lat=lat, lon=lon, forecast_days=OPEN_METEO_MAX_DAYS) if timeline else None
+
+    # ETag = conteúdo da previsão + parâmetros: sem mudança, 304 antes de calcular o risco
+    etag, cache_control = None, "no-store"
+    if status["status"] != "unavailable":
+        etag = make_etag(
+            "risk/by-city", uf, city, lat, lon, hourly.fingerprint(),
+            horizon.fingerprint() if horizon is not None else None, status["status"],
+        )
+        cache_control = RISK_CACHE_CONTROL
+    cached_response = not_modified(request, etag, cache_control)
+    if cached_response is not None:
+        return cached_response
 
     result = compute_risk(hourly)
+    if horizon is not None:
+        result["timeline"] = compute_risk_timeline(horizon)
     result["location"] = {"uf": uf, "city": city, "lat": lat, "lon": lon}
-    return JSONResponse(result)
+    result["forecast_cell"] = forecast_cell(lat, lon)
+    result["forecast_status"] = status
+    return with_validators(ORJSONResponse(result), etag, cache_control)
 
 # ---------------------------------------------------------------------
 # Risco por coordenadas
 # ---------------------------------------------------------------------
 @app.post("/risk")
 @limiter.limit(RATE_LIMIT)
-async def risk_by_coords(request: Request, body: RiskBody):
+async def risk_by_coords(
+    request: Request,
+    body: RiskBody,
+    timeline: bool = Query(False, description="Incluir a série de risco hora a hora em todo o horizonte da previsão (janela móvel de 6h)"),
+):
     hourly = await fetch_hourly_forecast(lat=body.lat, lon=body.lon)
     result = compute_risk(hourly)
+    if timeline:
+        # horizonte inteiro da mesma entrada do cache
+        horizon = await fetch_hourly_forecast(lat=body.lat, lon=body.lon, forecast_days=OPEN_METEO_MAX_DAYS)
+        result["timeline"] = compute_risk_timeline(horizon)
     result["location"] = {"lat": body.lat, "lon": body.lon}
-    return JSONResponse(result)
+    result["forecast_cell"] = forecast_cell(body.lat, body.lon)
+    result["forecast_status"] = forecast_status(hourly)
+    return ORJSONResponse(result)
 
 # ---------------------------------------------------------------------
 # Risco por UF (para mapa)
@@ -255,42 +354,41 @@ async def risk_by_coords(request: Request, body: RiskBody):
 async def risk_by_uf(
     request: Request,
     uf: str = Query(..., min_length=2, max_length=2),
+    mode: str = Query("concurrent", pattern="^(concurrent|sequential)$"),
+    deadline: float = Query(
+        RISK_UF_DEADLINE_S, gt=0, le=120, description="Prazo em segundos; ao estourar retorna resultado parcial"
+    ),
+    stream: Optional[str] = Query(
+        None, pattern="^(ndjson|sse)$", description="Envia cada município assim que fica pronto (NDJSON ou SSE)"
+    ),
 ):
+    """
+    Risco de todos os municípios da UF.
+
+    Em mode=concurrent geocodificação e previsão rodam em paralelo (com limites
+    próprios); mode=sequential processa um município por vez. Se o prazo estourar,
+    a resposta traz "complete": false com os resultados já calculados, e as
+    falhas por município aparecem em "failures".
+
+    Com stream=ndjson|sse cada município sai assim que é calculado
+    ({"type": "result"|"failure", ...}, em ordem de conclusão), terminando com
+    {"type": "summary", ...} (contagens, "complete" e "pending").
+    """
     uf = uf.upper()
-    url = f"https://servicodados.ibge.gov.br/api/v1/localidades/estados/{uf}/municipios"
     try:
-        async with httpx.AsyncClient(timeout=20) as client:
-            r = await client.get(url)
-            r.raise_for_status()
-            cities = r.json()
-    except httpx.HTTPError as e:
+        await ensure_ibge_catalog()
+    except (httpx.HTTPError, ValueError) as e:
         raise HTTPException(502, detail=f"Falha IBGE: {e}")
 
-    out = []
-    for c in cities:
-        name = c.get("nome")
-        if not name:
-            continue
-        try:
-            nomi = await nominatim_lookup(
-                query=f"{name}, {uf}, Brasil",
-                country="br",
-                limit=1,
-                cities_only=True,
-            )
-            if not nomi:
-                continue
-            lat = float(nomi[0]["lat"])
-            lon = float(nomi[0]["lon"])
-            hourly = await fetch_hourly_forecast(lat=lat, lon=lon)
-            risk = compute_risk(hourly).get("risk_level")
-            out.append({"city": name, "uf": uf, "lat": lat, "lon": lon, "risk": risk})
-        except Exception:
-            continue
-
-    if not out:
+    names = [c["nome"] for c in list_municipalities(uf)]
+    if not names:
         raise HTTPException(404, detail=f"Nenhum município encontrado para {uf}")
-    return JSONResponse(out)
+
+    limits = {"geocode_concurrency": 1, "weather_concurrency": 1} if mode == "sequential" else {}
+    if stream:
+        return streaming_response(iter_uf_risk(uf, names, deadline_s=deadline, **limits), stream)
+    out = await compute_uf_risk(uf, names, deadline_s=deadline, **limits)
+    return ORJSONResponse(out)
 
 # ---------------------------------------------------------------------
 # Regions (GeoJSON)
@@ -301,14 +399,52 @@ async def regions(
     request: Request,
     level: str = Query(..., pattern="^(state|city)$"),
     uf: Optional[str] = Query(None, min_length=2, max_length=2),
+    zoom: Optional[int] = Query(None, ge=0, le=22, description="Zoom do mapa (geometria simplificada para o nível)"),
 ):
+    # Partições por UF carregadas no startup e já codificadas em JSON
+    uf = uf.upper() if uf else None
     try:
-        gj = load_regions_geojson(level=level, uf=(uf.upper() if uf else None))
-        if gj is None:
-            raise HTTPException(404, detail="GeoJSON não disponível")
-        return JSONResponse(gj)
+        # ETag pelo digest do GeoStore: revalidação sem montar o corpo
+        tag = regions_tag(level=level, uf=uf, zoom=zoom)
+        etag = make_etag("regions", *tag) if tag is not None else None
+        cached_response = not_modified(request, etag, REGIONS_CACHE_CONTROL)
+        if cached_response is not None:
+            return cached_response
+        payload = regions_payload(level=level, uf=uf, zoom=zoom)
     except Exception as e:
         raise HTTPException(500, detail=f"Erro ao carregar regiões: {e}")
+    if payload is None:
+        raise HTTPException(404, detail="GeoJSON não disponível")
+    # partições quase nunca mudam: comprimidas uma vez e cacheadas
+    response = compressed_response(request, payload, "application/json", static=True)
+    return with_validators(response, etag, REGIONS_CACHE_CONTROL)
+
+# ---------------------------------------------------------------------
+# Tiles GeoJSON (XYZ) de regiões e áreas de risco
+# ---------------------------------------------------------------------
+# Sem rate limit: o mapa pede dezenas de tiles a cada movimento, e eles saem do cache
+@app.get("/tiles/{layer}/{z}/{x}/{y}")
+async def tiles(request: Request, layer: str, z: int, x: int, y: int):
+    """
+    Tile GeoJSON (FeatureCollection) recortado e simplificado para o zoom.
+
+    Camadas: states, cities, risk. Coordenadas XYZ (Web Mercator, 256 px).
+    """
+    if layer not in TILE_LAYERS:
+        raise HTTPException(404, detail=f"Camada desconhecida: {layer}")
+    if not (0 <= z <= 22) or not (0 <= x < 2 ** z) or not (0 <= y < 2 ** z):
+        raise HTTPException(404, detail="Tile fora da grade")
+    try:
+        payload = await render_tile(layer, z, x, y)
+    except Exception as e:
+        raise HTTPException(500, detail=f"Erro ao gerar tile: {e}")
+    return compressed_response(
+        request,
+        payload,
+        "application/geo+json",
+        static=True,
+        headers={"Cache-Control": f"public, max-age={TILE_MAX_AGE[layer]}"},
+    )
 
 # ---------------------------------------------------------------------
 # Áreas de risco (GeoJSON) - filtrável por dia e intensidade
@@ -333,7 +469,11 @@ async def risk_areas(
         None,
         ge=1,
         le=20,
-        description="Nível de zoom (simplifica para zoom < 12)",
+        description="Nível de zoom do mapa (escolhe o nível de detalhe das geometrias)",
+    ),
+    bbox: Optional[str] = Query(
+        None,
+        description="Caixa min_lon,min_lat,max_lon,max_lat (substitui o filtro por raio)",
     ),
 ):
     """
@@ -344,23 +484,31 @@ async def risk_areas(
     - radius: raio em km
     - risk_level: low, medium ou high
     - date: data de previsão (afeta o risco calculado)
-    - zoom: se < 12, retorna versão simplificada
+    - zoom: geometrias simplificadas para o zoom (áreas menores que 2 px viram pontos)
+    - bbox: áreas que intersectam a caixa, em vez das que estão a até radius km
     """
-    try:
-        from .services.risk_areas import get_risk_areas_geojson, get_simplified_risk_areas
-
-        if zoom and zoom < 12:
-            gj = get_simplified_risk_areas(lat=lat, lon=lon, zoom_level=zoom)
-        else:
-            gj = get_risk_areas_geojson(
-                lat=lat,
-                lon=lon,
-                radius_km=radius,
-                risk_level=risk_level,
-                date=date,
-            )
+    box = None
+    if bbox:
+        try:
+            box = tuple(float(v) for v in bbox.split(","))
+        except ValueError:
+            box = ()
+        if len(box) != 4 or box[0] > box[2] or box[1] > box[3]:
+            raise HTTPException(422, detail="bbox deve ser min_lon,min_lat,max_lon,max_lat")
 
-        return JSONResponse(gj)
+    try:
+        gj = get_risk_areas_geojson(
+            lat=lat,
+            lon=lon,
+            radius_km=radius,
+            risk_level=risk_level,
+            date=date,
+            bbox=box,
+            zoom=zoom,
+        )
+        # corpo por consulta (lat/lon/raio/bbox do mapa quase nunca se repetem):
+        # codificado e comprimido a cada requisição, fora dos caches de corpos
+        return compressed_response(request, encode_json(gj), ORJSONResponse.media_type)
     except Exception as e:
         raise HTTPException(500, detail=f"Erro ao carregar áreas de risco: {e}")
 
@@ -379,6 +527,9 @@ async def risk_neighborhoods(
         pattern="^(low|medium|high)$",
         description="Filtro por nível de risco",
     ),
+    stream: Optional[str] = Query(
+        None, pattern="^(ndjson|sse)$", description="Envia cada bairro assim que fica pronto (NDJSON ou SSE)"
+    ),
 ):
     """
     Retorna GeoJSON com bairros e previsão de chuva REAL do Open-Meteo.
@@ -388,21 +539,43 @@ async def risk_neighborhoods(
     - Laranja (médio): 10-20mm de chuva
     - Vermelho (alto): > 20mm de chuva
 
+    Com stream=ndjson|sse cada Feature sai assim que a previsão do seu bloco
+    chega, terminando com {"type": "summary", ...metadata}.
+
     Exemplo: GET /risk/neighborhoods?city=São Paulo&uf=SP&forecast_days=1
     """
-    try:
-        from .services.neighborhood_weather import get_neighborhoods_with_weather
+    if stream:
+        from .services.neighborhood_weather import iter_neighborhoods_with_weather
 
-        gj = await get_neighborhoods_with_weather(
+        records = iter_neighborhoods_with_weather(
             city=city,
             uf=uf.upper(),
             forecast_days=forecast_days,
             risk_level=risk_level,
         )
+        return streaming_response(records, stream)
 
-        return JSONResponse(gj)
+    try:
+        from .services.neighborhood_weather import load_neighborhoods, neighborhoods_version, render_neighborhoods
+
+        loaded = await load_neighborhoods(city=city, uf=uf.upper(), forecast_days=forecast_days)
+    except Exception as e:
+        raise HTTPException(500, detail=f"Erro ao carregar bairros: {e}")
+
+    # ETag pelos bairros, pelo progresso da geocodificação e pela previsão de
+    # cada bairro, antes de resumir a chuva e montar as Features; resultado
+    # parcial (fila em andamento) sempre revalida
+    etag = make_etag("risk/neighborhoods", neighborhoods_version(loaded, risk_level))
+    cache_control = "no-cache" if loaded["partial"] else RISK_CACHE_CONTROL
+    cached_response = not_modified(request, etag, cache_control)
+    if cached_response is not None:
+        return cached_response
+    try:
+        gj = render_neighborhoods(loaded, risk_level)
     except Exception as e:
         raise HTTPException(500, detail=f"Erro ao carregar bairros: {e}")
+    response = compressed_response(request, encode_json(gj), ORJSONResponse.media_type)
+    return with_validators(response, etag, cache_control)
 
 # ---------------------------------------------------------------------
 # Servir Flutter Web na raiz
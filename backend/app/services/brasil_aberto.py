@@ -5,9 +5,15 @@ Busca bairros (districts) de cidades brasileiras
 
 import os
 import httpx
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from dotenv import load_dotenv
 
+from .geocode import _normalize, _nominatim_get
+from .geocode_store import geocode_store
+from .http_pool import get_client
+from .ibge_catalog import ensure_ibge_catalog, find_municipality
+from .nominatim_scheduler import PRIORITY_BACKGROUND
+
 # Carrega variáveis do arquivo .env
 load_dotenv()
 
@@ -47,35 +53,21 @@ class BrasilAbertoService:
         Returns:
             Código IBGE da cidade ou None se não encontrado
         """
-        url = f"https://servicodados.ibge.gov.br/api/v1/localidades/estados/{uf.upper()}/municipios"
-
         try:
-            async with httpx.AsyncClient(timeout=10) as client:
-                response = await client.get(url)
-                response.raise_for_status()
-                cities = response.json()
-
-                # Busca exata
-                for city in cities:
-                    if city.get("nome", "").lower() == city_name.lower():
-                        # O IBGE retorna o id como número inteiro
-                        ibge_code = str(city.get("id"))
-                        print(f"✅ Código IBGE encontrado: {ibge_code} para {city.get('nome')}/{uf}")
-                        return ibge_code
-
-                # Se não encontrou exato, busca parcial
-                for city in cities:
-                    if city_name.lower() in city.get("nome", "").lower():
-                        ibge_code = str(city.get("id"))
-                        print(f"✅ Código IBGE encontrado (busca parcial): {ibge_code} para {city.get('nome')}/{uf}")
-                        return ibge_code
-
-                print(f"❌ Cidade '{city_name}' não encontrada no estado {uf}")
-                return None
+            await ensure_ibge_catalog()
         except Exception as e:
             print(f"❌ Erro ao buscar código IBGE: {e}")
             return None
 
+        # Catálogo em memória: busca exata sem acento, depois parcial
+        city = find_municipality(city_name, uf)
+        if city is None or city["id"] is None:
+            print(f"❌ Cidade '{city_name}' não encontrada no estado {uf}")
+            return None
+        ibge_code = str(city["id"])
+        print(f"✅ Código IBGE encontrado: {ibge_code} para {city['nome']}/{uf}")
+        return ibge_code
+
     async def get_districts_by_ibge_code(self, ibge_code: str) -> List[Dict]:
         """
         Busca bairros de uma cidade pelo código IBGE
@@ -87,9 +79,20 @@ class BrasilAbertoService:
             Lista de bairros com id e nome
             Formato: [{"id": "20379", "name": "Centro"}, ...]
         """
+        return (await self.fetch_districts(ibge_code))[1]
+
+    async def fetch_districts(self, ibge_code: str) -> Tuple[bool, List[Dict]]:
+        """
+        Como get_districts_by_ibge_code, distinguindo erro de lista vazia
+
+        Returns:
+            (resolvido, bairros). resolvido=False: erro na consulta (tentar de
+            novo depois); (True, []): a cidade não tem bairros ou não há API Key
+            (não adianta tentar de novo)
+        """
         if not self.api_key:
             print("❌ API Key não configurada. Não é possível buscar bairros.")
-            return []
+            return True, []
 
         # Garante que o código IBGE seja string
         ibge_code_str = str(ibge_code)
@@ -104,41 +107,41 @@ class BrasilAbertoService:
         print(f"🔑 Usando API Key: {self.api_key[:10]}...")
 
         try:
-            async with httpx.AsyncClient(timeout=15) as client:
-                response = await client.get(url, headers=headers)
-                
-                print(f"📡 Status da resposta: {response.status_code}")
-                
-                response.raise_for_status()
-                data = response.json()
-
-                # A API retorna:
-                # {
-                #   "meta": {
-                #     "currentPage": 1,
-                #     "itemsPerPage": 280,
-                #     "totalOfItems": 280,
-                #     "totalOfPages": 1
-                #   },
-                #   "result": [
-                #     {"id": "20379", "name": "Centro"},
-                #     {"id": "20380", "name": "Vila Jesus"}
-                #   ]
-                # }
-
-                # IMPORTANTE: A chave é "result", não "results"!
-                results = data.get("result", [])
-                meta = data.get("meta", {})
-                
-                total_items = meta.get("totalOfItems", len(results))
-                print(f"✅ Encontrados {total_items} bairros para código IBGE {ibge_code_str}")
-                
-                # Mostra os primeiros 5 bairros encontrados
-                if results:
-                    sample = ', '.join([d.get('name', '') for d in results[:5]])
-                    print(f"📋 Primeiros bairros: {sample}...")
-                
-                return results
+            client = get_client(url)
+            response = await client.get(url, headers=headers, timeout=15)
+            
+            print(f"📡 Status da resposta: {response.status_code}")
+            
+            response.raise_for_status()
+            data = response.json()
+
+            # A API retorna:
+            # {
+            #   "meta": {
+            #     "currentPage": 1,
+            #     "itemsPerPage": 280,
+            #     "totalOfItems": 280,
+            #     "totalOfPages": 1
+            #   },
+            #   "result": [
+            #     {"id": "20379", "name": "Centro"},
+            #     {"id": "20380", "name": "Vila Jesus"}
+            #   ]
+            # }
+
+            # IMPORTANTE: A chave é "result", não "results"!
+            results = data.get("result", [])
+            meta = data.get("meta", {})
+            
+            total_items = meta.get("totalOfItems", len(results))
+            print(f"✅ Encontrados {total_items} bairros para código IBGE {ibge_code_str}")
+            
+            # Mostra os primeiros 5 bairros encontrados
+            if results:
+                sample = ', '.join([d.get('name', '') for d in results[:5]])
+                print(f"📋 Primeiros bairros: {sample}...")
+            
+            return True, results
         except httpx.HTTPStatusError as e:
             print(f"❌ Erro HTTP {e.response.status_code}")
             print(f"📄 Resposta: {e.response.text[:500]}")
@@ -150,13 +153,70 @@ class BrasilAbertoService:
             elif e.response.status_code == 403:
                 print("💡 Dica: Acesso negado. Verifique as permissões da API Key")
             
-            return []
+            # 404: código sem bairros na API (resposta definitiva); demais status: erro
+            return e.response.status_code == 404, []
         except httpx.RequestError as e:
             print(f"❌ Erro de conexão: {e}")
-            return []
+            return False, []
         except Exception as e:
             print(f"❌ Erro inesperado ao buscar bairros: {type(e).__name__}: {e}")
-            return []
+            return False, []
+
+    async def list_city_districts(self, city_name: str, uf: str) -> Tuple[bool, List[Dict]]:
+        """
+        Bairros da cidade (código IBGE + Brasil Aberto), distinguindo erro de
+        "sem bairros"
+
+        Returns:
+            (resolvido, bairros). resolvido=False: catálogo IBGE indisponível
+            ou erro na API Brasil Aberto. Sem API Key: (True, [])
+        """
+        if not self.api_key:
+            return True, []
+        try:
+            await ensure_ibge_catalog()
+        except Exception as e:
+            print(f"❌ Erro ao buscar código IBGE: {e}")
+            return False, []
+        city = find_municipality(city_name, uf)
+        if city is None or city["id"] is None:
+            print(f"❌ Cidade '{city_name}' não encontrada no estado {uf}")
+            return True, []
+        return await self.fetch_districts(str(city["id"]))
+
+    async def geocode_district(self, district_name: str, city_name: str, uf: str) -> Tuple[bool, Optional[Dict]]:
+        """
+        Coordenadas de um bairro via Nominatim (prioridade baixa no agendador
+        global), com cache persistente que inclui bairros "não encontrados"
+
+        Returns:
+            (resolvido, {"lat", "lon"} ou None se não encontrado).
+            resolvido=False: erro na consulta (nada é cacheado, tentar de novo depois)
+        """
+        store_key = f"{_normalize(district_name)}|{_normalize(city_name)}|{uf.lower()}"
+        found, cached = await geocode_store.aget("district", store_key)
+        if found:
+            return True, cached
+
+        # o rate limit de 1 req/s é aplicado no agendador, sem travar outras requisições
+        params = {
+            "q": f"{district_name}, {city_name}, {uf}, Brasil",
+            "format": "json",
+            "limit": 1,
+            "addressdetails": 1,
+        }
+        data = await _nominatim_get(params, priority=PRIORITY_BACKGROUND)
+        if data is None:
+            return False, None
+
+        coords = None
+        if len(data) > 0:
+            lat = float(data[0].get("lat", 0))
+            lon = float(data[0].get("lon", 0))
+            if lat != 0 and lon != 0:
+                coords = {"lat": lat, "lon": lon}
+        await geocode_store.aset("district", store_key, coords)
+        return True, coords
 
     async def get_districts_with_coordinates(
         self,
@@ -202,54 +262,19 @@ class BrasilAbertoService:
         
         results = []
 
-        async with httpx.AsyncClient(timeout=10) as client:
-            for idx, district in enumerate(districts[:15], 1):  # Limita a 15 bairros
-                district_name = district.get("name", "")
-                if not district_name:
-                    continue
-
-                # Geocode usando Nominatim
-                try:
-                    nominatim_url = "https://nominatim.openstreetmap.org/search"
-                    params = {
-                        "q": f"{district_name}, {city_name}, {uf}, Brasil",
-                        "format": "json",
-                        "limit": 1,
-                        "addressdetails": 1,
-                    }
-                    headers = {
-                        "User-Agent": "AlagAlert/1.0",
-                    }
-
-                    response = await client.get(nominatim_url, params=params, headers=headers)
-
-                    if response.status_code == 200:
-                        data = response.json()
-                        if data and len(data) > 0:
-                            lat = float(data[0].get("lat", 0))
-                            lon = float(data[0].get("lon", 0))
-
-                            if lat != 0 and lon != 0:
-                                results.append({
-                                    "name": district_name,
-                                    "lat": lat,
-                                    "lon": lon,
-                                })
-                                print(f"  ✓ [{idx}/{min(15, len(districts))}] {district_name}: ({lat:.4f}, {lon:.4f})")
-                            else:
-                                print(f"  ✗ [{idx}/{min(15, len(districts))}] {district_name}: coordenadas inválidas")
-                        else:
-                            print(f"  ✗ [{idx}/{min(15, len(districts))}] {district_name}: não encontrado")
-                    else:
-                        print(f"  ✗ [{idx}/{min(15, len(districts))}] {district_name}: erro {response.status_code}")
-
-                    # Rate limiting: Nominatim permite 1 req/segundo
-                    import asyncio
-                    await asyncio.sleep(1.1)
-
-                except Exception as e:
-                    print(f"  ✗ [{idx}/{min(15, len(districts))}] {district_name}: {type(e).__name__}")
-                    continue
+        for idx, district in enumerate(districts[:15], 1):  # Limita a 15 bairros
+            district_name = district.get("name", "")
+            if not district_name:
+                continue
+
+            resolved, coords = await self.geocode_district(district_name, city_name, uf)
+            if not resolved:
+                print(f"  ✗ [{idx}/{min(15, len(districts))}] {district_name}: erro na consulta")
+            elif coords:
+                results.append({"name": district_name, "lat": coords["lat"], "lon": coords["lon"]})
+                print(f"  ✓ [{idx}/{min(15, len(districts))}] {district_name}: ({coords['lat']:.4f}, {coords['lon']:.4f})")
+            else:
+                print(f"  ✗ [{idx}/{min(15, len(districts))}] {district_name}: não encontrado")
 
         print(f"\n{'='*60}")
         print(f"✅ Concluído: {len(results)} bairros geocodificados com sucesso")
@@ -0,0 +1,357 @@
+"""
+Fila persistente de geocodificação de bairros (SQLite)
+
+A primeira consulta de bairros de uma cidade não espera mais a geocodificação:
+district_jobs.ensure() registra um job da cidade e devolve na hora os bairros
+já resolvidos e o progresso. Uma tarefa de fundo por processo atende a fila:
+
+1. busca a lista completa de bairros da cidade (código IBGE + Brasil Aberto) e
+   grava uma tarefa por bairro
+2. geocodifica as tarefas uma a uma pelo agendador do Nominatim (prioridade
+   baixa, 1 req/s), com o cache "district" do geocode_store
+3. ao terminar, grava a lista final no cache "neighborhoods"
+
+Jobs e tarefas ficam no mesmo arquivo SQLite do geocode_store (WAL), então a
+fila sobrevive a reinícios e é compartilhada pelos workers do uvicorn: cada
+item é reservado com um prazo (lease) e volta para a fila se o processo morrer
+no meio. O sqlite3 é síncrono e pode esperar pelo lock de escrita de outro
+worker, então toda consulta roda numa thread (asyncio.to_thread), fora do
+loop de eventos. Erros de consulta são tentados de novo até DISTRICT_JOB_MAX_ATTEMPTS
+vezes, com espera crescente: vale para cada bairro e para a lista de bairros
+da cidade (API fora do ar), que enquanto isso não é registrada como "sem
+bairros". Esgotadas as tentativas da lista, ou sem API Key configurada, o job
+termina sem bairros (os endpoints usam os bairros conhecidos) e é refeito
+quando esse resultado vence (GEOCODE_NEGATIVE_TTL_S).
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .brasil_aberto import BrasilAbertoService
+from .geocode import _normalize
+from .geocode_store import GEOCODE_DB_PATH, GEOCODE_NEGATIVE_TTL_S, GEOCODE_TTL_S, geocode_store
+
+logger = logging.getLogger(__name__)
+
+# Intervalo de verificação da fila quando não há trabalho (outros workers podem enfileirar)
+DISTRICT_JOB_POLL_S = float(os.getenv("DISTRICT_JOB_POLL_S", "5"))
+# Prazo de um item reservado antes de voltar para a fila
+DISTRICT_JOB_LEASE_S = float(os.getenv("DISTRICT_JOB_LEASE_S", "120"))
+DISTRICT_JOB_MAX_ATTEMPTS = int(os.getenv("DISTRICT_JOB_MAX_ATTEMPTS", "3"))
+DISTRICT_JOB_RETRY_S = float(os.getenv("DISTRICT_JOB_RETRY_S", "60"))
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS district_jobs (
+        city_key TEXT PRIMARY KEY,
+        city TEXT NOT NULL,
+        uf TEXT NOT NULL,
+        status TEXT NOT NULL,          -- pending | listing | geocoding | done
+        total INTEGER NOT NULL DEFAULT 0,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        not_before REAL NOT NULL DEFAULT 0,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS district_tasks (
+        city_key TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        status TEXT NOT NULL,          -- pending | running | done | not_found | failed
+        lat REAL,
+        lon REAL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        not_before REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (city_key, position)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS district_tasks_queue ON district_tasks (status, not_before)",
+)
+
+
+def city_key(city: str, uf: str) -> str:
+    """Chave da cidade (mesma do cache "neighborhoods")."""
+    return f"{_normalize(city)}|{uf.lower()}"
+
+
+class DistrictJobQueue:
+    """Fila de jobs de geocodificação de bairros por cidade, com uma tarefa de fundo por processo."""
+
+    def __init__(self, path: Path = GEOCODE_DB_PATH):
+        self.path = Path(path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._service: Optional[BrasilAbertoService] = None
+        self.stats = {"jobs": 0, "geocoded": 0, "not_found": 0, "errors": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=5, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            # arquivos criados antes da coluna de tentativas da lista
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(district_jobs)")}
+            if "attempts" not in columns:
+                conn.execute("ALTER TABLE district_jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+            self._conn = conn
+        return self._conn
+
+    def _sql(self, sql: str, params: Tuple = (), fetch: Optional[str] = None):
+        """Executa e lê o resultado sob o lock: fetch="one" | "all", ou None (rowcount)."""
+        with self._lock:
+            cur = self._connect().execute(sql, params)
+            if fetch == "one":
+                return cur.fetchone()
+            if fetch == "all":
+                return cur.fetchall()
+            return cur.rowcount
+
+    async def _query(self, sql: str, params: Tuple = (), fetch: Optional[str] = None):
+        return await asyncio.to_thread(self._sql, sql, params, fetch)
+
+    async def _claim(self, sql: str, params: Tuple) -> Optional[Tuple]:
+        """UPDATE ... RETURNING atômico (reserva um item mesmo com vários processos)."""
+        return await self._query(sql, params, "one")
+
+    # -----------------------------------------------------------------
+    # API usada pelos endpoints
+    # -----------------------------------------------------------------
+    def enabled(self) -> bool:
+        """Sem API Key do Brasil Aberto não há lista de bairros a buscar (nada é enfileirado)."""
+        return bool(self._brasil_aberto().api_key)
+
+    async def ensure(self, city: str, uf: str) -> Dict:
+        """
+        Garante um job para a cidade (cria, ou reabre se o resultado venceu)
+        e devolve o estado atual
+
+        Returns:
+            {"districts": [{"name", "lat", "lon"}, ...] já resolvidos, na ordem
+             da lista, "progress": {...}}
+        """
+        key = city_key(city, uf)
+        now = time.time()
+        row = await self._query(
+            "SELECT status, total, updated_at FROM district_jobs WHERE city_key = ?", (key,), "one"
+        )
+        if row is None:
+            await self._query(
+                "INSERT OR IGNORE INTO district_jobs (city_key, city, uf, status, created_at, updated_at)"
+                " VALUES (?, ?, ?, 'pending', ?, ?)",
+                (key, city, uf.upper(), now, now),
+            )
+            self.stats["jobs"] += 1
+            self._notify()
+        elif row[0] == "done":
+            ttl = GEOCODE_TTL_S if row[1] else GEOCODE_NEGATIVE_TTL_S
+            if row[2] + ttl <= now:
+                # lista de bairros vencida: busca de novo (coordenadas seguem no cache "district")
+                await self._query(
+                    "UPDATE district_jobs SET status = 'pending', attempts = 0, not_before = 0, updated_at = ?"
+                    " WHERE city_key = ?",
+                    (now, key),
+                )
+                self._notify()
+        return await self.snapshot(key)
+
+    async def snapshot(self, key: str) -> Dict:
+        return await asyncio.to_thread(self._snapshot, key)
+
+    def _snapshot(self, key: str) -> Dict:
+        job = self._sql("SELECT status, total FROM district_jobs WHERE city_key = ?", (key,), "one")
+        rows = self._sql(
+            "SELECT name, status, lat, lon FROM district_tasks WHERE city_key = ? ORDER BY position", (key,), "all"
+        )
+        counts: Dict[str, int] = {}
+        for _, status, _, _ in rows:
+            counts[status] = counts.get(status, 0) + 1
+        status, total = job if job else ("pending", 0)
+        processed = counts.get("done", 0) + counts.get("not_found", 0) + counts.get("failed", 0)
+        return {
+            "districts": [{"name": name, "lat": lat, "lon": lon} for name, st, lat, lon in rows if st == "done"],
+            "progress": {
+                "status": status,
+                "total": total,
+                "resolved": counts.get("done", 0),
+                "not_found": counts.get("not_found", 0),
+                "failed": counts.get("failed", 0),
+                "pending": total - processed,
+                "percent": round(100 * processed / total, 1) if total else (100.0 if status == "done" else 0.0),
+            },
+        }
+
+    # -----------------------------------------------------------------
+    # Trabalho de fundo
+    # -----------------------------------------------------------------
+    def _notify(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    def _brasil_aberto(self) -> BrasilAbertoService:
+        if self._service is None:
+            self._service = BrasilAbertoService()
+        return self._service
+
+    async def _list_districts(self) -> bool:
+        """Reserva um job pendente e grava as tarefas com a lista completa de bairros."""
+        now = time.time()
+        job = await self._claim(
+            "UPDATE district_jobs SET status = 'listing', not_before = ?, updated_at = ?, attempts = attempts + 1"
+            " WHERE city_key = (SELECT city_key FROM district_jobs"
+            "   WHERE (status = 'pending' OR status = 'listing') AND not_before <= ?"
+            "   ORDER BY created_at LIMIT 1)"
+            " RETURNING city_key, city, uf, attempts",
+            (now + DISTRICT_JOB_LEASE_S, now, now),
+        )
+        if job is None:
+            return False
+        key, city, uf, attempts = job
+
+        resolved, districts = await self._brasil_aberto().list_city_districts(city, uf)
+        if not resolved:
+            self.stats["errors"] += 1
+            if attempts < DISTRICT_JOB_MAX_ATTEMPTS:
+                # erro: volta para a fila, nada é gravado como resultado
+                delay = DISTRICT_JOB_RETRY_S * attempts
+                await self._query(
+                    "UPDATE district_jobs SET status = 'pending', not_before = ?, updated_at = ? WHERE city_key = ?",
+                    (time.time() + delay, time.time(), key),
+                )
+                logger.info("Bairros de %s/%s indisponíveis; nova tentativa em %.0f s", city, uf, delay)
+                return True
+            # tentativas esgotadas: termina sem bairros até o resultado vencer
+            logger.warning("Bairros de %s/%s indisponíveis após %d tentativas", city, uf, attempts)
+            districts = []
+        names = list(dict.fromkeys(d.get("name", "") for d in districts if d.get("name")))
+        await asyncio.to_thread(self._store_tasks, key, names)
+        logger.info("Bairros de %s/%s: %d para geocodificar", city, uf, len(names))
+        return True
+
+    def _store_tasks(self, key: str, names: List[str]) -> None:
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("BEGIN")
+                conn.execute("DELETE FROM district_tasks WHERE city_key = ?", (key,))
+                conn.executemany(
+                    "INSERT INTO district_tasks (city_key, position, name, status) VALUES (?, ?, ?, 'pending')",
+                    [(key, i, name) for i, name in enumerate(names)],
+                )
+                conn.execute(
+                    "UPDATE district_jobs SET status = ?, total = ?, not_before = 0, updated_at = ? WHERE city_key = ?",
+                    ("geocoding" if names else "done", len(names), time.time(), key),
+                )
+
+    async def _geocode_next(self) -> bool:
+        """
+        Reserva e geocodifica o próximo bairro pendente. A ordem alterna entre
+        as cidades na fila (posição na lista, depois job mais antigo), para que
+        uma cidade nova ganhe bairros logo mesmo atrás de uma lista longa.
+        """
+        now = time.time()
+        task = await self._claim(
+            "UPDATE district_tasks SET status = 'running', not_before = ?, attempts = attempts + 1"
+            " WHERE rowid = (SELECT t.rowid FROM district_tasks t JOIN district_jobs j USING (city_key)"
+            "   WHERE (t.status = 'pending' OR t.status = 'running') AND t.not_before <= ?"
+            "   ORDER BY t.position, j.created_at LIMIT 1)"
+            " RETURNING city_key, position, name, attempts",
+            (now + DISTRICT_JOB_LEASE_S, now),
+        )
+        if task is None:
+            return False
+        key, position, name, attempts = task
+        city, uf = await self._query("SELECT city, uf FROM district_jobs WHERE city_key = ?", (key,), "one")
+
+        resolved, coords = await self._brasil_aberto().geocode_district(name, city, uf)
+        if not resolved:
+            self.stats["errors"] += 1
+            if attempts < DISTRICT_JOB_MAX_ATTEMPTS:
+                status, not_before = "pending", time.time() + DISTRICT_JOB_RETRY_S * attempts
+            else:
+                status, not_before = "failed", 0
+            await self._query(
+                "UPDATE district_tasks SET status = ?, not_before = ? WHERE city_key = ? AND position = ?",
+                (status, not_before, key, position),
+            )
+        else:
+            self.stats["geocoded" if coords else "not_found"] += 1
+            await self._query(
+                "UPDATE district_tasks SET status = ?, lat = ?, lon = ? WHERE city_key = ? AND position = ?",
+                ("done" if coords else "not_found",
+                 coords["lat"] if coords else None, coords["lon"] if coords else None, key, position),
+            )
+        await self._finish_if_complete(key)
+        return True
+
+    async def _finish_if_complete(self, key: str) -> None:
+        left = (await self._query(
+            "SELECT COUNT(*) FROM district_tasks WHERE city_key = ? AND status IN ('pending', 'running')", (key,), "one"
+        ))[0]
+        if left:
+            return
+        updated = await self._query(
+            "UPDATE district_jobs SET status = 'done', updated_at = ? WHERE city_key = ? AND status = 'geocoding'",
+            (time.time(), key),
+        )
+        if updated:
+            districts = (await self.snapshot(key))["districts"]
+            if districts:
+                await geocode_store.aset("neighborhoods", key, districts)
+
+    async def run_once(self) -> bool:
+        """Processa um item da fila. Retorna False se não havia trabalho."""
+        return await self._list_districts() or await self._geocode_next()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                worked = await self.run_once()
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("Falha na fila de geocodificação de bairros: %s", exc)
+                worked = False
+            if worked:
+                continue
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=DISTRICT_JOB_POLL_S)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def info(self) -> Dict:
+        rows = self._sql("SELECT status, COUNT(*) FROM district_jobs GROUP BY status", fetch="all")
+        return {**self.stats, "by_status": dict(rows)}
+
+
+# Instância única do processo
+district_jobs = DistrictJobQueue()
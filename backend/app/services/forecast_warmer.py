@@ -0,0 +1,76 @@
+"""
+Atualização periódica das previsões mais acessadas (forecast warmer)
+
+A cada FORECAST_WARM_INTERVAL_S segundos, as localizações quentes (mais
+acessadas recentemente) cuja previsão vence em até FORECAST_WARM_LEAD_S
+segundos são buscadas de novo em segundo plano, em lote. Assim o usuário quase
+nunca paga a latência do Open-Meteo por uma entrada vencida.
+
+Com FORECAST_WARM_INTERVAL_S <= 0 o warmer fica desligado (o stale-while-
+revalidate de weather_client continua valendo).
+"""
+
+import asyncio
+import logging
+import os
+from typing import Optional
+
+from .weather_client import refresh_hot_forecasts
+
+logger = logging.getLogger(__name__)
+
+FORECAST_WARM_INTERVAL_S = float(os.getenv("FORECAST_WARM_INTERVAL_S", "30"))
+FORECAST_WARM_LEAD_S = float(os.getenv("FORECAST_WARM_LEAD_S", "90"))
+FORECAST_WARM_MIN_HITS = float(os.getenv("FORECAST_WARM_MIN_HITS", "2"))
+FORECAST_WARM_MAX_KEYS = int(os.getenv("FORECAST_WARM_MAX_KEYS", "200"))
+
+
+class ForecastWarmer:
+    """Tarefa de fundo que dispara refresh_hot_forecasts periodicamente."""
+
+    def __init__(
+        self,
+        interval_s: float = FORECAST_WARM_INTERVAL_S,
+        lead_s: float = FORECAST_WARM_LEAD_S,
+        min_hits: float = FORECAST_WARM_MIN_HITS,
+        max_keys: int = FORECAST_WARM_MAX_KEYS,
+    ):
+        self.interval_s = interval_s
+        self.lead_s = lead_s
+        self.min_hits = min_hits
+        self.max_keys = max_keys
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"runs": 0, "refreshed": 0}
+
+    def start(self) -> None:
+        if self.interval_s <= 0:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def run_once(self) -> int:
+        refreshed = refresh_hot_forecasts(self.lead_s, self.min_hits, self.max_keys)
+        self.stats["runs"] += 1
+        self.stats["refreshed"] += refreshed
+        return refreshed
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_s)
+            try:
+                self.run_once()
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("Falha no ciclo do forecast warmer: %s", exc)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Instância única do processo
+forecast_warmer = ForecastWarmer()
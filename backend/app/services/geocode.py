@@ -4,6 +4,10 @@ import httpx
 import unicodedata
 import logging
 
+from .geocode_store import geocode_store
+from .http_pool import get_client
+from .nominatim_scheduler import PRIORITY_INTERACTIVE, nominatim_scheduler
+
 NOMINATIM_BASE = "https://nominatim.openstreetmap.org/search"
 HEADERS = {"User-Agent": "AlagAlert/1.0 (contact: suporte@alagalert.local)"}
 
@@ -53,21 +57,33 @@ def _row_to_item(d: Dict) -> Dict:
         "importance": d.get("importance", 0),
     }
 
-async def _nominatim_get(params: Dict) -> List[Dict]:
+async def _nominatim_request(params: Dict) -> List[Dict]:
+    client = get_client(NOMINATIM_BASE)
+    r = await client.get(NOMINATIM_BASE, params=params, headers=HEADERS, timeout=15)
+    r.raise_for_status()
+    return r.json()
+
+async def _nominatim_get(params: Dict, priority: int = PRIORITY_INTERACTIVE) -> Optional[List[Dict]]:
+    """
+    Consulta o Nominatim pelo agendador global (rate limit de 1 req/s, prioridade
+    e deduplicação de consultas idênticas).
+    Retorna None em caso de erro (resultado não deve ser cacheado).
+    """
+    key = tuple(sorted((k, str(v)) for k, v in params.items()))
     try:
-        async with httpx.AsyncClient(headers=HEADERS, timeout=15) as client:
-            r = await client.get(NOMINATIM_BASE, params=params)
-            r.raise_for_status()
-            return r.json()
+        return await nominatim_scheduler.submit(key, lambda: _nominatim_request(params), priority=priority)
     except httpx.TimeoutException:
         logger.warning("Nominatim timeout for params=%s", params)
-        return []
+        return None
     except httpx.HTTPError as exc:
         logger.warning("Nominatim HTTP error: %s", exc)
-        return []
+        return None
     except Exception as exc:  # noqa: BLE001
         logger.exception("Unexpected Nominatim error: %s", exc)
-        return []
+        return None
+
+def _store_key(*parts) -> str:
+    return "|".join(_normalize(str(p)) if p is not None else "" for p in parts)
 
 async def nominatim_lookup(
     query: str,
@@ -76,7 +92,12 @@ async def nominatim_lookup(
     cities_only: bool = True,
     prefer_uf: Optional[str] = None,
 ):
-    """Busca livre no Nominatim, com priorização por UF."""
+    """Busca livre no Nominatim, com priorização por UF (lê/grava no cache persistente)."""
+    key = _store_key(query, country, limit, cities_only, prefer_uf)
+    found, cached = await geocode_store.aget("nominatim", key)
+    if found:
+        return cached or []
+
     params = {
         "q": query,
         "countrycodes": country,
@@ -86,6 +107,8 @@ async def nominatim_lookup(
     }
     data = await _nominatim_get(params)
     if not data:
+        if data is not None:
+            await geocode_store.aset("nominatim", key, [])
         return []
     items = [_row_to_item(d) for d in data]
 
@@ -96,6 +119,8 @@ async def nominatim_lookup(
         # fallback: mesma query sem filtro “cities_only” (filtra manual depois)
         data2 = await _nominatim_get(params)
         if not data2:
+            if data2 is not None:
+                await geocode_store.aset("nominatim", key, [])
             return []
         items = [_row_to_item(d) for d in data2]
         items = [it for it in items if any(k in it["address"] for k in ["city", "town", "village"])]
@@ -108,10 +133,12 @@ async def nominatim_lookup(
 
     items.sort(key=lambda it: it.get("importance", 0), reverse=True)
 
-    return [
+    results = [
         {"lat": it["lat"], "lon": it["lon"], "city": it["city"], "uf": it["uf"], "display_name": it["display_name"]}
         for it in items
     ]
+    await geocode_store.aset("nominatim", key, results)
+    return results
 
 async def nominatim_lookup_structured_city_uf(
     city: str,
@@ -123,6 +150,11 @@ async def nominatim_lookup_structured_city_uf(
     Usa o nome completo do estado para aumentar precisão.
     """
     uf = uf.upper().strip()
+    key = _store_key(city, uf, limit)
+    found, cached = await geocode_store.aget("nominatim_structured", key)
+    if found:
+        return cached or []
+
     state_name = UF_TO_STATE.get(uf, uf)  # aceita “SP” ou o nome já completo
     params = {
         "city": city,
@@ -134,15 +166,19 @@ async def nominatim_lookup_structured_city_uf(
     }
     data = await _nominatim_get(params)
     if not data:
+        if data is not None:
+            await geocode_store.aset("nominatim_structured", key, [])
         return []
     items = [_row_to_item(d) for d in data]
     # ainda reforça a UF quando vier com "BR-SP"
     items = [it for it in items if it["uf"] in (uf, "")]
     items.sort(key=lambda it: it.get("importance", 0), reverse=True)
-    return [
+    results = [
         {"lat": it["lat"], "lon": it["lon"], "city": it["city"], "uf": it["uf"], "display_name": it["display_name"]}
         for it in items
     ]
+    await geocode_store.aset("nominatim_structured", key, results)
+    return results
 
 async def nominatim_lookup_states(query: str, country: Optional[str] = None, limit: int = 10):
     params = {
@@ -153,7 +189,7 @@ async def nominatim_lookup_states(query: str, country: Optional[str] = None, lim
         "countrycodes": country or "br",
         "featuretype": "state",
     }
-    data = await _nominatim_get(params)
+    data = await _nominatim_get(params) or []
     results = []
     for d in data:
         address = d.get("address", {})
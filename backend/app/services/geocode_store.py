@@ -0,0 +1,159 @@
+"""
+Cache persistente de geocodificação (SQLite)
+
+Substitui os dicionários em memória por um arquivo SQLite local, em modo WAL,
+compartilhado por todos os workers do uvicorn e preservado entre reinícios.
+
+- Cada entrada tem TTL (GEOCODE_TTL_S)
+- Resultados vazios ("não encontrado") também são gravados, com TTL menor
+  (GEOCODE_NEGATIVE_TTL_S), para não repetir consultas ao Nominatim
+- preload() grava muitas entradas em uma única transação
+- O sqlite3 é bloqueante: no código assíncrono use aget()/aset(), que rodam a
+  consulta numa thread (asyncio.to_thread), fora do loop de eventos. Com
+  vários workers (e a fila de bairros) disputando o lock de escrita, cada
+  consulta espera até GEOCODE_DB_TIMEOUT_S pelo lock
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = Path(__file__).resolve().parents[2] / "data" / "cache" / "geocode.sqlite3"
+GEOCODE_DB_PATH = Path(os.getenv("GEOCODE_DB_PATH", str(DEFAULT_DB_PATH)))
+GEOCODE_TTL_S = int(os.getenv("GEOCODE_TTL_S", str(30 * 24 * 3600)))        # 30 dias
+GEOCODE_NEGATIVE_TTL_S = int(os.getenv("GEOCODE_NEGATIVE_TTL_S", str(24 * 3600)))  # 1 dia
+# Espera máxima (s) pelo lock do SQLite (busy_timeout)
+GEOCODE_DB_TIMEOUT_S = float(os.getenv("GEOCODE_DB_TIMEOUT_S", "5"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS geocode (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+)
+"""
+
+
+def _is_negative(value: Any) -> bool:
+    return value is None or value == [] or value == {}
+
+
+class GeocodeStore:
+    """
+    Armazenamento chave/valor com TTL por namespace
+
+    Namespaces usados: "nominatim", "nominatim_structured", "city", "district",
+    "neighborhoods".
+    """
+
+    def __init__(self, path: Path = GEOCODE_DB_PATH):
+        self.path = Path(path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                str(self.path), timeout=GEOCODE_DB_TIMEOUT_S, check_same_thread=False, isolation_level=None
+            )
+            # WAL permite leituras concorrentes de vários processos enquanto um grava
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def get(self, namespace: str, key: str) -> Tuple[bool, Any]:
+        """
+        Returns:
+            (encontrado, valor). Um resultado negativo gravado retorna (True, None).
+        """
+        try:
+            with self._lock:
+                row = self._connect().execute(
+                    "SELECT value, expires_at FROM geocode WHERE namespace = ? AND key = ?",
+                    (namespace, key),
+                ).fetchone()
+        except sqlite3.Error as exc:
+            logger.warning("Falha ao ler cache de geocodificação: %s", exc)
+            return False, None
+        if row is None or row[1] <= time.time():
+            return False, None
+        return True, (json.loads(row[0]) if row[0] is not None else None)
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        """Grava um valor; valores vazios são gravados como negativos (TTL curto)."""
+        self.preload(namespace, [(key, value)], ttl=ttl)
+
+    def preload(self, namespace: str, items: Iterable[Tuple[str, Any]], ttl: Optional[int] = None) -> int:
+        """
+        Grava várias entradas em uma única transação
+
+        Returns:
+            Número de entradas gravadas
+        """
+        now = time.time()
+        rows = []
+        for key, value in items:
+            negative = _is_negative(value)
+            entry_ttl = ttl if ttl is not None else (GEOCODE_NEGATIVE_TTL_S if negative else GEOCODE_TTL_S)
+            rows.append((
+                namespace,
+                key,
+                None if negative else json.dumps(value, ensure_ascii=False),
+                now + entry_ttl,
+            ))
+        if not rows:
+            return 0
+        try:
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    conn.execute("BEGIN")
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO geocode (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                        rows,
+                    )
+        except sqlite3.Error as exc:
+            logger.warning("Falha ao gravar cache de geocodificação: %s", exc)
+            return 0
+        return len(rows)
+
+    async def aget(self, namespace: str, key: str) -> Tuple[bool, Any]:
+        """get() numa thread, para chamadas a partir do loop de eventos."""
+        return await asyncio.to_thread(self.get, namespace, key)
+
+    async def aset(self, namespace: str, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        """set() numa thread, para chamadas a partir do loop de eventos."""
+        await asyncio.to_thread(self.set, namespace, key, value, ttl)
+
+    def purge_expired(self) -> int:
+        """Remove entradas expiradas."""
+        try:
+            with self._lock:
+                cur = self._connect().execute("DELETE FROM geocode WHERE expires_at <= ?", (time.time(),))
+                return cur.rowcount
+        except sqlite3.Error as exc:
+            logger.warning("Falha ao limpar cache de geocodificação: %s", exc)
+            return 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# Instância única do processo
+geocode_store = GeocodeStore()
@@ -0,0 +1,91 @@
+"""
+Pool de clientes HTTP compartilhado por todos os serviços
+
+Mantém um único httpx.AsyncClient por host upstream (Open-Meteo, Nominatim,
+IBGE, Brasil Aberto), com keep-alive e limite de conexões por host, para
+evitar um novo handshake TCP+TLS a cada requisição.
+
+Os clientes são criados no lifespan da aplicação (startup) e fechados no
+shutdown. Fora do lifespan (ex.: scripts em tools/) são criados sob demanda.
+"""
+
+import os
+import logging
+from typing import Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "0").lower() in ("1", "true", "yes")
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+
+# Hosts conhecidos, pré-aquecidos no startup
+OPEN_METEO_HOST = "api.open-meteo.com"
+NOMINATIM_HOST = "nominatim.openstreetmap.org"
+IBGE_HOST = "servicodados.ibge.gov.br"
+BRASIL_ABERTO_HOST = "api.brasilaberto.com"
+
+# Limite de conexões por host (sobrescreve HTTP_MAX_CONNECTIONS).
+# Nominatim aceita ~1 req/s, não adianta abrir muitas conexões.
+HOST_MAX_CONNECTIONS: Dict[str, int] = {
+    NOMINATIM_HOST: 2,
+}
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _build_client(host: str) -> httpx.AsyncClient:
+    max_conn = HOST_MAX_CONNECTIONS.get(host, HTTP_MAX_CONNECTIONS)
+    limits = httpx.Limits(
+        max_connections=max_conn,
+        max_keepalive_connections=min(HTTP_MAX_KEEPALIVE, max_conn),
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    http2 = HTTP2_ENABLED and _http2_available()
+    if HTTP2_ENABLED and not http2:
+        logger.warning("HTTP2_ENABLED=1 mas o pacote 'h2' não está instalado; usando HTTP/1.1")
+    return httpx.AsyncClient(limits=limits, http2=http2, timeout=HTTP_TIMEOUT)
+
+
+def get_client(url_or_host: str) -> httpx.AsyncClient:
+    """
+    Retorna o cliente compartilhado do host da URL (ou do host informado)
+
+    Args:
+        url_or_host: URL completa (ex: "https://api.open-meteo.com/v1/forecast") ou apenas o host
+    """
+    host = httpx.URL(url_or_host).host if "://" in url_or_host else url_or_host
+    client = _clients.get(host)
+    if client is None or client.is_closed:
+        client = _build_client(host)
+        _clients[host] = client
+    return client
+
+
+def start_http_pool(hosts: Optional[list] = None) -> None:
+    """Cria os clientes dos hosts conhecidos (chamado no startup da aplicação)."""
+    for host in hosts or (OPEN_METEO_HOST, NOMINATIM_HOST, IBGE_HOST, BRASIL_ABERTO_HOST):
+        get_client(host)
+
+
+async def close_http_pool() -> None:
+    """Fecha todas as conexões abertas (chamado no shutdown da aplicação)."""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        try:
+            await client.aclose()
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("Erro ao fechar cliente HTTP: %s", exc)
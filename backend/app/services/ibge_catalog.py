@@ -0,0 +1,328 @@
+"""
+Catálogo de localidades do IBGE (estados e municípios) em memória
+
+Os endpoints /states, /cities e /risk/by-uf e BrasilAbertoService.get_city_ibge_code
+consultavam o IBGE a cada chamada, mas a lista muda uma vez por ano. O catálogo
+é carregado uma única vez e indexado por UF, por código IBGE e por nome sem acento.
+
+É também o gazetteer offline: data/ibge/municipios.json (tools/build_gazetteer.py,
+complementado por tools/add_cities.py) traz centroide e bbox de cada município,
+anexados às entradas do catálogo. lookup_municipality resolve coordenadas sem o
+Nominatim (limitado a ~1 req/s), que fica só como fallback. Sem catálogo
+carregado, os municípios do gazetteer servem de semente para o índice.
+
+Origem, na ordem:
+- cópia local de uma busca anterior (IBGE_CATALOG_PATH, em data/cache/)
+- snapshot versionado em data/ibge/localidades.json (tools/snapshot_ibge.py)
+- API de localidades do IBGE (uma única chamada com todos os municípios)
+
+Passado IBGE_CATALOG_REVALIDATE_S desde a última busca, o catálogo é revalidado
+em segundo plano com If-None-Match (ETag); enquanto isso segue respondendo com
+o que já está carregado.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .geocode import _normalize
+from .http_pool import get_client
+from ..utils.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+IBGE_LOCALIDADES_URL = "https://servicodados.ibge.gov.br/api/v1/localidades/municipios?view=nivelado"
+
+DATA_DIR = Path(__file__).resolve().parents[2] / "data" / "ibge"
+SNAPSHOT_PATH = DATA_DIR / "localidades.json"
+GAZETTEER_PATH = DATA_DIR / "municipios.json"
+DEFAULT_CATALOG_PATH = Path(__file__).resolve().parents[2] / "data" / "cache" / "ibge_localidades.json"
+IBGE_CATALOG_PATH = Path(os.getenv("IBGE_CATALOG_PATH", str(DEFAULT_CATALOG_PATH)))
+IBGE_CATALOG_REVALIDATE_S = int(os.getenv("IBGE_CATALOG_REVALIDATE_S", str(7 * 24 * 3600)))  # 7 dias
+
+# Estados ordenados por nome: [{"id", "sigla", "nome"}]
+_STATES: List[Dict] = []
+# UF -> municípios ordenados por nome: [{"id", "nome", "uf", "lat", "lon", "bbox"}]
+_BY_UF: Dict[str, List[Dict]] = {}
+# código IBGE -> município
+_BY_CODE: Dict[int, Dict] = {}
+# (nome normalizado, UF) -> município
+_BY_NAME: Dict[Tuple[str, str], Dict] = {}
+
+# municípios do catálogo carregado (formato compacto) e do gazetteer, combinados em _index
+_CATALOG: List[Dict] = []
+_GAZETTEER: List[Dict] = []
+
+# metadados da cópia carregada: etag e instante (time.time()) da última busca/validação
+_meta: Dict = {"etag": None, "fetched_at": None, "source": None}
+# incrementado a cada reindexação (invalida respostas codificadas em cache)
+_version = 0
+_loaded = False
+_gazetteer_loaded = False
+
+_catalog_flight = SingleFlight()
+
+
+def _from_nivelado(rows: List[Dict]) -> List[Dict]:
+    """Converte a resposta view=nivelado no formato compacto do catálogo."""
+    out = []
+    for row in rows:
+        if row.get("municipio-id") is None or not row.get("municipio-nome"):
+            continue
+        out.append({
+            "id": int(row["municipio-id"]),
+            "nome": row["municipio-nome"],
+            "uf": row.get("UF-sigla"),
+            "uf_id": row.get("UF-id"),
+            "uf_nome": row.get("UF-nome"),
+        })
+    return out
+
+
+def _from_gazetteer(raw: Dict) -> Optional[Dict]:
+    """Linha de municipios.json no formato compacto do catálogo, com as coordenadas."""
+    nome = raw.get("nome")
+    uf = (raw.get("uf") or "").upper()
+    centroid = raw.get("centroid") or {}
+    if not nome or not uf or centroid.get("lat") is None or centroid.get("lon") is None:
+        return None
+    codigo = raw.get("codigo")
+    return {
+        "id": int(codigo) if codigo is not None else None,
+        "nome": nome,
+        "uf": uf,
+        "lat": float(centroid["lat"]),
+        "lon": float(centroid["lon"]),
+        "bbox": raw.get("bbox"),  # [min_lon, min_lat, max_lon, max_lat]
+    }
+
+
+def _index(municipios: List[Dict]) -> int:
+    """Reindexa o catálogo (municipios) com as coordenadas do gazetteer."""
+    global _version
+    states: Dict[str, Dict] = {}
+    by_uf: Dict[str, List[Dict]] = {}
+    by_code: Dict[int, Dict] = {}
+    by_name: Dict[Tuple[str, str], Dict] = {}
+
+    gaz_by_code = {g["id"]: g for g in _GAZETTEER if g["id"] is not None}
+    gaz_by_name = {(_normalize(g["nome"]), g["uf"]): g for g in _GAZETTEER}
+
+    # municípios do catálogo primeiro; os do gazetteer que faltarem (semente offline,
+    # entradas manuais) entram depois
+    for raw in list(municipios) + _GAZETTEER:
+        uf = (raw.get("uf") or "").upper()
+        if not uf or not raw.get("nome"):
+            continue
+        code = int(raw["id"]) if raw.get("id") is not None else None
+        key = (_normalize(raw["nome"]), uf)
+        if (code is not None and code in by_code) or key in by_name:
+            continue
+        coords = gaz_by_code.get(code) or gaz_by_name.get(key) or {}
+        entry = {
+            "id": code,
+            "nome": raw["nome"],
+            "uf": uf,
+            "lat": coords.get("lat"),
+            "lon": coords.get("lon"),
+            "bbox": coords.get("bbox"),
+        }
+        by_uf.setdefault(uf, []).append(entry)
+        if code is not None:
+            by_code[code] = entry
+        by_name[key] = entry
+        if uf not in states and raw.get("uf_nome"):
+            states[uf] = {"id": raw.get("uf_id"), "sigla": uf, "nome": raw["uf_nome"]}
+
+    for entries in by_uf.values():
+        entries.sort(key=lambda m: m["nome"])
+
+    _STATES[:] = sorted(states.values(), key=lambda s: s["nome"])
+    _BY_UF.clear()
+    _BY_UF.update(by_uf)
+    _BY_CODE.clear()
+    _BY_CODE.update(by_code)
+    _BY_NAME.clear()
+    _BY_NAME.update(by_name)
+    _version += 1
+    return len(by_code)
+
+
+def _read(path: Path) -> Optional[Dict]:
+    if not path.exists():
+        return None
+    try:
+        data = json.loads(path.read_text(encoding="utf-8-sig"))
+    except (OSError, ValueError) as exc:
+        logger.warning("Falha ao ler catálogo IBGE %s: %s", path, exc)
+        return None
+    return data if data.get("municipios") else None
+
+
+def _save(data: Dict) -> None:
+    try:
+        IBGE_CATALOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp = IBGE_CATALOG_PATH.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(IBGE_CATALOG_PATH)
+    except OSError as exc:
+        logger.warning("Falha ao gravar catálogo IBGE: %s", exc)
+
+
+def load_gazetteer(path: Path = GAZETTEER_PATH) -> int:
+    """
+    (Re)carrega as coordenadas do gazetteer e reindexa
+
+    Returns:
+        Número de municípios com coordenadas
+    """
+    global _gazetteer_loaded
+    rows = []
+    if path.exists():
+        try:
+            rows = json.loads(path.read_text(encoding="utf-8-sig"))
+        except (OSError, ValueError) as exc:
+            logger.warning("Falha ao ler gazetteer %s: %s", path, exc)
+    else:
+        logger.warning("Gazetteer não encontrado: %s", path)
+    _GAZETTEER[:] = [entry for entry in map(_from_gazetteer, rows) if entry is not None]
+    _gazetteer_loaded = True
+    _index(_CATALOG)
+    return len(_GAZETTEER)
+
+
+def load_ibge_catalog() -> int:
+    """
+    Carrega o catálogo do disco (cópia local ou snapshot versionado, o mais novo)
+
+    Returns:
+        Número de municípios indexados (0 se nenhuma cópia estiver disponível)
+    """
+    global _loaded
+    candidates = [
+        (data, source)
+        for data, source in ((_read(IBGE_CATALOG_PATH), "cache"), (_read(SNAPSHOT_PATH), "snapshot"))
+        if data is not None
+    ]
+    if not candidates:
+        return 0
+    data, source = max(candidates, key=lambda c: c[0].get("fetched_at") or 0)
+    _CATALOG[:] = data["municipios"]
+    count = _index(_CATALOG)
+    _meta.update(etag=data.get("etag"), fetched_at=data.get("fetched_at"), source=source)
+    _loaded = True
+    return count
+
+
+async def _fetch_remote() -> int:
+    headers = {}
+    if _loaded and _meta.get("etag"):
+        headers["If-None-Match"] = _meta["etag"]
+    r = await get_client(IBGE_LOCALIDADES_URL).get(IBGE_LOCALIDADES_URL, headers=headers, timeout=30)
+    now = time.time()
+
+    if r.status_code == 304:
+        # nada mudou: só renova o prazo de revalidação
+        _meta["fetched_at"] = now
+        data = _read(IBGE_CATALOG_PATH)
+        if data is not None:
+            data["fetched_at"] = now
+            _save(data)
+        return len(_BY_CODE)
+
+    r.raise_for_status()
+    municipios = _from_nivelado(r.json())
+    if not municipios:
+        raise ValueError("resposta vazia do IBGE")
+    data = {"etag": r.headers.get("ETag"), "fetched_at": now, "municipios": municipios}
+    _save(data)
+    _CATALOG[:] = municipios
+    count = _index(_CATALOG)
+    _meta.update(etag=data["etag"], fetched_at=now, source="remote")
+    return count
+
+
+def _log_refresh_error(fut: asyncio.Future) -> None:
+    if not fut.cancelled() and fut.exception() is not None:
+        logger.warning("Falha ao revalidar catálogo IBGE: %s", fut.exception())
+
+
+async def ensure_ibge_catalog() -> None:
+    """
+    Garante o catálogo em memória. Sem nenhuma cópia, busca no IBGE (e propaga
+    httpx.HTTPError em caso de falha); com cópia antiga, revalida em segundo plano.
+    """
+    global _loaded
+    if not _loaded:
+        load_ibge_catalog()
+    if not _loaded:
+        await _catalog_flight.do("catalog", _fetch_remote)
+        _loaded = True
+        return
+    age = time.time() - (_meta.get("fetched_at") or 0)
+    if age >= IBGE_CATALOG_REVALIDATE_S and not _catalog_flight.inflight("catalog"):
+        task = asyncio.ensure_future(_catalog_flight.do("catalog", _fetch_remote))
+        task.add_done_callback(_log_refresh_error)
+
+
+def list_states() -> List[Dict]:
+    """Estados ordenados por nome: [{"id", "sigla", "nome"}]."""
+    return _STATES
+
+
+def list_municipalities(uf: str) -> List[Dict]:
+    """Municípios da UF ordenados por nome: [{"id", "nome", "uf", "lat", "lon", "bbox"}] (vazio se a UF não existir)."""
+    return _BY_UF.get((uf or "").upper(), [])
+
+
+def find_municipality(name: str, uf: str, partial: bool = True) -> Optional[Dict]:
+    """
+    Busca um município por nome (sem diferenciar acentos/maiúsculas) e UF
+
+    Args:
+        partial: Sem correspondência exata, aceita o primeiro município cujo
+            nome contenha `name`
+    """
+    uf = (uf or "").upper()
+    key = _normalize(name)
+    found = _BY_NAME.get((key, uf))
+    if found is not None or not partial or not key:
+        return found
+    for entry in _BY_UF.get(uf, []):
+        if key in _normalize(entry["nome"]):
+            return entry
+    return None
+
+
+def lookup_municipality(name: str, uf: str) -> Optional[Dict]:
+    """
+    Município com coordenadas do gazetteer, por nome exato (sem diferenciar
+    acentos/maiúsculas) e UF
+
+    Returns:
+        {"id", "nome", "uf", "lat", "lon", "bbox"} ou None (não encontrado ou sem coordenadas)
+    """
+    if not _gazetteer_loaded:
+        load_gazetteer()
+    found = find_municipality(name, uf, partial=False)
+    return found if found is not None and found["lat"] is not None else None
+
+
+def catalog_version() -> int:
+    """Muda sempre que o catálogo é recarregado com novo conteúdo."""
+    return _version
+
+
+def catalog_info() -> Dict:
+    """Origem, ETag e idade da cópia carregada (para /health)."""
+    fetched_at = _meta.get("fetched_at")
+    return {
+        "source": _meta.get("source"),
+        "etag": _meta.get("etag"),
+        "municipios": len(_BY_CODE),
+        "age_s": round(time.time() - fetched_at) if fetched_at else None,
+    }
@@ -7,13 +7,21 @@ Integração:
 - Fallback para bairros hardcoded se API não disponível
 """
 
-from typing import List, Dict, Optional
+import asyncio
+import logging
+import os
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 from datetime import datetime
-import httpx
-from .brasil_aberto import BrasilAbertoService
+from .district_jobs import city_key, district_jobs
+from .geocode import _normalize
+from .geocode_store import geocode_store
+from .weather_client import fetch_hourly_forecast, fetch_hourly_forecast_many, summarize_day
+from ..utils.hourly_forecast import HourlyForecast
 
-# Cache de bairros por cidade (evita múltiplas chamadas à API)
-_NEIGHBORHOODS_CACHE: Dict[str, List[Dict]] = {}
+logger = logging.getLogger(__name__)
+
+# Bairros por bloco de previsão no modo streaming (cada bloco sai assim que chega)
+NEIGHBORHOOD_STREAM_CHUNK = int(os.getenv("NEIGHBORHOOD_STREAM_CHUNK", "10"))
 
 # Bairros hardcoded como fallback se a API Brasil Aberto não estiver disponível
 KNOWN_NEIGHBORHOODS = {
@@ -44,45 +52,56 @@ KNOWN_NEIGHBORHOODS = {
 }
 
 
+_NO_WEATHER = {
+    "total_precipitation_mm": 0,
+    "avg_probability": 0,
+    "max_precipitation_mm": 0,
+}
+
+
+def _weather_summary(forecast: HourlyForecast) -> Dict:
+    """Precipitação total, probabilidade média e pico horário da previsão (via summarize_day)."""
+    summary = summarize_day(forecast)
+    return {
+        "total_precipitation_mm": round(summary["total_precipitation"], 1),
+        "avg_probability": float(summary["avg_precipitation_probability"] or 0),
+        "max_precipitation_mm": round(summary["max_precipitation"], 1),
+    }
+
+
 async def get_weather_for_location(lat: float, lon: float, forecast_days: int = 1) -> Dict:
     """
-    Busca previsão de chuva do Open-Meteo para uma localização específica
+    Resumo da previsão de chuva do Open-Meteo para uma localização específica
+    (cache compartilhado de weather_client)
     """
-    url = "https://api.open-meteo.com/v1/forecast"
-    params = {
-        "latitude": lat,
-        "longitude": lon,
-        "hourly": "precipitation,precipitation_probability",
-        "forecast_days": forecast_days,
-        "timezone": "America/Sao_Paulo",
-    }
+    try:
+        return _weather_summary(await fetch_hourly_forecast(lat, lon, forecast_days))
+    except Exception as e:
+        logger.warning("Erro ao buscar clima: %s", e)
+        return dict(_NO_WEATHER)
 
+
+async def _fetch_forecasts(points: List[Tuple[float, float]], forecast_days: int) -> Optional[List[HourlyForecast]]:
+    """Previsões dos pontos numa única chamada a fetch_hourly_forecast_many, ou None se falhar."""
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            response = await client.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-
-            # Calcula precipitação total e probabilidade média
-            hourly = data.get("hourly", {})
-            precip = hourly.get("precipitation", [])
-            prob = hourly.get("precipitation_probability", [])
-
-            total_precip = sum(precip) if precip else 0
-            avg_prob = sum(prob) / len(prob) if prob else 0
-
-            return {
-                "total_precipitation_mm": round(total_precip, 1),
-                "avg_probability": round(avg_prob, 1),
-                "max_precipitation_mm": round(max(precip), 1) if precip else 0,
-            }
+        return await fetch_hourly_forecast_many(points, forecast_days)
     except Exception as e:
-        print(f"Erro ao buscar clima: {e}")
-        return {
-            "total_precipitation_mm": 0,
-            "avg_probability": 0,
-            "max_precipitation_mm": 0,
-        }
+        logger.warning("Erro ao buscar clima: %s", e)
+        return None
+
+
+def _weather_summaries(forecasts: Optional[List[HourlyForecast]], count: int) -> List[Dict]:
+    if forecasts is None:
+        return [dict(_NO_WEATHER) for _ in range(count)]
+    return [_weather_summary(fc) for fc in forecasts]
+
+
+async def get_weather_for_locations(points: List[Tuple[float, float]], forecast_days: int = 1) -> List[Dict]:
+    """
+    Versão em lote de get_weather_for_location: uma única chamada a
+    fetch_hourly_forecast_many (pontos em cache não são buscados de novo)
+    """
+    return _weather_summaries(await _fetch_forecasts(points, forecast_days), len(points))
 
 
 def calculate_risk_from_precipitation(precip_mm: float, probability: float) -> str:
@@ -119,128 +138,273 @@ def create_polygon_around_point(lat: float, lon: float, size_km: float = 1.0) ->
     ]
 
 
-async def get_neighborhoods_with_weather(
-    city: str,
-    uf: str,
-    forecast_days: int = 1,
-    risk_level: Optional[str] = None,
-) -> Dict:
-    """
-    Retorna GeoJSON com bairros e suas previsões de chuva
+# Cores do polígono por nível de risco
+_COLORS = {
+    "high": {"fill": "#dc2626", "stroke": "#991b1b"},
+    "medium": {"fill": "#f59e0b", "stroke": "#d97706"},
+    "low": {"fill": "#10b981", "stroke": "#059669"},
+}
 
-    Estratégia:
-    1. Verifica cache de bairros
-    2. Se não encontrado, busca na API Brasil Aberto
-    3. Se API não disponível, usa bairros hardcoded
-    4. Para cada bairro, busca previsão do Open-Meteo
-    5. Calcula risco baseado em precipitação
 
-    Args:
-        city: Nome da cidade
-        uf: Sigla do estado
-        forecast_days: Dias de previsão (1-7)
-        risk_level: Filtro opcional por nível (low/medium/high)
+async def _resolve_neighborhoods(city: str, uf: str) -> Tuple[List[Dict], Optional[Dict]]:
+    """
+    Bairros da cidade: lista completa do cache, ou os já resolvidos pela fila
+    de geocodificação (com os hardcoded como complemento/fallback)
 
     Returns:
-        GeoJSON FeatureCollection com polígonos de bairros
+        (bairros, progresso da fila ou None se a lista já é a completa: do
+        cache, ou os bairros conhecidos quando não há API Key)
     """
-    # 1. Verifica cache
-    cache_key = f"{city}|{uf}".lower()
-    if cache_key in _NEIGHBORHOODS_CACHE:
+    # 1. Verifica cache persistente de bairros por cidade (lista completa já geocodificada)
+    cache_key = city_key(city, uf)
+    _, cached = await geocode_store.aget("neighborhoods", cache_key)
+    if cached:
         print(f"✅ Usando bairros do cache para {city}/{uf}")
-        neighborhoods = _NEIGHBORHOODS_CACHE[cache_key]
-    else:
-        # 2. Tenta buscar da API Brasil Aberto
-        print(f"🔍 Buscando bairros de {city}/{uf} na API Brasil Aberto...")
-        brasil_aberto = BrasilAbertoService()
-        neighborhoods = await brasil_aberto.get_districts_with_coordinates(city, uf)
+        return cached, None
+
+    if not district_jobs.enabled():
+        # sem API Key: a resposta com os bairros conhecidos já é a completa
+        return KNOWN_NEIGHBORHOODS.get(city, []), None
 
-        # 3. Fallback para bairros hardcoded
+    # 2. Fila de geocodificação (Brasil Aberto + Nominatim) em segundo plano:
+    #    responde já com os bairros resolvidos até agora
+    job = await district_jobs.ensure(city, uf)
+    progress = job["progress"]
+    neighborhoods = job["districts"]
+
+    if progress["status"] == "done":
+        # 3. Fallback para bairros hardcoded se a API não retornou bairros
+        #    (nunca gravado no cache: não é a lista da cidade)
         if not neighborhoods:
             print(f"⚠️  API Brasil Aberto não retornou bairros. Usando hardcoded.")
             neighborhoods = KNOWN_NEIGHBORHOODS.get(city, [])
         else:
-            print(f"✅ Encontrados {len(neighborhoods)} bairros via Brasil Aberto API")
+            await geocode_store.aset("neighborhoods", cache_key, neighborhoods)
+    else:
+        # enquanto a fila trabalha, completa com os bairros conhecidos ainda não resolvidos
+        resolved = {_normalize(n["name"]) for n in neighborhoods}
+        neighborhoods = neighborhoods + [
+            n for n in KNOWN_NEIGHBORHOODS.get(city, []) if _normalize(n["name"]) not in resolved
+        ]
+    return neighborhoods, progress
+
+
+def _neighborhood_feature(neighborhood: Dict, weather: Dict, city: str, uf: str) -> Tuple[str, Dict]:
+    """(nível de risco, Feature GeoJSON do bairro)"""
+    # Calcula risco baseado na precipitação
+    risk = calculate_risk_from_precipitation(
+        weather["total_precipitation_mm"],
+        weather["avg_probability"],
+    )
+    color = _COLORS.get(risk, _COLORS["low"])
+
+    # Cria polígono ao redor do bairro
+    polygon = create_polygon_around_point(
+        neighborhood["lat"],
+        neighborhood["lon"],
+        size_km=1.5,  # Polígonos de 1.5km²
+    )
+
+    return risk, {
+        "type": "Feature",
+        "geometry": {
+            "type": "Polygon",
+            "coordinates": [polygon],
+        },
+        "properties": {
+            "name": neighborhood["name"],
+            "city": city,
+            "uf": uf,
+            "riskLevel": risk,
+            "weather": weather,
+            "fillColor": color["fill"],
+            "strokeColor": color["stroke"],
+            "fillOpacity": 0.4 if risk == "high" else 0.3,
+        },
+    }
+
+
+def _empty_metadata(city: str, uf: str, partial: bool, progress: Optional[Dict]) -> Dict:
+    return {
+        "city": city,
+        "uf": uf,
+        "message": f"Nenhum bairro cadastrado para {city}",
+        "total_features": 0,
+        "partial": partial,
+        "geocoding": progress,
+    }
+
+
+def _metadata(
+    city: str,
+    uf: str,
+    forecast_days: int,
+    risk_level: Optional[str],
+    total: int,
+    partial: bool,
+    progress: Optional[Dict],
+) -> Dict:
+    return {
+        "city": city,
+        "uf": uf,
+        "forecast_days": forecast_days,
+        "total_features": total,
+        "filtered_by_risk": risk_level,
+        # progresso da geocodificação em segundo plano (None: lista completa em cache)
+        "partial": partial,
+        "geocoding": progress,
+    }
 
-        # Armazena no cache
-        if neighborhoods:
-            _NEIGHBORHOODS_CACHE[cache_key] = neighborhoods
+
+async def _neighborhood_events(
+    city: str,
+    uf: str,
+    forecast_days: int,
+    risk_level: Optional[str],
+    chunk_size: Optional[int],
+) -> AsyncIterator[Tuple[int, Dict]]:
+    """
+    Gera (índice do bairro, Feature) à medida que a previsão de cada bloco de
+    `chunk_size` bairros chega (None = todos num bloco só) e, por último,
+    (-1, metadata).
+    """
+    neighborhoods, progress = await _resolve_neighborhoods(city, uf)
+    partial = progress is not None and progress["status"] != "done"
 
     if not neighborhoods:
-        return {
-            "type": "FeatureCollection",
-            "features": [],
-            "metadata": {
-                "city": city,
-                "uf": uf,
-                "message": f"Nenhum bairro cadastrado para {city}",
-                "total_features": 0,
-            },
-        }
+        yield -1, _empty_metadata(city, uf, partial, progress)
+        return
 
-    features = []
+    size = chunk_size or len(neighborhoods)
+    chunks = [(start, neighborhoods[start:start + size]) for start in range(0, len(neighborhoods), size)]
 
-    # Para cada bairro, busca a previsão de chuva
-    for neighborhood in neighborhoods:
-        weather = await get_weather_for_location(
-            neighborhood["lat"],
-            neighborhood["lon"],
-            forecast_days,
-        )
+    async def fetch(start: int, chunk: List[Dict]) -> Tuple[int, List[Dict], List[Dict]]:
+        # Previsão do bloco de uma vez (cache + lote do Open-Meteo)
+        weathers = await get_weather_for_locations([(n["lat"], n["lon"]) for n in chunk], forecast_days)
+        return start, chunk, weathers
 
-        # Calcula risco baseado na precipitação
-        risk = calculate_risk_from_precipitation(
-            weather["total_precipitation_mm"],
-            weather["avg_probability"],
-        )
+    total = 0
+    tasks = [asyncio.ensure_future(fetch(start, chunk)) for start, chunk in chunks]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            start, chunk, weathers = await next_done
+            for offset, (neighborhood, weather) in enumerate(zip(chunk, weathers)):
+                risk, feature = _neighborhood_feature(neighborhood, weather, city, uf)
+                # Filtra por nível de risco se especificado
+                if risk_level and risk != risk_level:
+                    continue
+                total += 1
+                yield start + offset, feature
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    yield -1, _metadata(city, uf, forecast_days, risk_level, total, partial, progress)
+
+
+async def iter_neighborhoods_with_weather(
+    city: str,
+    uf: str,
+    forecast_days: int = 1,
+    risk_level: Optional[str] = None,
+    chunk_size: int = NEIGHBORHOOD_STREAM_CHUNK,
+) -> AsyncIterator[Dict]:
+    """
+    Versão em streaming de get_neighborhoods_with_weather: cada Feature assim
+    que a previsão do seu bloco chega (em ordem de conclusão) e, no fim,
+    {"type": "summary", ...metadata}.
+    """
+    async for idx, record in _neighborhood_events(city, uf, forecast_days, risk_level, chunk_size):
+        yield record if idx >= 0 else {"type": "summary", **record}
 
+
+async def load_neighborhoods(city: str, uf: str, forecast_days: int = 1) -> Dict:
+    """
+    Entradas de get_neighborhoods_with_weather, ainda sem montar as Features:
+    bairros resolvidos, progresso da geocodificação e a previsão horária de
+    cada bairro (do cache compartilhado, ou None se a busca falhou)
+    """
+    neighborhoods, progress = await _resolve_neighborhoods(city, uf)
+    forecasts = (
+        await _fetch_forecasts([(n["lat"], n["lon"]) for n in neighborhoods], forecast_days) if neighborhoods else []
+    )
+    return {
+        "city": city,
+        "uf": uf,
+        "forecast_days": forecast_days,
+        "neighborhoods": neighborhoods,
+        "progress": progress,
+        "partial": progress is not None and progress["status"] != "done",
+        "forecasts": forecasts,
+    }
+
+
+def neighborhoods_version(loaded: Dict, risk_level: Optional[str] = None) -> Tuple:
+    """
+    Versão do resultado (para o ETag), calculada das entradas de
+    load_neighborhoods antes de render_neighborhoods: bairros e coordenadas,
+    progresso da geocodificação e fingerprint da previsão de cada bairro. O
+    resumo da chuva, o risco e as Features derivam disso, então não entram.
+    """
+    forecasts = loaded["forecasts"]
+    return (
+        loaded["city"],
+        loaded["uf"],
+        loaded["forecast_days"],
+        risk_level,
+        tuple((n["name"], n["lat"], n["lon"]) for n in loaded["neighborhoods"]),
+        repr(loaded["progress"]),
+        tuple(fc.fingerprint() for fc in forecasts) if forecasts is not None else None,
+    )
+
+
+def render_neighborhoods(loaded: Dict, risk_level: Optional[str] = None) -> Dict:
+    """FeatureCollection a partir das entradas de load_neighborhoods (resumo da chuva e risco de cada bairro)."""
+    city, uf, neighborhoods = loaded["city"], loaded["uf"], loaded["neighborhoods"]
+    if not neighborhoods:
+        metadata = _empty_metadata(city, uf, loaded["partial"], loaded["progress"])
+        return {"type": "FeatureCollection", "features": [], "metadata": metadata}
+
+    features = []
+    for neighborhood, weather in zip(neighborhoods, _weather_summaries(loaded["forecasts"], len(neighborhoods))):
+        risk, feature = _neighborhood_feature(neighborhood, weather, city, uf)
         # Filtra por nível de risco se especificado
         if risk_level and risk != risk_level:
             continue
-
-        # Define cor baseada no risco
-        colors = {
-            "high": {"fill": "#dc2626", "stroke": "#991b1b"},
-            "medium": {"fill": "#f59e0b", "stroke": "#d97706"},
-            "low": {"fill": "#10b981", "stroke": "#059669"},
-        }
-
-        color = colors.get(risk, colors["low"])
-
-        # Cria polígono ao redor do bairro
-        polygon = create_polygon_around_point(
-            neighborhood["lat"],
-            neighborhood["lon"],
-            size_km=1.5,  # Polígonos de 1.5km²
-        )
-
-        feature = {
-            "type": "Feature",
-            "geometry": {
-                "type": "Polygon",
-                "coordinates": [polygon],
-            },
-            "properties": {
-                "name": neighborhood["name"],
-                "city": city,
-                "uf": uf,
-                "riskLevel": risk,
-                "weather": weather,
-                "fillColor": color["fill"],
-                "strokeColor": color["stroke"],
-                "fillOpacity": 0.4 if risk == "high" else 0.3,
-            },
-        }
         features.append(feature)
-
     return {
         "type": "FeatureCollection",
         "features": features,
-        "metadata": {
-            "city": city,
-            "uf": uf,
-            "forecast_days": forecast_days,
-            "total_features": len(features),
-            "filtered_by_risk": risk_level,
-        },
+        "metadata": _metadata(
+            city, uf, loaded["forecast_days"], risk_level, len(features), loaded["partial"], loaded["progress"]
+        ),
     }
+
+
+async def get_neighborhoods_with_weather(
+    city: str,
+    uf: str,
+    forecast_days: int = 1,
+    risk_level: Optional[str] = None,
+) -> Dict:
+    """
+    Retorna GeoJSON com bairros e suas previsões de chuva
+
+    Estratégia:
+    1. Verifica cache de bairros
+    2. Se não encontrado, enfileira a geocodificação da cidade (district_jobs)
+       e segue com os bairros já resolvidos (metadata.partial / geocoding)
+    3. Se API não disponível, usa bairros hardcoded
+    4. Busca a previsão de todos os bairros em lote (cache compartilhado)
+    5. Calcula risco baseado em precipitação
+
+    Args:
+        city: Nome da cidade
+        uf: Sigla do estado
+        forecast_days: Dias de previsão (1-7)
+        risk_level: Filtro opcional por nível (low/medium/high)
+
+    Returns:
+        GeoJSON FeatureCollection com polígonos de bairros
+    """
+    return render_neighborhoods(await load_neighborhoods(city, uf, forecast_days), risk_level)
@@ -0,0 +1,142 @@
+"""
+Agendador global de requisições ao Nominatim
+
+A política de uso do Nominatim permite ~1 requisição por segundo. Todas as
+chamadas do processo passam por uma única fila com token bucket:
+
+- a fila é atendida por prioridade (PRIORITY_INTERACTIVE antes de
+  PRIORITY_BACKGROUND) e, dentro da mesma prioridade, por ordem de chegada
+- consultas idênticas já na fila ou em andamento compartilham a mesma resposta
+- quem espera não bloqueia o event loop (nada de asyncio.sleep dentro de loops
+  de serviço)
+"""
+
+import asyncio
+import itertools
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+NOMINATIM_RATE_PER_S = float(os.getenv("NOMINATIM_RATE_PER_S", "1.0"))
+NOMINATIM_BURST = int(os.getenv("NOMINATIM_BURST", "1"))
+
+# Consultas de usuários (/geocode, /risk/by-city) passam na frente das de fundo
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+
+class TokenBucket:
+    """Token bucket simples: `rate` tokens por segundo, até `capacity` acumulados."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> None:
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class NominatimScheduler:
+    """Fila única com prioridade, rate limit e deduplicação de consultas."""
+
+    def __init__(self, rate: float = NOMINATIM_RATE_PER_S, burst: int = NOMINATIM_BURST):
+        self._bucket = TokenBucket(rate, burst)
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # chave -> (future compartilhado, melhor prioridade já enfileirada)
+        self._inflight: Dict[Tuple, Tuple[asyncio.Future, int]] = {}
+        self._seq = itertools.count()
+        self.stats = {"requests": 0, "merged": 0}
+
+    def _ensure_worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._worker.get_loop() is not loop:
+            self._queue = asyncio.PriorityQueue()
+            self._inflight.clear()
+            self._worker = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            # espera o token antes de escolher o item, para que a escolha considere
+            # a consulta mais prioritária que chegou durante a espera
+            await self._bucket.acquire()
+            while True:
+                _prio, _seq, key, call = await self._queue.get()
+                entry = self._inflight.get(key)
+                # entrada duplicada (consulta promovida de prioridade) já atendida
+                if entry is not None and not entry[0].done():
+                    break
+            fut = entry[0]
+            try:
+                self.stats["requests"] += 1
+                result = await call()
+            except asyncio.CancelledError:
+                fut.cancel()
+                raise
+            except Exception as exc:  # noqa: BLE001
+                fut.set_exception(exc)
+            else:
+                fut.set_result(result)
+            finally:
+                self._inflight.pop(key, None)
+
+    async def submit(
+        self,
+        key: Tuple,
+        call: Callable[[], Awaitable[Any]],
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> Any:
+        """
+        Enfileira uma chamada ao Nominatim e aguarda o resultado
+
+        Args:
+            key: Identifica a consulta; chamadas com a mesma chave são mescladas
+            call: Função assíncrona que faz a requisição
+            priority: PRIORITY_INTERACTIVE ou PRIORITY_BACKGROUND
+        """
+        self._ensure_worker()
+        entry = self._inflight.get(key)
+        if entry is not None:
+            fut, queued_priority = entry
+            self.stats["merged"] += 1
+            if priority < queued_priority:
+                # consulta interativa pegando carona em uma de fundo: promove na fila
+                self._inflight[key] = (fut, priority)
+                self._queue.put_nowait((priority, next(self._seq), key, call))
+            return await asyncio.shield(fut)
+
+        fut = asyncio.get_running_loop().create_future()
+        # evita "exception was never retrieved" se todos os interessados desistirem
+        fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = (fut, priority)
+        self._queue.put_nowait((priority, next(self._seq), key, call))
+        return await asyncio.shield(fut)
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        for fut, _ in self._inflight.values():
+            if not fut.done():
+                fut.cancel()
+        self._inflight.clear()
+
+
+# Instância única do processo
+nominatim_scheduler = NominatimScheduler()
@@ -1,35 +1,214 @@
-﻿import json
+﻿"""
+Regiões (GeoJSON de UFs e municípios) servidas de um GeoStore
+
+As geometrias ficam em data/ibge/*.geostore (utils/geostore.py): vetores
+planos de coordenadas, já com a pirâmide de LOD (utils/simplify.py, preservando
+as divisas) e os municípios agrupados por UF, gerados por
+tools/build_geostore.py. O arquivo é aberto com mmap no startup (quase
+instantâneo, páginas compartilhadas entre os workers) e o GeoJSON só é montado
+para as features que a resposta devolve; os corpos de /regions já codificados
+ficam num LRU limitado por tamanho.
+
+Sem o .geostore, o GeoJSON de origem é lido e convertido em memória (lento
+para bases grandes).
+"""
+
+import logging
+import os
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
+
+import orjson
+from cachetools import LRUCache
+
+from ..utils.geostore import GeoStore, encode_store, write_store
+from ..utils.simplify import build_lod, lod_level
+from ..utils.spatial_index import STRTree
+
+logger = logging.getLogger(__name__)
 
 DATA_DIR = Path(__file__).resolve().parents[2] / "data" / "ibge"
 
+# level -> (GeoJSON de origem, arquivo binário)
+SOURCES = {
+    "state": (DATA_DIR / "uf.json", DATA_DIR / "uf.geostore"),
+    "city": (DATA_DIR / "municipios.geojson", DATA_DIR / "municipios.geostore"),
+}
+
+# Limite (MB) dos corpos de /regions já codificados mantidos em memória
+REGIONS_PAYLOAD_CACHE_MB = float(os.getenv("REGIONS_PAYLOAD_CACHE_MB", "64"))
+
+# chaves comuns de UF em bases do IBGE
+_UF_KEYS = ("UF", "uf", "SIGLA", "sigla")
+
+_EMPTY_COLLECTION = orjson.dumps({"type": "FeatureCollection", "features": []})
+
+_STORES: Dict[str, GeoStore] = {}
+# R-tree por level sobre a bbox da geometria original (posições na R-tree -> índices em _INDEXED)
+_TREES: Dict[str, STRTree] = {}
+_INDEXED: Dict[str, List[int]] = {}
+# (level, uf, nível de LOD) -> corpo codificado
+_PAYLOADS = LRUCache(maxsize=int(REGIONS_PAYLOAD_CACHE_MB * 1024 * 1024), getsizeof=len)
+# incrementado a cada carga (invalida tiles em cache)
+_version = 0
+_loaded = False
+
 def _read_json(path: Path):
     if not path.exists():
         return None
-    return json.loads(path.read_text(encoding="utf-8-sig"))
+    return orjson.loads(path.read_bytes().removeprefix(b"\xef\xbb\xbf"))
 
-def load_regions_geojson(level: str, uf: Optional[str] = None):
+def _feature_uf(feature: Dict) -> str:
+    props = feature.get("properties") or {}
+    for key in _UF_KEYS:
+        if props.get(key):
+            return str(props[key]).upper()
+    return ""
+
+def _region_pyramid(collection: Dict) -> Tuple[Dict, Dict]:
+    """Pirâmide de LOD e metadados (membros da coleção, índices por UF) para o GeoStore."""
+    features = collection.get("features", [])
+    groups: Dict[str, List[int]] = {}
+    for i, f in enumerate(features):
+        uf = _feature_uf(f)
+        if uf:
+            groups.setdefault(uf, []).append(i)
+    meta = {
+        "collection": {k: v for k, v in collection.items() if k != "features"},
+        "groups": groups,
+    }
+    # simplifica a coleção inteira (divisas entre UFs também ficam consistentes)
+    return build_lod(features), meta
+
+def build_region_stores() -> Dict[str, int]:
     """
-    level=state  -> lê uf.json (FeatureCollection de UFs)
-    level=city   -> lê municipios.geojson (FeatureCollection) e filtra por UF (se fornecido)
+    Gera os .geostore a partir do GeoJSON de data/ibge (usado por tools/)
+
+    Returns:
+        {caminho do arquivo: tamanho em bytes}
     """
-    if level == "state":
-        return _read_json(DATA_DIR / "uf.json")
+    written = {}
+    for source, target in SOURCES.values():
+        collection = _read_json(source)
+        if collection is None:
+            continue
+        pyramid, meta = _region_pyramid(collection)
+        written[str(target)] = write_store(target, pyramid, meta)
+    return written
 
-    if level == "city":
-        gj = _read_json(DATA_DIR / "municipios.geojson")
-        if gj is None:
-            return None
-        if uf:
-            feats = []
-            for f in gj.get("features", []):
-                props = f.get("properties") or {}
-                # tenta várias chaves comuns de UF em bases do IBGE
-                sigla = (props.get("UF") or props.get("uf") or props.get("SIGLA") or props.get("sigla") or "").upper()
-                if sigla == uf.upper():
-                    feats.append(f)
-            return {"type": "FeatureCollection", "features": feats}
-        return gj
-
-    return None
+def _open_store(level: str) -> Optional[GeoStore]:
+    source, target = SOURCES[level]
+    if target.exists():
+        if source.exists() and source.stat().st_mtime > target.stat().st_mtime:
+            logger.warning("%s é mais novo que %s; rode tools/build_geostore.py", source.name, target.name)
+        return GeoStore.open(target)
+    collection = _read_json(source)
+    if collection is None:
+        return None
+    logger.info("%s não encontrado; convertendo %s em memória", target.name, source.name)
+    return GeoStore(encode_store(*_region_pyramid(collection)))
+
+def load_regions() -> Dict[str, int]:
+    """
+    (Re)abre os GeoStores de UFs e municípios e monta as R-trees
+
+    Returns:
+        {"states": nº de features de UF, "cities": nº de municípios, "ufs": nº de partições}
+    """
+    global _loaded, _version
+    stores = {level: store for level in SOURCES if (store := _open_store(level)) is not None}
+
+    trees, indexed = {}, {}
+    for level, store in stores.items():
+        ids = [i for i in range(len(store)) if store.has_geometry(i)]
+        indexed[level] = ids
+        trees[level] = STRTree([store.bbox(i) for i in ids])
+
+    _STORES.clear()
+    _STORES.update(stores)
+    _TREES.clear()
+    _TREES.update(trees)
+    _INDEXED.clear()
+    _INDEXED.update(indexed)
+    _PAYLOADS.clear()
+    _version += 1
+    _loaded = True
+    cities = stores.get("city")
+    return {
+        "states": len(stores["state"]) if "state" in stores else 0,
+        "cities": len(cities) if cities else 0,
+        "ufs": len(cities.meta.get("groups", {})) if cities else 0,
+    }
+
+def _encode(store: GeoStore, ids, lod: Optional[int], collection: Dict) -> bytes:
+    return orjson.dumps({**collection, "features": [store.feature(i, lod) for i in ids]})
+
+def regions_payload(level: str, uf: Optional[str] = None, zoom: Optional[int] = None) -> Optional[bytes]:
+    """
+    Corpo JSON já codificado de /regions
+
+    level=state  -> FeatureCollection de UFs (uf.json)
+    level=city   -> FeatureCollection de municípios (municipios.geojson), só da UF se fornecida
+    zoom         -> geometria simplificada para o zoom (sem zoom: resolução original)
+
+    Returns:
+        bytes, ou None se o arquivo não estiver disponível
+    """
+    if not _loaded:
+        load_regions()
+
+    store = _STORES.get(level)
+    if store is None:
+        return None
+    lod = lod_level(zoom, store.levels)
+    uf = uf.upper() if (uf and level == "city") else None
+
+    key = (level, uf, lod)
+    payload = _PAYLOADS.get(key)
+    if payload is not None:
+        return payload
+
+    if uf:
+        ids = store.meta.get("groups", {}).get(uf)
+        if not ids:
+            return _EMPTY_COLLECTION
+        payload = _encode(store, ids, lod, {"type": "FeatureCollection"})
+    else:
+        payload = _encode(store, range(len(store)), lod, store.meta.get("collection", {}))
+
+    if len(payload) <= _PAYLOADS.maxsize:
+        _PAYLOADS[key] = payload
+    return payload
+
+def regions_tag(level: str, uf: Optional[str] = None, zoom: Optional[int] = None) -> Optional[Tuple]:
+    """
+    Identifica o corpo de regions_payload sem montá-lo (para o ETag de
+    /regions): (digest do GeoStore, level, uf, nível de LOD). None se o
+    arquivo não estiver disponível.
+    """
+    if not _loaded:
+        load_regions()
+    store = _STORES.get(level)
+    if store is None:
+        return None
+    uf = uf.upper() if (uf and level == "city") else None
+    return store.digest or f"v{_version}", level, uf, lod_level(zoom, store.levels)
+
+def regions_features_in_bbox(level: str, bbox: Tuple[float, float, float, float], zoom: Optional[int] = None) -> List[Dict]:
+    """
+    Features (geometria do nível de LOD do zoom) cuja bbox intersecta a caixa,
+    sem recorte. level: "state" ou "city".
+    """
+    if not _loaded:
+        load_regions()
+    store = _STORES.get(level)
+    tree = _TREES.get(level)
+    if store is None or tree is None:
+        return []
+    lod = lod_level(zoom, store.levels)
+    indexed = _INDEXED[level]
+    return [store.feature(indexed[i], lod) for i in sorted(tree.query(bbox))]
+
+def regions_version() -> int:
+    """Muda a cada recarga das regiões."""
+    return _version
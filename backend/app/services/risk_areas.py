@@ -1,12 +1,21 @@
 """
 Serviço para fornecer áreas de risco de alagamento em formato GeoJSON.
 Por enquanto usa dados mock focados em São Paulo/SP.
+
+As áreas ficam em um índice espacial (R-tree STR) montado no carregamento
+(load_risk_areas), e as consultas por raio ou bbox só examinam as candidatas
+devolvidas pelo índice, com distância real ao polígono. No mesmo carregamento
+são pré-calculadas versões simplificadas dos polígonos por nível de zoom.
 """
 
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 from datetime import datetime, timedelta
 import random
 
+from ..utils.geo import BBox, polygon_distance_km, polygon_intersects_bbox, radius_bbox, rings_bbox
+from ..utils.simplify import build_lod, lod_level, zoom_tolerance
+from ..utils.spatial_index import STRTree
+
 # Mock: áreas de risco conhecidas em São Paulo (coordenadas aproximadas)
 # Cada área tem um polígono e um nível de risco base
 MOCK_RISK_AREAS = [
@@ -90,6 +99,93 @@ MOCK_RISK_AREAS = [
 ]
 
 
+# Áreas carregadas e R-tree sobre as bbox dos polígonos (mesma ordem)
+_AREAS: List[Dict] = []
+_INDEX: Optional[STRTree] = None
+# nível de LOD (None = original) -> anel simplificado de cada área (mesma ordem de _AREAS)
+_LOD_RINGS: Dict[Optional[int], List[List]] = {}
+# incrementado a cada recálculo da camada (invalida tiles em cache)
+_version = 0
+
+# Abaixo deste tamanho (em pixels) no zoom pedido, a área vira um ponto no centroide
+MIN_AREA_PIXELS = 2
+
+
+def load_risk_areas(areas: Optional[List[Dict]] = None) -> int:
+    """
+    (Re)constrói o índice espacial das áreas de risco
+
+    Args:
+        areas: [{"name", "base_risk", "polygon": [[lon, lat], ...]}]
+            (padrão: MOCK_RISK_AREAS)
+
+    Returns:
+        Número de áreas indexadas
+    """
+    global _AREAS, _INDEX, _version
+    _AREAS = list(MOCK_RISK_AREAS if areas is None else areas)
+    _INDEX = STRTree([rings_bbox([area["polygon"]]) for area in _AREAS])
+    pyramid = build_lod([
+        {"type": "Feature", "geometry": {"type": "Polygon", "coordinates": [area["polygon"]]}}
+        for area in _AREAS
+    ])
+    _LOD_RINGS.clear()
+    _LOD_RINGS.update({
+        level: [f["geometry"]["coordinates"][0] for f in feats]
+        for level, feats in pyramid.items()
+    })
+    _version += 1
+    return len(_AREAS)
+
+
+def risk_areas_version() -> int:
+    """Muda a cada recálculo das áreas de risco."""
+    return _version
+
+
+def _area_geometry(i: int, zoom: Optional[int]) -> Dict:
+    """Polígono no nível de detalhe do zoom, ou ponto no centroide se ficar menor que MIN_AREA_PIXELS."""
+    ring = _LOD_RINGS[lod_level(zoom)][i]
+    if zoom is not None:
+        min_lon, min_lat, max_lon, max_lat = rings_bbox([ring])
+        if max(max_lon - min_lon, max_lat - min_lat) < MIN_AREA_PIXELS * zoom_tolerance(zoom):
+            pts = ring[:-1] or ring
+            return {
+                "type": "Point",
+                "coordinates": [sum(p[0] for p in pts) / len(pts), sum(p[1] for p in pts) / len(pts)],
+            }
+    return {"type": "Polygon", "coordinates": [ring]}
+
+
+def _ensure_index() -> None:
+    if _INDEX is None:
+        load_risk_areas()
+
+
+def find_areas_within(lat: float, lon: float, radius_km: float) -> List[Tuple[int, float]]:
+    """
+    Áreas a até `radius_km` do ponto (distância até a borda do polígono; 0 se
+    o ponto estiver dentro)
+
+    Returns:
+        [(posição em _AREAS, distância em km)], da mais próxima para a mais distante
+    """
+    _ensure_index()
+    found = []
+    for i in _INDEX.query(radius_bbox(lat, lon, radius_km)):
+        dist = polygon_distance_km(lat, lon, [_AREAS[i]["polygon"]])
+        if dist <= radius_km:
+            found.append((i, dist))
+    found.sort(key=lambda item: (item[1], item[0]))
+    return found
+
+
+def find_areas_in_bbox(bbox: BBox) -> List[int]:
+    """Posições (em _AREAS) das áreas cujo polígono intersecta a caixa."""
+    _ensure_index()
+    return sorted(i for i in _INDEX.query(bbox) if polygon_intersects_bbox([_AREAS[i]["polygon"]], bbox))
+
+
 def _adjust_risk_by_day(base_risk: str, days_from_today: int) -> str:
     """
     Ajusta o nível de risco baseado no dia
@@ -137,19 +233,50 @@ def _risk_level_to_properties(level: str) -> Dict:
         }
 
 
+def _area_properties(area: Dict, level: str, date: str) -> Dict:
+    return {
+        "name": area["name"],
+        "riskLevel": level,
+        "riskScore": {"low": 0.3, "medium": 0.6, "high": 0.85}[level],
+        "date": date,
+        **_risk_level_to_properties(level),
+    }
+
+
+def risk_area_features_in_bbox(bbox: BBox, zoom: Optional[int] = None) -> List[Dict]:
+    """
+    Features do dia (geometria do nível de LOD do zoom) das áreas cuja bbox
+    intersecta a caixa, sem recorte (usado pelos tiles)
+    """
+    _ensure_index()
+    today = datetime.now().strftime("%Y-%m-%d")
+    return [
+        {
+            "type": "Feature",
+            "geometry": _area_geometry(i, zoom),
+            "properties": _area_properties(_AREAS[i], _AREAS[i]["base_risk"], today),
+        }
+        for i in sorted(_INDEX.query(bbox))
+    ]
+
+
 def get_risk_areas_geojson(
     lat: float,
     lon: float,
     radius_km: float = 10.0,
     risk_level: Optional[str] = None,
     date: Optional[str] = None,
+    bbox: Optional[BBox] = None,
+    zoom: Optional[int] = None,
 ) -> Dict:
     """
     Retorna GeoJSON com áreas de risco filtradas por:
     - lat/lon: centro da busca
-    - radius_km: raio em km (padrão: 10km)
+    - radius_km: raio em km (padrão: 10km), medido até a borda de cada área
     - risk_level: filtro opcional por nível (low/medium/high)
     - date: data de previsão (YYYY-MM-DD), afeta o risco calculado
+    - bbox: (min_lon, min_lat, max_lon, max_lat); se informado, substitui o raio
+    - zoom: nível de zoom do mapa; escolhe a geometria simplificada correspondente
 
     Retorna FeatureCollection em formato GeoJSON
     """
@@ -165,10 +292,13 @@ def get_risk_areas_geojson(
 
     features = []
 
-    # TODO: Implementar filtro por distância real (lat/lon vs radius_km)
-    # Por enquanto, retorna todas as áreas de São Paulo
+    if bbox is not None:
+        candidates = [(i, None) for i in find_areas_in_bbox(bbox)]
+    else:
+        candidates = find_areas_within(lat, lon, radius_km)
 
-    for area in MOCK_RISK_AREAS:
+    for i, distance in candidates:
+        area = _AREAS[i]
         # Ajusta risco baseado no dia
         adjusted_risk = _adjust_risk_by_day(area["base_risk"], days_from_today)
 
@@ -177,22 +307,13 @@ def get_risk_areas_geojson(
             continue
 
         # Cria Feature GeoJSON
-        visual_props = _risk_level_to_properties(adjusted_risk)
-
         feature = {
             "type": "Feature",
-            "geometry": {
-                "type": "Polygon",
-                "coordinates": [area["polygon"]],
-            },
-            "properties": {
-                "name": area["name"],
-                "riskLevel": adjusted_risk,
-                "riskScore": {"low": 0.3, "medium": 0.6, "high": 0.85}[adjusted_risk],
-                "date": date or datetime.now().strftime("%Y-%m-%d"),
-                **visual_props,
-            },
+            "geometry": _area_geometry(i, zoom),
+            "properties": _area_properties(area, adjusted_risk, date or datetime.now().strftime("%Y-%m-%d")),
         }
+        if distance is not None:
+            feature["properties"]["distanceKm"] = round(distance, 3)
         features.append(feature)
 
     return {
@@ -201,52 +322,11 @@ def get_risk_areas_geojson(
         "metadata": {
             "center": {"lat": lat, "lon": lon},
             "radius_km": radius_km,
+            "bbox": list(bbox) if bbox is not None else None,
             "filter_risk_level": risk_level,
+            "zoom": zoom,
+            "lod_level": lod_level(zoom),
             "date": date or datetime.now().strftime("%Y-%m-%d"),
             "total_features": len(features),
         },
     }
-
-
-def get_simplified_risk_areas(
-    lat: float,
-    lon: float,
-    zoom_level: int = 10,
-) -> Dict:
-    """
-    Retorna áreas de risco simplificadas baseadas no nível de zoom
-    Para zoom < 12, agrupa polígonos próximos
-    """
-    if zoom_level >= 12:
-        # Zoom alto: retorna polígonos completos
-        return get_risk_areas_geojson(lat, lon)
-
-    # Zoom baixo: retorna apenas centroides como pontos
-    features = []
-    for area in MOCK_RISK_AREAS:
-        polygon = area["polygon"]
-        # Calcula centroide simples
-        avg_lon = sum(p[0] for p in polygon) / len(polygon)
-        avg_lat = sum(p[1] for p in polygon) / len(polygon)
-
-        feature = {
-            "type": "Feature",
-            "geometry": {
-                "type": "Point",
-                "coordinates": [avg_lon, avg_lat],
-            },
-            "properties": {
-                "name": area["name"],
-                "riskLevel": area["base_risk"],
-            },
-        }
-        features.append(feature)
-
-    return {
-        "type": "FeatureCollection",
-        "features": features,
-        "metadata": {
-            "simplified": True,
-            "zoom_level": zoom_level,
-        },
-    }
@@ -0,0 +1,161 @@
+"""
+Tiles GeoJSON (/tiles/{layer}/{z}/{x}/{y}) para o mapa
+
+Em vez de baixar a FeatureCollection inteira a cada movimento do mapa, o
+cliente pede só os tiles XYZ (Web Mercator, 256 px) visíveis. Cada tile traz as
+geometrias do nível de LOD do zoom (utils/simplify.py), recortadas na área do
+tile com uma pequena margem (TILE_BUFFER_PX) para não aparecerem emendas.
+
+Camadas: "states" e "cities" (regiões do IBGE) e "risk" (áreas de risco).
+
+Os tiles codificados ficam num LRU (TILE_CACHE_SIZE). A chave inclui a versão
+da camada: ao recarregar as regiões ou recalcular as áreas de risco, o próximo
+tile pedido da camada descarta os tiles da versão anterior. O cache é lido e
+gravado no loop de eventos; só a montagem de um tile que falta (consulta ao
+R-tree, recorte e codificação, que é CPU) roda numa thread.
+"""
+
+import asyncio
+import math
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from cachetools import LRUCache
+
+from .regions import regions_features_in_bbox, regions_version
+from .risk_areas import risk_area_features_in_bbox, risk_areas_version
+from ..utils.geo import BBox, clip_ring
+from ..utils.json_cache import encode_json
+
+TILE_SIZE = 256
+TILE_BUFFER_PX = int(os.getenv("TILE_BUFFER_PX", "8"))
+TILE_CACHE_SIZE = int(os.getenv("TILE_CACHE_SIZE", "2048"))
+
+# Cache-Control (max-age em segundos) por camada
+TILE_MAX_AGE = {
+    "states": int(os.getenv("TILE_MAX_AGE_REGIONS_S", "86400")),
+    "cities": int(os.getenv("TILE_MAX_AGE_REGIONS_S", "86400")),
+    "risk": int(os.getenv("TILE_MAX_AGE_RISK_S", "300")),
+}
+LAYERS = tuple(TILE_MAX_AGE)
+
+_tile_cache = LRUCache(maxsize=TILE_CACHE_SIZE)
+_stats = {"hits": 0, "misses": 0, "invalidated": 0}
+_versions: Dict[str, Tuple] = {}  # última versão vista por camada
+
+
+def tile_bbox(z: int, x: int, y: int, buffer_px: int = 0) -> BBox:
+    """Caixa (min_lon, min_lat, max_lon, max_lat) do tile XYZ, com margem opcional em pixels."""
+    n = 2 ** z
+    pad = buffer_px / TILE_SIZE
+
+    def lon(tx: float) -> float:
+        return tx / n * 360.0 - 180.0
+
+    def lat(ty: float) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / n))))
+
+    return (
+        max(-180.0, lon(x - pad)),
+        lat(min(n, y + 1 + pad)),
+        min(180.0, lon(x + 1 + pad)),
+        lat(max(0, y - pad)),
+    )
+
+
+def _clip_polygon(polygon: List, bbox: BBox) -> Optional[List]:
+    outer = clip_ring(polygon[0], bbox) if polygon else []
+    if not outer:
+        return None
+    holes = [h for h in (clip_ring(r, bbox) for r in polygon[1:]) if h]
+    return [outer] + holes
+
+
+def _clip_geometry(geometry: Optional[Dict], bbox: BBox) -> Optional[Dict]:
+    if not geometry:
+        return None
+    kind = geometry.get("type")
+    if kind == "Point":
+        x, y = geometry["coordinates"][:2]
+        inside = bbox[0] <= x <= bbox[2] and bbox[1] <= y <= bbox[3]
+        return geometry if inside else None
+    if kind == "Polygon":
+        clipped = _clip_polygon(geometry["coordinates"], bbox)
+        return {"type": "Polygon", "coordinates": clipped} if clipped else None
+    if kind == "MultiPolygon":
+        polys = [p for p in (_clip_polygon(poly, bbox) for poly in geometry["coordinates"]) if p]
+        if not polys:
+            return None
+        if len(polys) == 1:
+            return {"type": "Polygon", "coordinates": polys[0]}
+        return {"type": "MultiPolygon", "coordinates": polys}
+    return None
+
+
+def _layer_features(layer: str, bbox: BBox, z: int) -> List[Dict]:
+    if layer == "risk":
+        return risk_area_features_in_bbox(bbox, zoom=z)
+    return regions_features_in_bbox("state" if layer == "states" else "city", bbox, zoom=z)
+
+
+def _layer_version(layer: str) -> Tuple:
+    if layer == "risk":
+        # o risco exibido é o do dia: muda também na virada do dia
+        return (risk_areas_version(), datetime.now().strftime("%Y-%m-%d"))
+    return (regions_version(),)
+
+
+def _build_tile(layer: str, z: int, x: int, y: int) -> bytes:
+    """Recorta as features da camada na área do tile e codifica (sem tocar no cache)."""
+    bbox = tile_bbox(z, x, y, TILE_BUFFER_PX)
+    features = []
+    for feature in _layer_features(layer, bbox, z):
+        geometry = _clip_geometry(feature.get("geometry"), bbox)
+        if geometry is not None:
+            features.append({"type": "Feature", "geometry": geometry, "properties": feature.get("properties") or {}})
+    return encode_json({"type": "FeatureCollection", "features": features})
+
+
+async def render_tile(layer: str, z: int, x: int, y: int) -> bytes:
+    """
+    Tile GeoJSON já codificado (FeatureCollection, possivelmente vazia)
+
+    Raises:
+        ValueError: camada desconhecida ou tile fora da grade do zoom
+    """
+    if layer not in LAYERS:
+        raise ValueError(f"camada desconhecida: {layer}")
+    n = 2 ** z
+    if not (0 <= x < n and 0 <= y < n):
+        raise ValueError(f"tile fora da grade: {z}/{x}/{y}")
+
+    version = _layer_version(layer)
+    if _versions.get(layer) != version:
+        # camada recarregada/recalculada: descarta os tiles da versão anterior
+        if layer in _versions:
+            _stats["invalidated"] += invalidate_tiles(layer)
+        _versions[layer] = version
+
+    key = (layer, z, x, y, version)
+    payload = _tile_cache.get(key)
+    if payload is not None:
+        _stats["hits"] += 1
+        return payload
+    _stats["misses"] += 1
+
+    payload = await asyncio.to_thread(_build_tile, layer, z, x, y)
+    _tile_cache[key] = payload
+    return payload
+
+
+def invalidate_tiles(layer: Optional[str] = None) -> int:
+    """Remove do cache os tiles da camada (ou de todas). Retorna quantos foram removidos."""
+    keys = [k for k in list(_tile_cache.keys()) if layer is None or k[0] == layer]
+    for k in keys:
+        _tile_cache.pop(k, None)
+    return len(keys)
+
+
+def tile_cache_stats() -> Dict[str, int]:
+    return {**_stats, "size": len(_tile_cache), "maxsize": TILE_CACHE_SIZE}
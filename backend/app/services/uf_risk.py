@@ -0,0 +1,218 @@
+"""
+Cálculo de risco para todos os municípios de uma UF (endpoint /risk/by-uf)
+
+Pipeline concorrente em duas etapas, cada uma com seu próprio limite:
+- geocodificação (gazetteer local, com fallback Nominatim): até
+  RISK_UF_GEOCODE_CONCURRENCY consultas simultâneas
+- previsão: até RISK_UF_WEATHER_CONCURRENCY chamadas Open-Meteo simultâneas,
+  cada uma em lote (fetch_hourly_forecast_many)
+
+A requisição tem um prazo (deadline). Se ele estourar, devolve o que já foi
+calculado com "complete": False, em vez de deixar o cliente esperando.
+
+iter_uf_risk entrega cada município assim que fica pronto (modo streaming
+do endpoint); compute_uf_risk junta tudo numa resposta única.
+"""
+
+import asyncio
+import os
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from .geocode import nominatim_lookup
+from .ibge_catalog import lookup_municipality
+from .weather_client import OPEN_METEO_BATCH_SIZE, fetch_hourly_forecast_many, forecast_status
+from ..utils.risk_engine import compute_risk_many
+
+RISK_UF_GEOCODE_CONCURRENCY = int(os.getenv("RISK_UF_GEOCODE_CONCURRENCY", "4"))
+RISK_UF_WEATHER_CONCURRENCY = int(os.getenv("RISK_UF_WEATHER_CONCURRENCY", "4"))
+RISK_UF_DEADLINE_S = float(os.getenv("RISK_UF_DEADLINE_S", "25"))
+
+_DONE = object()
+_END = object()
+
+
+async def _geocode_city(name: str, uf: str) -> Optional[Tuple[float, float]]:
+    # Gazetteer local resolve quase todos; Nominatim só para municípios ausentes
+    known = lookup_municipality(name, uf)
+    if known:
+        return known["lat"], known["lon"]
+
+    nomi = await nominatim_lookup(
+        query=f"{name}, {uf}, Brasil",
+        country="br",
+        limit=1,
+        cities_only=True,
+    )
+    if not nomi:
+        return None
+    return float(nomi[0]["lat"]), float(nomi[0]["lon"])
+
+
+async def _uf_risk_events(
+    uf: str,
+    city_names: List[str],
+    deadline_s: float,
+    geocode_concurrency: int,
+    weather_concurrency: int,
+) -> AsyncIterator[Tuple[str, int, Dict]]:
+    """
+    Pipeline de /risk/by-uf: gera ("result" | "failure", índice do município,
+    registro) à medida que cada município fica pronto e, por último,
+    ("summary", -1, resumo). Só os índices já emitidos ficam na memória.
+    """
+    started = time.monotonic()
+    geocode_sem = asyncio.Semaphore(max(1, geocode_concurrency))
+    located: asyncio.Queue = asyncio.Queue()
+    out: asyncio.Queue = asyncio.Queue()
+
+    async def geocode_one(idx: int, name: str) -> None:
+        async with geocode_sem:
+            try:
+                coords = await _geocode_city(name, uf)
+            except Exception as exc:  # noqa: BLE001
+                out.put_nowait(("failure", idx, {"city": name, "stage": "geocode", "error": f"{type(exc).__name__}: {exc}"}))
+                return
+        if coords is None:
+            out.put_nowait(("failure", idx, {"city": name, "stage": "geocode", "error": "não encontrado"}))
+            return
+        await located.put((idx, name, coords[0], coords[1]))
+
+    async def weather_worker() -> None:
+        while True:
+            item = await located.get()
+            if item is _DONE:
+                # repassa o sinal de término para os demais workers
+                await located.put(_DONE)
+                return
+            batch = [item]
+            # agrupa o que já estiver geocodificado em uma única chamada
+            while len(batch) < OPEN_METEO_BATCH_SIZE and not located.empty():
+                nxt = located.get_nowait()
+                if nxt is _DONE:
+                    await located.put(_DONE)
+                    break
+                batch.append(nxt)
+            try:
+                forecasts = await fetch_hourly_forecast_many([(lat, lon) for _, _, lat, lon in batch])
+            except Exception as exc:  # noqa: BLE001
+                for idx, name, _, _ in batch:
+                    out.put_nowait(("failure", idx, {"city": name, "stage": "weather", "error": f"{type(exc).__name__}: {exc}"}))
+                continue
+            # risco do lote inteiro em uma passada vetorizada
+            for (idx, name, lat, lon), hourly, risk in zip(batch, forecasts, compute_risk_many(forecasts)):
+                out.put_nowait(("result", idx, {
+                    "city": name,
+                    "uf": uf,
+                    "lat": lat,
+                    "lon": lon,
+                    "risk": risk["level"],
+                    "risk_score": risk["risk_score"],
+                    "forecast_status": forecast_status(hourly)["status"],
+                }))
+
+    async def run() -> None:
+        workers = [asyncio.create_task(weather_worker()) for _ in range(max(1, weather_concurrency))]
+        try:
+            await asyncio.gather(*(geocode_one(i, n) for i, n in enumerate(city_names)))
+            await located.put(_DONE)
+            await asyncio.gather(*workers)
+        finally:
+            for w in workers:
+                w.cancel()
+            out.put_nowait(_END)
+
+    emitted = set()
+    counts = {"result": 0, "failure": 0}
+    complete = True
+    deadline = started + max(0.0, deadline_s)
+    task = asyncio.create_task(run())
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(out.get(), timeout=max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                complete = False
+                break
+            if item is _END:
+                break
+            kind, idx, record = item
+            emitted.add(idx)
+            counts[kind] += 1
+            yield kind, idx, record
+    finally:
+        task.cancel()
+
+    if not complete:
+        # prazo esgotado: o que já terminou e está na fila não conta como pendente
+        while not out.empty():
+            item = out.get_nowait()
+            if item is _END:
+                break
+            kind, idx, record = item
+            emitted.add(idx)
+            counts[kind] += 1
+            yield kind, idx, record
+
+    yield "summary", -1, {
+        "uf": uf,
+        "complete": complete,
+        "total": len(city_names),
+        "results": counts["result"],
+        "failures": counts["failure"],
+        "pending": [name for idx, name in enumerate(city_names) if idx not in emitted],
+        "elapsed_ms": round((time.monotonic() - started) * 1000),
+    }
+
+
+async def iter_uf_risk(
+    uf: str,
+    city_names: List[str],
+    deadline_s: float = RISK_UF_DEADLINE_S,
+    geocode_concurrency: int = RISK_UF_GEOCODE_CONCURRENCY,
+    weather_concurrency: int = RISK_UF_WEATHER_CONCURRENCY,
+) -> AsyncIterator[Dict]:
+    """
+    Versão em streaming de compute_uf_risk: um registro por município assim que
+    fica pronto ({"type": "result" | "failure", ...}, em ordem de conclusão) e,
+    no fim, {"type": "summary", "uf", "complete", "total", "results",
+    "failures", "pending", "elapsed_ms"} com as contagens.
+    """
+    async for kind, _, record in _uf_risk_events(uf, city_names, deadline_s, geocode_concurrency, weather_concurrency):
+        yield {"type": kind, **record}
+
+
+async def compute_uf_risk(
+    uf: str,
+    city_names: List[str],
+    deadline_s: float = RISK_UF_DEADLINE_S,
+    geocode_concurrency: int = RISK_UF_GEOCODE_CONCURRENCY,
+    weather_concurrency: int = RISK_UF_WEATHER_CONCURRENCY,
+) -> Dict:
+    """
+    Calcula o risco de cada município da UF respeitando o prazo da requisição
+
+    Args:
+        uf: Sigla do estado
+        city_names: Nomes dos municípios (ordem preservada na resposta)
+        deadline_s: Prazo total em segundos
+        geocode_concurrency: Máximo de geocodificações simultâneas
+        weather_concurrency: Máximo de chamadas Open-Meteo simultâneas
+
+    Returns:
+        {"uf", "complete", "total", "results", "failures", "pending", "elapsed_ms"}
+    """
+    collected: Dict[str, Dict[int, Dict]] = {"result": {}, "failure": {}}
+    summary: Dict = {}
+    async for kind, idx, record in _uf_risk_events(uf, city_names, deadline_s, geocode_concurrency, weather_concurrency):
+        if kind == "summary":
+            summary = record
+        else:
+            collected[kind][idx] = record
+
+    results, failures = collected["result"], collected["failure"]
+    return {
+        **summary,
+        "results": [results[i] for i in sorted(results)],
+        "failures": [failures[i] for i in sorted(failures)],
+    }
@@ -1,84 +1,343 @@
-﻿from typing import Dict, List, Optional
+﻿from typing import Dict, List, Optional, Sequence, Tuple, Union
+import asyncio
+import logging
+import math
 import os
-import httpx
-from cachetools import TTLCache
+import time
+from cachetools import LRUCache, TTLCache
 from datetime import datetime
 
+from .http_pool import get_client
+from ..utils.hourly_forecast import HourlyForecast
+from ..utils.singleflight import SingleFlight
+
 OPEN_METEO_URL = os.getenv("OPEN_METEO_URL", "https://api.open-meteo.com/v1/forecast")
 
-# Cache: maxsize=500 entradas, TTL=10 minutos
-_weather_cache = TTLCache(maxsize=500, ttl=600)
+# Máximo de coordenadas por chamada multi-localização (Open-Meteo aceita listas
+# separadas por vírgula em latitude/longitude; listas grandes estouram o tamanho da URL)
+OPEN_METEO_BATCH_SIZE = int(os.getenv("OPEN_METEO_BATCH_SIZE", "100"))
+
+HOURLY_VARIABLES = "temperature_2m,precipitation,precipitation_probability,wind_speed_10m"
+
+# Ajuste das coordenadas à grade do modelo antes do cache e da chamada:
+# - "grid": usa o centro da célula de FORECAST_GRID_DEG graus que contém o ponto
+#   (a previsão do Open-Meteo vem de modelos com grade de ~10 km, então pontos
+#   na mesma célula recebem praticamente a mesma previsão e passam a dividir o cache)
+# - "off": usa a coordenada exata (arredondada a 4 casas, ~11 m)
+FORECAST_GRID_MODE = os.getenv("FORECAST_GRID_MODE", "grid").lower()
+FORECAST_GRID_DEG = float(os.getenv("FORECAST_GRID_DEG", "0.1"))
+
+# Horizonte máximo buscado por localização. Qualquer forecast_days/date é servido
+# como fatia dessa única previsão (1, 3 e 7 dias no mesmo ponto = 1 chamada)
+OPEN_METEO_MAX_DAYS = int(os.getenv("OPEN_METEO_MAX_DAYS", "7"))
+
+# Uma previsão é "fresh" por FORECAST_TTL_S. Depois disso ainda é servida como
+# "stale" por até FORECAST_MAX_STALE_S (stale-while-revalidate): a resposta sai
+# na hora e a atualização roda em segundo plano; se o Open-Meteo estiver fora,
+# a previsão antiga continua valendo até esse limite
+FORECAST_TTL_S = int(os.getenv("FORECAST_TTL_S", "600"))
+FORECAST_MAX_STALE_S = int(os.getenv("FORECAST_MAX_STALE_S", "1800"))
+
+logger = logging.getLogger(__name__)
+
+# Cache: maxsize=500 entradas (uma por localização), mantidas até o fim do prazo de stale
+_weather_cache = TTLCache(maxsize=500, ttl=FORECAST_TTL_S + FORECAST_MAX_STALE_S)
+
+# Frequência de acesso por chave, para o warmer (services/forecast_warmer.py)
+# saber quais previsões atualizar antes de vencer: chave -> [lat, lon, timezone, acessos]
+_hot_keys = LRUCache(maxsize=2000)
+
+# Chamadas Open-Meteo em andamento por chave de cache: requisições concorrentes
+# que erram o cache ao mesmo tempo aguardam a mesma chamada (sem "thundering herd").
+# Contadores em _forecast_flight.stats ("leaders", "coalesced", "errors").
+_forecast_flight = SingleFlight()
+
+
+def _clamp_days(forecast_days: int) -> int:
+    if forecast_days < 1:
+        return 1
+    if forecast_days > OPEN_METEO_MAX_DAYS:
+        return OPEN_METEO_MAX_DAYS
+    return forecast_days
+
+
+def snap_to_grid(lat: float, lon: float) -> Tuple[float, float]:
+    """Coordenada efetivamente usada na previsão (centro da célula, ou o próprio ponto)."""
+    if FORECAST_GRID_MODE != "grid" or FORECAST_GRID_DEG <= 0:
+        return lat, lon
+    res = FORECAST_GRID_DEG
+    return (
+        round((math.floor(lat / res) + 0.5) * res, 6),
+        round((math.floor(lon / res) + 0.5) * res, 6),
+    )
+
+
+def forecast_cell(lat: float, lon: float) -> Dict:
+    """Célula efetiva da previsão para exibir na resposta."""
+    cell_lat, cell_lon = snap_to_grid(lat, lon)
+    return {
+        "lat": cell_lat,
+        "lon": cell_lon,
+        "resolution_deg": FORECAST_GRID_DEG if FORECAST_GRID_MODE == "grid" else None,
+        "mode": FORECAST_GRID_MODE,
+    }
+
+
+def _cache_key(lat: float, lon: float, timezone: str) -> str:
+    # Normaliza coordenadas para cache (4 casas decimais)
+    return f"{round(lat, 4)},{round(lon, 4)},{timezone}"
+
+
+def _parse_hourly(j: Dict) -> HourlyForecast:
+    """Converte o bloco "hourly" de uma resposta Open-Meteo na previsão compacta."""
+    entry = HourlyForecast.from_open_meteo(j.get("hourly", {}) or {})
+    entry.fetched_at = time.time()
+    return entry
+
+
+def _is_fresh(entry: HourlyForecast) -> bool:
+    return time.time() - entry.fetched_at < FORECAST_TTL_S
+
+
+def _track(key: str, lat: float, lon: float, timezone: str) -> None:
+    hot = _hot_keys.get(key)
+    if hot is None:
+        _hot_keys[key] = [lat, lon, timezone, 1.0]
+    else:
+        hot[3] += 1
+
+
+def _log_refresh_error(fut: asyncio.Future) -> None:
+    if not fut.cancelled() and fut.exception() is not None:
+        logger.warning("Falha ao atualizar previsão em segundo plano: %s", fut.exception())
+
+
+def _start_refresh(items: Sequence[Tuple[str, Tuple[float, float]]], timezone: str) -> int:
+    """
+    Dispara (sem aguardar) a busca das chaves que ainda não estão em andamento,
+    em lotes de OPEN_METEO_BATCH_SIZE. Retorna quantas chaves foram disparadas.
+    """
+    todo = [(key, point) for key, point in items if not _forecast_flight.inflight(key)]
+    for start in range(0, len(todo), OPEN_METEO_BATCH_SIZE):
+        chunk = todo[start:start + OPEN_METEO_BATCH_SIZE]
+        fut = _forecast_flight.do_many(
+            [key for key, _ in chunk],
+            lambda chunk=chunk: _fetch_chunk(chunk, timezone),
+        )
+        fut.add_done_callback(_log_refresh_error)
+    return len(todo)
+
+
+async def _fetch_entry(lat: float, lon: float, timezone: str) -> HourlyForecast:
+    cache_key = _cache_key(lat, lon, timezone)
+    _track(cache_key, lat, lon, timezone)
+
+    # Verifica cache; entrada vencida (stale) é servida enquanto a atualização roda
+    cached = _weather_cache.get(cache_key)
+    if cached is not None:
+        if not _is_fresh(cached):
+            _start_refresh([(cache_key, (lat, lon))], timezone)
+        return cached
+
+    async def _fetch() -> HourlyForecast:
+        params = {
+            "latitude": lat,
+            "longitude": lon,
+            "hourly": HOURLY_VARIABLES,
+            "forecast_days": OPEN_METEO_MAX_DAYS,
+            "timezone": timezone,
+        }
+        client = get_client(OPEN_METEO_URL)
+        r = await client.get(OPEN_METEO_URL, params=params)
+        r.raise_for_status()
+        entry = _parse_hourly(r.json())
+
+        # Armazena no cache (só em caso de sucesso; erros não ficam cacheados)
+        _weather_cache[cache_key] = entry
+        return entry
+
+    return await _forecast_flight.do(cache_key, _fetch)
+
 
 async def fetch_hourly_forecast(
     lat: float,
     lon: float,
     forecast_days: int = 1,
     timezone: str = "America/Sao_Paulo",
-) -> List[Dict]:
+    date: Optional[str] = None,
+) -> HourlyForecast:
     """
-    Retorna lista de pontos horários:
-      [{"timestamp", "temperature", "precipitation", "precipitation_probability", "wind_speed"}, ...]
+    Retorna a previsão horária (HourlyForecast: um array por variável, que se
+    comporta como a lista de pontos
+      [{"timestamp", "temperature", "precipitation", "precipitation_probability", "wind_speed"}, ...])
+
+    A previsão de OPEN_METEO_MAX_DAYS dias é buscada (e cacheada) uma vez por
+    localização; o retorno é uma fatia dela.
 
     Args:
         lat: Latitude
         lon: Longitude
         forecast_days: Número de dias (1-7, padrão: 1)
         timezone: Fuso horário (padrão: America/Sao_Paulo)
+        date: Se informado (YYYY-MM-DD), retorna só as horas desse dia
     """
-    # Normaliza coordenadas para cache (4 casas decimais)
-    lat_key = round(lat, 4)
-    lon_key = round(lon, 4)
-    cache_key = f"{lat_key},{lon_key},{forecast_days},{timezone}"
-
-    # Verifica cache
-    if cache_key in _weather_cache:
-        return _weather_cache[cache_key]
+    lat, lon = snap_to_grid(lat, lon)
+    entry = await _fetch_entry(lat, lon, timezone)
+    return entry.days_view(_clamp_days(forecast_days), date)
 
-    # Limita forecast_days
-    if forecast_days < 1:
-        forecast_days = 1
-    elif forecast_days > 7:
-        forecast_days = 7
 
+async def _fetch_chunk(
+    chunk: List[Tuple[str, Tuple[float, float]]],
+    timezone: str,
+) -> Dict[str, HourlyForecast]:
     params = {
-        "latitude": lat,
-        "longitude": lon,
-        "hourly": "temperature_2m,precipitation,precipitation_probability,wind_speed_10m",
-        "forecast_days": forecast_days,
+        "latitude": ",".join(str(lat) for _, (lat, _lon) in chunk),
+        "longitude": ",".join(str(lon) for _, (_lat, lon) in chunk),
+        "hourly": HOURLY_VARIABLES,
+        "forecast_days": OPEN_METEO_MAX_DAYS,
         "timezone": timezone,
     }
+    client = get_client(OPEN_METEO_URL)
+    r = await client.get(OPEN_METEO_URL, params=params)
+    r.raise_for_status()
+    j = r.json()
+    # Com uma única coordenada a API devolve um objeto, com várias, uma lista
+    items = j if isinstance(j, list) else [j]
+    out: Dict[str, HourlyForecast] = {}
+    for (key, _point), item in zip(chunk, items):
+        out[key] = _parse_hourly(item)
+        _weather_cache[key] = out[key]
+    return out
 
-    async with httpx.AsyncClient(timeout=10) as client:
-        r = await client.get(OPEN_METEO_URL, params=params)
-        r.raise_for_status()
-        j = r.json()
-        h = j.get("hourly", {})
-        times = h.get("time", []) or []
-        temps = h.get("temperature_2m", []) or []
-        precs = h.get("precipitation", []) or []
-        prec_probs = h.get("precipitation_probability", []) or []
-        winds = h.get("wind_speed_10m", []) or []
-
-        out = []
-        for i in range(len(times)):
-            out.append({
-                "timestamp": times[i],
-                "temperature": float(temps[i]) if i < len(temps) and temps[i] is not None else None,
-                "precipitation": float(precs[i]) if i < len(precs) and precs[i] is not None else None,
-                "precipitation_probability": int(prec_probs[i]) if i < len(prec_probs) and prec_probs[i] is not None else None,
-                "wind_speed": float(winds[i]) if i < len(winds) and winds[i] is not None else None,
-            })
-
-        # Armazena no cache
-        _weather_cache[cache_key] = out
-
-        return out
+
+async def fetch_hourly_forecast_many(
+    points: Sequence[Tuple[float, float]],
+    forecast_days: int = 1,
+    timezone: str = "America/Sao_Paulo",
+    date: Optional[str] = None,
+) -> List[HourlyForecast]:
+    """
+    Versão em lote de fetch_hourly_forecast: uma chamada Open-Meteo para até
+    OPEN_METEO_BATCH_SIZE coordenadas.
+
+    Pontos já presentes no cache não são buscados de novo; os demais são
+    agrupados em blocos, e cada resultado é gravado no cache individualmente
+    (mesma chave de fetch_hourly_forecast). Pontos na mesma célula da grade
+    compartilham uma única entrada.
+
+    Args:
+        points: Lista de (lat, lon)
+        forecast_days: Número de dias (1-7, padrão: 1)
+        timezone: Fuso horário (padrão: America/Sao_Paulo)
+        date: Se informado (YYYY-MM-DD), retorna só as horas desse dia
+
+    Returns:
+        Lista de previsões horárias, na mesma ordem de `points`
+    """
+    forecast_days = _clamp_days(forecast_days)
+    points = [snap_to_grid(lat, lon) for lat, lon in points]
+    keys = [_cache_key(lat, lon, timezone) for lat, lon in points]
+    for key, (lat, lon) in zip(keys, points):
+        _track(key, lat, lon, timezone)
+
+    # Separa acertos de cache, chaves já em andamento e coordenadas a buscar
+    # (uma vez cada, mesmo se repetidas)
+    found: Dict[str, HourlyForecast] = {}
+    waiting: Dict[str, asyncio.Future] = {}
+    missing: Dict[str, Tuple[float, float]] = {}
+    stale: List[Tuple[str, Tuple[float, float]]] = []
+    for key, point in zip(keys, points):
+        if key in found or key in waiting or key in missing:
+            continue
+        cached = _weather_cache.get(key)
+        if cached is not None:
+            found[key] = cached
+            if not _is_fresh(cached):
+                stale.append((key, point))
+            continue
+        fut = _forecast_flight.pending(key)
+        if fut is not None:
+            waiting[key] = fut
+        else:
+            missing[key] = point
+
+    # entradas stale saem como estão; a atualização roda em segundo plano
+    _start_refresh(stale, timezone)
+
+    pending = list(missing.items())
+    calls = [
+        _forecast_flight.do_many(
+            [key for key, _ in chunk],
+            lambda chunk=chunk: _fetch_chunk(chunk, timezone),
+        )
+        for chunk in (
+            pending[start:start + OPEN_METEO_BATCH_SIZE]
+            for start in range(0, len(pending), OPEN_METEO_BATCH_SIZE)
+        )
+    ]
+    for chunk_result in await asyncio.gather(*calls):
+        found.update(chunk_result)
+    for key, fut in waiting.items():
+        found[key] = await asyncio.shield(fut)
+
+    return [found[key].days_view(forecast_days, date) if key in found else HourlyForecast.empty() for key in keys]
+
+
+def forecast_flight_stats() -> Dict[str, int]:
+    """Contadores do single-flight: chamadas disparadas, chamadores coalescidos e erros."""
+    return dict(_forecast_flight.stats)
+
+
+def forecast_status(forecast: HourlyForecast) -> Dict:
+    """
+    Frescor da previsão servida, para a resposta
+
+    Returns:
+        {"status": "fresh" | "stale" | "unavailable", "age_s": segundos desde a busca}
+    """
+    if forecast.fetched_at is None:
+        return {"status": "unavailable", "age_s": None}
+    age = time.time() - forecast.fetched_at
+    return {"status": "fresh" if age < FORECAST_TTL_S else "stale", "age_s": round(age)}
+
+
+def refresh_hot_forecasts(lead_s: float, min_hits: float, max_keys: int, decay: float = 0.5) -> int:
+    """
+    Atualiza em segundo plano as previsões mais acessadas que vencem em até
+    `lead_s` segundos (ou já estão stale). Chamado periodicamente pelo warmer.
+
+    Args:
+        lead_s: Antecedência em relação ao fim do TTL
+        min_hits: Acessos (com decaimento) para a chave contar como quente
+        max_keys: Máximo de chaves atualizadas por rodada
+        decay: Fator aplicado aos contadores a cada rodada (esquece chaves frias)
+
+    Returns:
+        Número de chaves cuja atualização foi disparada
+    """
+    now = time.time()
+    due: Dict[str, List[Tuple[str, Tuple[float, float]]]] = {}
+    selected = 0
+    for key, (lat, lon, timezone, hits) in sorted(_hot_keys.items(), key=lambda kv: kv[1][3], reverse=True):
+        if hits < min_hits or selected >= max_keys:
+            break
+        entry = _weather_cache.get(key)
+        if entry is not None and now - entry.fetched_at >= FORECAST_TTL_S - lead_s:
+            due.setdefault(timezone, []).append((key, (lat, lon)))
+            selected += 1
+
+    for key, hot in list(_hot_keys.items()):
+        hot[3] *= decay
+        if hot[3] < 0.1:
+            del _hot_keys[key]
+
+    return sum(_start_refresh(items, timezone) for timezone, items in due.items())
 
 
 def filter_forecast_by_date(
-    forecast: List[Dict],
+    forecast: Union[HourlyForecast, List[Dict]],
     target_date: Optional[str] = None,
-) -> List[Dict]:
+) -> Union[HourlyForecast, List[Dict]]:
     """
     Filtra previsão por data específica (formato: YYYY-MM-DD)
     Se target_date for None, retorna todos os pontos
@@ -86,13 +345,17 @@ def filter_forecast_by_date(
     if not target_date:
         return forecast
 
+    if isinstance(forecast, HourlyForecast):
+        # índice por dia: sem varrer os horários
+        return forecast.days_view(OPEN_METEO_MAX_DAYS, target_date)
+
     return [
         point for point in forecast
         if point.get("timestamp", "").startswith(target_date)
     ]
 
 
-def summarize_day(forecast: List[Dict]) -> Dict:
+def summarize_day(forecast: Union[HourlyForecast, List[Dict]]) -> Dict:
     """
     Retorna resumo estatístico de um conjunto de pontos horários
     """
@@ -105,10 +368,17 @@ def summarize_day(forecast: List[Dict]) -> Dict:
             "avg_precipitation_probability": None,
         }
 
-    temps = [p["temperature"] for p in forecast if p.get("temperature") is not None]
-    precs = [p["precipitation"] for p in forecast if p.get("precipitation") is not None]
-    winds = [p["wind_speed"] for p in forecast if p.get("wind_speed") is not None]
-    probs = [p["precipitation_probability"] for p in forecast if p.get("precipitation_probability") is not None]
+    if isinstance(forecast, HourlyForecast):
+        # percorre os buffers direto (NaN / -1 = valor ausente)
+        temps = [v for v in forecast.buffer("temperature") if v == v]
+        precs = [v for v in forecast.buffer("precipitation") if v == v]
+        winds = [v for v in forecast.buffer("wind_speed") if v == v]
+        probs = [v for v in forecast.buffer("precipitation_probability") if v >= 0]
+    else:
+        temps = [p["temperature"] for p in forecast if p.get("temperature") is not None]
+        precs = [p["precipitation"] for p in forecast if p.get("precipitation") is not None]
+        winds = [p["wind_speed"] for p in forecast if p.get("wind_speed") is not None]
+        probs = [p["precipitation_probability"] for p in forecast if p.get("precipitation_probability") is not None]
 
     return {
         "avg_temperature": round(sum(temps) / len(temps), 1) if temps else None,
@@ -0,0 +1,151 @@
+"""
+Compressão das respostas (gzip e, se o pacote "brotli" estiver instalado, br)
+
+A codificação é negociada pelo Accept-Encoding de cada requisição. Corpos
+abaixo de COMPRESS_MIN_BYTES saem sem compressão (o ganho não compensa).
+
+Corpos estáticos ou que quase não mudam (partições de /regions, tiles) são
+comprimidos uma vez, com nível alto, e a versão comprimida fica num LRU
+limitado por tamanho, indexado pelo próprio corpo: o mesmo conteúdo nunca é
+recomprimido. Corpos dinâmicos ou que dependem de parâmetros arbitrários da
+consulta (/risk/areas por lat/lon/raio) são comprimidos a cada requisição,
+com nível baixo, para não ocupar o LRU com variantes que não se repetem.
+
+A saída é determinística (gzip sem mtime), então o ETag de cada
+representação comprimida é estável (utils/conditional.py).
+"""
+
+import gzip
+import logging
+import os
+from typing import Dict, Optional
+
+from cachetools import LRUCache
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # opcional
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+# níveis para corpos comprimidos a cada requisição (rápidos) e para os cacheados (uma vez só)
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "5"))
+GZIP_LEVEL_STATIC = int(os.getenv("GZIP_LEVEL_STATIC", "9"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+BROTLI_QUALITY_STATIC = int(os.getenv("BROTLI_QUALITY_STATIC", "9"))
+# Limite (MB) dos corpos comprimidos mantidos em memória (conta também o corpo original, que é a chave)
+COMPRESSED_CACHE_MB = float(os.getenv("COMPRESSED_CACHE_MB", "64"))
+
+# em empate de q, a primeira da lista
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Codificação a usar segundo o Accept-Encoding (com q-values e "*")
+
+    Returns:
+        "br", "gzip" ou None (sem compressão)
+    """
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(body: bytes, encoding: str, static: bool = False) -> bytes:
+    """Comprime com a codificação dada (static=True: nível mais alto, para corpos cacheados)."""
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY_STATIC if static else BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL_STATIC if static else GZIP_LEVEL, mtime=0)
+    raise ValueError(f"codificação não suportada: {encoding}")
+
+
+class CompressedCache:
+    """
+    Versões comprimidas de corpos estáticos, por (corpo, codificação)
+
+    A chave é o próprio corpo: bytes guarda o hash calculado, então um corpo
+    que também vem de outro cache (mesmo objeto) é localizado sem recalcular
+    nada, e qualquer mudança no conteúdo é uma chave nova.
+    """
+
+    def __init__(self, max_bytes: int):
+        self._cache = LRUCache(maxsize=max_bytes, getsizeof=lambda v: len(v[0]) + len(v[1]))
+        self.stats = {"hits": 0, "misses": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def get_or_compress(self, body: bytes, encoding: str) -> bytes:
+        key = (body, encoding)
+        entry = self._cache.get(key)
+        if entry is not None:
+            self.stats["hits"] += 1
+            return entry[1]
+        self.stats["misses"] += 1
+        compressed = compress(body, encoding, static=True)
+        self.stats["bytes_in"] += len(body)
+        self.stats["bytes_out"] += len(compressed)
+        if len(body) + len(compressed) <= self._cache.maxsize:
+            # guarda (corpo, comprimido) para o getsizeof contar os dois
+            self._cache[key] = (body, compressed)
+        return compressed
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+# Instância única do processo
+compressed_cache = CompressedCache(int(COMPRESSED_CACHE_MB * 1024 * 1024))
+
+
+def compressed_response(
+    request: Request,
+    body: bytes,
+    media_type: str,
+    static: bool = False,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """
+    Resposta com o corpo na codificação negociada com o cliente
+
+    Args:
+        body: corpo já codificado (JSON/GeoJSON)
+        static: corpo estático ou quase (comprimido uma vez e cacheado)
+        headers: cabeçalhos extras (ex.: Cache-Control)
+    """
+    headers = dict(headers or {})
+    if len(body) < COMPRESS_MIN_BYTES:
+        return Response(content=body, media_type=media_type, headers=headers)
+
+    # a partir do limite a representação depende do Accept-Encoding
+    headers["Vary"] = "Accept-Encoding"
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if encoding is not None:
+        body = compressed_cache.get_or_compress(body, encoding) if static else compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+def compression_info() -> Dict:
+    """Codificações disponíveis e contadores do cache de corpos comprimidos."""
+    return {"encodings": list(ENCODINGS), "min_bytes": COMPRESS_MIN_BYTES, **compressed_cache.stats}
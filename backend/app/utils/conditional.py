@@ -0,0 +1,70 @@
+"""
+Respostas condicionais (ETag / If-None-Match)
+
+O ETag de cada resposta vem da versão dos dados de que ela depende (digest do
+GeoStore, conteúdo da previsão horária, progresso da geocodificação) mais os
+parâmetros da requisição, e é calculado antes de montar ou serializar o
+corpo. Se o cliente já tem essa versão, a resposta é um 304 sem corpo: um
+polling sem mudanças não gasta banda nem serialização.
+
+Cada representação comprimida (utils/compression.py) tem seu próprio ETag,
+"<hash>-gzip" / "<hash>-br"; a comparação do If-None-Match ignora o sufixo,
+pois o conteúdo é o mesmo.
+"""
+
+import hashlib
+from typing import Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+
+def make_etag(*parts) -> str:
+    """
+    ETag forte (entre aspas) a partir das partes da versão
+
+    As partes devem ter repr estável entre processos (str, números, tuplas,
+    dicts com as mesmas chaves na mesma ordem), para todos os workers gerarem
+    o mesmo ETag para o mesmo conteúdo.
+    """
+    return '"' + hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest() + '"'
+
+
+def _base_etag(tag: str) -> str:
+    # "<hash>-gzip" -> "<hash>" (o hash é hexadecimal, sem "-")
+    head, sep, _ = tag.rpartition("-")
+    return head + '"' if sep and tag.endswith('"') else tag
+
+
+def matching_etag(request: Request, etag: str) -> Optional[str]:
+    """
+    ETag do If-None-Match que corresponde à versão atual (comparação fraca,
+    como pede o HTTP, e ignorando o sufixo da codificação), ou None
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    if header.strip() == "*":
+        return etag
+    for tag in header.split(","):
+        tag = tag.strip().removeprefix("W/")
+        if _base_etag(tag) == etag:
+            return tag
+    return None
+
+
+def not_modified(request: Request, etag: Optional[str], cache_control: str) -> Optional[Response]:
+    """304 (com ETag e Cache-Control, sem corpo) se o cliente já tem a versão; senão None."""
+    tag = matching_etag(request, etag) if etag is not None else None
+    if tag is None:
+        return None
+    return Response(status_code=304, headers={"ETag": tag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"})
+
+
+def with_validators(response: Response, etag: Optional[str], cache_control: str) -> Response:
+    """Acrescenta ETag (se houver, com o sufixo da codificação do corpo) e Cache-Control à resposta completa."""
+    if etag is not None:
+        encoding = response.headers.get("content-encoding")
+        response.headers["ETag"] = f'{etag[:-1]}-{encoding}"' if encoding else etag
+    response.headers["Cache-Control"] = cache_control
+    return response
@@ -0,0 +1,176 @@
+"""
+Funções geométricas simples (coordenadas em graus, [lon, lat] como no GeoJSON)
+"""
+
+import math
+from typing import Iterable, List, Sequence, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+
+BBox = Tuple[float, float, float, float]  # (min_lon, min_lat, max_lon, max_lat)
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distância em km sobre a esfera."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def radius_bbox(lat: float, lon: float, radius_km: float) -> BBox:
+    """Caixa que contém o círculo de raio `radius_km` em torno do ponto."""
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    coslat = math.cos(math.radians(lat))
+    dlon = 180.0 if coslat < 1e-9 else min(180.0, dlat / coslat)
+    return (lon - dlon, max(-90.0, lat - dlat), lon + dlon, min(90.0, lat + dlat))
+
+
+def rings_bbox(rings: Iterable[Sequence[Sequence[float]]]) -> BBox:
+    min_lon = min_lat = float("inf")
+    max_lon = max_lat = float("-inf")
+    for ring in rings:
+        for x, y in ring:
+            if x < min_lon:
+                min_lon = x
+            if x > max_lon:
+                max_lon = x
+            if y < min_lat:
+                min_lat = y
+            if y > max_lat:
+                max_lat = y
+    return (min_lon, min_lat, max_lon, max_lat)
+
+
+def point_in_ring(lon: float, lat: float, ring: Sequence[Sequence[float]]) -> bool:
+    """Ray casting (par/ímpar)."""
+    inside = False
+    n = len(ring)
+    j = n - 1
+    for i in range(n):
+        xi, yi = ring[i][0], ring[i][1]
+        xj, yj = ring[j][0], ring[j][1]
+        if (yi > lat) != (yj > lat) and lon < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+def point_in_polygon(lon: float, lat: float, rings: List[Sequence[Sequence[float]]]) -> bool:
+    """rings[0] é o anel externo; os demais, buracos."""
+    if not rings or not point_in_ring(lon, lat, rings[0]):
+        return False
+    return not any(point_in_ring(lon, lat, hole) for hole in rings[1:])
+
+
+def polygon_distance_km(lat: float, lon: float, rings: List[Sequence[Sequence[float]]]) -> float:
+    """
+    Distância do ponto ao polígono (0 se estiver dentro)
+
+    O ponto mais próximo de cada aresta é achado numa projeção equiretangular
+    local (centrada no ponto) e a distância final é a haversine até ele.
+    """
+    if point_in_polygon(lon, lat, rings):
+        return 0.0
+    kx = math.cos(math.radians(lat))
+    best = float("inf")
+    best_pt = None
+    for ring in rings:
+        for (x0, y0), (x1, y1) in zip(ring, ring[1:]):
+            ax, ay = (x0 - lon) * kx, y0 - lat
+            bx, by = (x1 - lon) * kx, y1 - lat
+            dx, dy = bx - ax, by - ay
+            seg2 = dx * dx + dy * dy
+            t = 0.0 if seg2 == 0 else max(0.0, min(1.0, -(ax * dx + ay * dy) / seg2))
+            px, py = ax + t * dx, ay + t * dy
+            d2 = px * px + py * py
+            if d2 < best:
+                best = d2
+                best_pt = (x0 + t * (x1 - x0), y0 + t * (y1 - y0))
+    if best_pt is None:
+        return float("inf")
+    return haversine_km(lat, lon, best_pt[1], best_pt[0])
+
+
+def _segments_cross(p1, p2, q1, q2) -> bool:
+    def orient(a, b, c):
+        v = (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+        return (v > 0) - (v < 0)
+
+    def on_segment(a, b, c):
+        return min(a[0], b[0]) <= c[0] <= max(a[0], b[0]) and min(a[1], b[1]) <= c[1] <= max(a[1], b[1])
+
+    o1, o2 = orient(p1, p2, q1), orient(p1, p2, q2)
+    o3, o4 = orient(q1, q2, p1), orient(q1, q2, p2)
+    if o1 != o2 and o3 != o4:
+        return True
+    return (
+        (o1 == 0 and on_segment(p1, p2, q1))
+        or (o2 == 0 and on_segment(p1, p2, q2))
+        or (o3 == 0 and on_segment(q1, q2, p1))
+        or (o4 == 0 and on_segment(q1, q2, p2))
+    )
+
+
+def polygon_intersects_bbox(rings: List[Sequence[Sequence[float]]], bbox: BBox) -> bool:
+    """Se o polígono e a caixa se sobrepõem (não só as caixas envolventes)."""
+    min_x, min_y, max_x, max_y = bbox
+    if not rings:
+        return False
+    outer = rings[0]
+    if any(min_x <= x <= max_x and min_y <= y <= max_y for x, y in outer):
+        return True
+    corners = [(min_x, min_y), (max_x, min_y), (max_x, max_y), (min_x, max_y)]
+    if any(point_in_polygon(x, y, rings) for x, y in corners):
+        return True
+    edges = list(zip(corners, corners[1:] + corners[:1]))
+    return any(
+        _segments_cross(a, b, c, d)
+        for a, b in zip(outer, outer[1:])
+        for c, d in edges
+    )
+
+
+def clip_ring(ring: Sequence[Sequence[float]], bbox: BBox) -> List[List[float]]:
+    """
+    Recorta um anel pela caixa (Sutherland–Hodgman). Retorna o anel fechado,
+    ou [] se não sobrar área.
+    """
+    min_x, min_y, max_x, max_y = bbox
+    pts = [list(p[:2]) for p in ring]
+    if len(pts) > 1 and pts[0] == pts[-1]:
+        pts.pop()
+
+    def clip(points, inside, cross):
+        out = []
+        for i, cur in enumerate(points):
+            prev = points[i - 1]
+            if inside(cur):
+                if not inside(prev):
+                    out.append(cross(prev, cur))
+                out.append(cur)
+            elif inside(prev):
+                out.append(cross(prev, cur))
+        return out
+
+    def at_x(x):
+        return lambda a, b: [x, a[1] + (b[1] - a[1]) * (x - a[0]) / (b[0] - a[0])]
+
+    def at_y(y):
+        return lambda a, b: [a[0] + (b[0] - a[0]) * (y - a[1]) / (b[1] - a[1]), y]
+
+    for inside, cross in (
+        (lambda p: p[0] >= min_x, at_x(min_x)),
+        (lambda p: p[0] <= max_x, at_x(max_x)),
+        (lambda p: p[1] >= min_y, at_y(min_y)),
+        (lambda p: p[1] <= max_y, at_y(max_y)),
+    ):
+        if not pts:
+            break
+        pts = clip(pts, inside, cross)
+
+    if len(pts) < 3:
+        return []
+    pts.append(pts[0])
+    return pts
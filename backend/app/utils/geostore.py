@@ -0,0 +1,237 @@
+"""
+Armazenamento binário de geometrias, aberto com mmap
+
+Em vez de GeoJSON indentado (lento para decodificar e que ocupa centenas de MB
+de heap em cada worker), as geometrias ficam em vetores planos:
+
+- coords.<nível>: float64 x, y de todos os pontos
+- rings.<nível>:  início de cada anel em coords (em pontos), n_anéis + 1
+- polys.<nível>:  início de cada polígono em rings, n_polígonos + 1
+- feats.<nível>:  início de cada feature em polys, n_features + 1
+- types, bbox:    tipo da geometria e caixa (da geometria original) por feature
+- props, props_offsets: cada feature sem a geometria, em JSON, e o índice
+
+com um nível por entrada da pirâmide de LOD (utils/simplify.build_lod; "orig" =
+geometria original). O arquivo é mapeado só para leitura: todos os workers do
+uvicorn compartilham as mesmas páginas do cache do sistema, abrir é quase
+instantâneo, e o GeoJSON de uma feature só é montado quando ela é pedida.
+
+Formato: MAGIC, u32 com o tamanho do cabeçalho, cabeçalho JSON
+{"count", "levels", "sections": {nome: [offset, bytes, formato]}, "meta",
+"digest"} e as seções alinhadas em 8 bytes. Números em little-endian. digest
+identifica o conteúdo (seções + meta), para ETags estáveis entre workers.
+"""
+
+import hashlib
+import mmap
+import os
+import sys
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import orjson
+
+MAGIC = b"GEOSTOR1"
+
+# códigos de tipo de geometria
+_NONE, _POINT, _POLYGON, _MULTIPOLYGON = 0, 1, 2, 3
+_TYPE_CODES = {None: _NONE, "Point": _POINT, "Polygon": _POLYGON, "MultiPolygon": _MULTIPOLYGON}
+
+
+def _level_name(level: Optional[int]) -> str:
+    return "orig" if level is None else str(level)
+
+
+def _geometry_polygons(geometry: Optional[Dict]) -> Tuple[int, List]:
+    """(código do tipo, lista de polígonos -> anéis -> pontos)"""
+    kind = geometry.get("type") if geometry else None
+    if kind not in _TYPE_CODES:
+        raise ValueError(f"geometria não suportada: {kind}")
+    if kind is None:
+        return _NONE, []
+    coords = geometry["coordinates"]
+    if kind == "Point":
+        return _POINT, [[[coords]]]
+    if kind == "Polygon":
+        return _POLYGON, [coords]
+    return _MULTIPOLYGON, list(coords)
+
+
+def _raw(arr: array) -> bytes:
+    if sys.byteorder == "big":  # pragma: no cover
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def encode_store(pyramid: Dict[Optional[int], Sequence[Dict]], meta: Optional[Dict] = None) -> bytes:
+    """
+    Codifica uma pirâmide de LOD ({nível: features}, None = originais, todas
+    as listas na mesma ordem) no formato do arquivo.
+
+    Raises:
+        ValueError: geometria que não seja Point, Polygon ou MultiPolygon
+    """
+    originals = list(pyramid[None])
+    n = len(originals)
+
+    types = array("B")
+    bbox = array("d")
+    props = bytearray()
+    props_offsets = array("Q", [0])
+    for feature in originals:
+        code, polygons = _geometry_polygons(feature.get("geometry"))
+        types.append(code)
+        xs = [p[0] for poly in polygons for ring in poly for p in ring]
+        ys = [p[1] for poly in polygons for ring in poly for p in ring]
+        bbox.extend((min(xs), min(ys), max(xs), max(ys)) if xs else (0.0, 0.0, 0.0, 0.0))
+        props += orjson.dumps({k: v for k, v in feature.items() if k != "geometry"})
+        props_offsets.append(len(props))
+
+    sections: Dict[str, Tuple[str, bytes]] = {
+        "types": ("B", _raw(types)),
+        "bbox": ("d", _raw(bbox)),
+        "props_offsets": ("Q", _raw(props_offsets)),
+        "props": ("B", bytes(props)),
+    }
+
+    levels = [None] + sorted(level for level in pyramid if level is not None)
+    for level in levels:
+        features = pyramid[level]
+        if len(features) != n:
+            raise ValueError(f"nível {level}: {len(features)} features, esperado {n}")
+        feats, polys, rings, coords = array("I", [0]), array("I", [0]), array("I", [0]), array("d")
+        for feature in features:
+            _, polygons = _geometry_polygons(feature.get("geometry"))
+            for poly in polygons:
+                for ring in poly:
+                    for p in ring:
+                        coords.append(p[0])
+                        coords.append(p[1])
+                    rings.append(len(coords) // 2)
+                polys.append(len(rings) - 1)
+            feats.append(len(polys) - 1)
+        name = _level_name(level)
+        sections[f"feats.{name}"] = ("I", _raw(feats))
+        sections[f"polys.{name}"] = ("I", _raw(polys))
+        sections[f"rings.{name}"] = ("I", _raw(rings))
+        sections[f"coords.{name}"] = ("d", _raw(coords))
+
+    digest = hashlib.blake2b(orjson.dumps(meta or {}), digest_size=16)
+    for name, (fmt, data) in sections.items():
+        digest.update(name.encode())
+        digest.update(data)
+
+    # offsets dependem do tamanho do cabeçalho: reserva espaço fixo por seção
+    layout: Dict[str, List] = {name: [0, len(data), fmt] for name, (fmt, data) in sections.items()}
+    header = {"count": n, "levels": levels, "sections": layout, "meta": meta or {}, "digest": digest.hexdigest()}
+    while True:
+        encoded = orjson.dumps(header)
+        offset = len(MAGIC) + 4 + len(encoded)
+        changed = False
+        for name, (fmt, data) in sections.items():
+            offset += -offset % 8
+            if layout[name][0] != offset:
+                layout[name][0] = offset
+                changed = True
+            offset += len(data)
+        if not changed:
+            break
+
+    out = bytearray(MAGIC)
+    out += len(encoded).to_bytes(4, "little")
+    out += encoded
+    for name, (fmt, data) in sections.items():
+        out += b"\0" * (layout[name][0] - len(out))
+        out += data
+    return bytes(out)
+
+
+def write_store(path: Union[str, Path], pyramid: Dict[Optional[int], Sequence[Dict]], meta: Optional[Dict] = None) -> int:
+    """Grava o arquivo (troca atômica, seguro com workers lendo o anterior). Retorna o tamanho em bytes."""
+    path = Path(path)
+    data = encode_store(pyramid, meta)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+    return len(data)
+
+
+class GeoStore:
+    """
+    Leitura das features de um arquivo (ou buffer) no formato acima
+
+    As seções são memoryviews sobre o buffer; nada é copiado até feature()
+    ou geometry() montar o GeoJSON de uma feature.
+    """
+
+    def __init__(self, buffer):
+        if sys.byteorder == "big":  # pragma: no cover
+            raise ValueError("GeoStore requer uma plataforma little-endian")
+        view = memoryview(buffer)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError("arquivo não está no formato GeoStore")
+        start = len(MAGIC) + 4
+        size = int.from_bytes(view[len(MAGIC):start], "little")
+        header = orjson.loads(bytes(view[start:start + size]))
+
+        self._buffer = buffer
+        self.count: int = header["count"]
+        self.levels: List[Optional[int]] = header["levels"]
+        self.meta: Dict = header["meta"]
+        # ausente em arquivos gerados antes do campo existir
+        self.digest: Optional[str] = header.get("digest")
+        self._sections = {
+            name: view[offset:offset + nbytes].cast(fmt)
+            for name, (offset, nbytes, fmt) in header["sections"].items()
+        }
+
+    @classmethod
+    def open(cls, path: Union[str, Path]) -> "GeoStore":
+        """Mapeia o arquivo em memória (somente leitura)."""
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mapped)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def has_geometry(self, i: int) -> bool:
+        return self._sections["types"][i] != _NONE
+
+    def bbox(self, i: int) -> Tuple[float, float, float, float]:
+        return tuple(self._sections["bbox"][4 * i:4 * i + 4].tolist())
+
+    def properties(self, i: int) -> Dict:
+        """A feature sem a geometria (type, properties, id...)."""
+        offsets = self._sections["props_offsets"]
+        return orjson.loads(self._sections["props"][offsets[i]:offsets[i + 1]])
+
+    def geometry(self, i: int, level: Optional[int] = None) -> Optional[Dict]:
+        """Geometria GeoJSON do nível de LOD (None = original)."""
+        code = self._sections["types"][i]
+        if code == _NONE:
+            return None
+        name = _level_name(level)
+        feats = self._sections[f"feats.{name}"]
+        polys = self._sections[f"polys.{name}"]
+        rings = self._sections[f"rings.{name}"]
+        coords = self._sections[f"coords.{name}"]
+
+        polygons = []
+        for p in range(feats[i], feats[i + 1]):
+            rings_out = []
+            for r in range(polys[p], polys[p + 1]):
+                flat = coords[2 * rings[r]:2 * rings[r + 1]].tolist()
+                rings_out.append(list(map(list, zip(flat[0::2], flat[1::2]))))
+            polygons.append(rings_out)
+
+        if code == _POINT:
+            return {"type": "Point", "coordinates": polygons[0][0][0]}
+        if code == _POLYGON:
+            return {"type": "Polygon", "coordinates": polygons[0]}
+        return {"type": "MultiPolygon", "coordinates": polygons}
+
+    def feature(self, i: int, level: Optional[int] = None) -> Dict:
+        return {**self.properties(i), "geometry": self.geometry(i, level)}
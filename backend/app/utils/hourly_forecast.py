@@ -0,0 +1,210 @@
+"""
+Representação compacta de uma previsão horária
+
+Em vez de uma lista de dicts por hora, guarda um array tipado por variável
+(array("d") com NaN para valores ausentes; array("h") com -1 para a
+probabilidade ausente), mais o horário inicial e o passo. Ocupa uma fração da
+memória da lista de dicts e permite que o cálculo de risco percorra buffers
+contíguos.
+
+Fatias (forecast[a:b], days_view) são views: compartilham os arrays e só
+guardam o intervalo. A lista de dicts do formato antigo só é montada sob
+demanda (to_list / iteração), para a resposta JSON.
+"""
+
+import hashlib
+import math
+from array import array
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Sequence
+
+NAN = float("nan")
+TIME_FORMAT = "%Y-%m-%dT%H:%M"
+
+
+def _floats(values: Sequence, n: int) -> array:
+    out = array("d", [NAN]) * n
+    for i, v in enumerate(values[:n]):
+        if v is not None:
+            out[i] = float(v)
+    return out
+
+
+def _ints(values: Sequence, n: int) -> array:
+    out = array("h", [-1]) * n
+    for i, v in enumerate(values[:n]):
+        if v is not None:
+            out[i] = int(v)
+    return out
+
+
+def _opt(x: float) -> Optional[float]:
+    return None if math.isnan(x) else x
+
+
+class HourlyForecast:
+    """
+    Previsão horária com um array por variável
+
+    Comporta-se como uma sequência de dicts {"timestamp", "temperature",
+    "precipitation", "precipitation_probability", "wind_speed"} (len, índice,
+    fatia, iteração), então o código que consumia a lista continua funcionando.
+    """
+
+    __slots__ = (
+        "base", "step", "temperature", "precipitation", "precipitation_probability",
+        "wind_speed", "_times", "_start", "_stop", "days", "bounds", "fetched_at",
+    )
+
+    def __init__(
+        self,
+        base: Optional[datetime],
+        step: timedelta,
+        temperature: array,
+        precipitation: array,
+        precipitation_probability: array,
+        wind_speed: array,
+        times: Optional[List[str]] = None,
+        start: int = 0,
+        stop: Optional[int] = None,
+    ):
+        self.base = base
+        self.step = step
+        self.temperature = temperature
+        self.precipitation = precipitation
+        self.precipitation_probability = precipitation_probability
+        self.wind_speed = wind_speed
+        # só usado se os horários não forem regulares (base + i * step)
+        self._times = times
+        self._start = start
+        self._stop = len(temperature) if stop is None else stop
+        self.days: Optional[Dict[str, int]] = None
+        self.bounds: Optional[List[int]] = None
+        # instante (time.time()) em que a previsão foi obtida do Open-Meteo
+        self.fetched_at: Optional[float] = None
+
+    @classmethod
+    def from_open_meteo(cls, hourly: Dict) -> "HourlyForecast":
+        """Monta a partir do bloco "hourly" de uma resposta Open-Meteo."""
+        times = hourly.get("time", []) or []
+        n = len(times)
+        base, step, irregular = None, timedelta(hours=1), None
+        if n:
+            parsed = [datetime.strptime(t, TIME_FORMAT) for t in times]
+            base = parsed[0]
+            if n > 1:
+                step = parsed[1] - parsed[0]
+            if any(parsed[i] != base + i * step for i in range(n)):
+                irregular = list(times)
+
+        fc = cls(
+            base,
+            step,
+            _floats(hourly.get("temperature_2m", []) or [], n),
+            _floats(hourly.get("precipitation", []) or [], n),
+            _ints(hourly.get("precipitation_probability", []) or [], n),
+            _floats(hourly.get("wind_speed_10m", []) or [], n),
+            times=irregular,
+        )
+        fc._index_days()
+        return fc
+
+    @classmethod
+    def empty(cls) -> "HourlyForecast":
+        return cls(None, timedelta(hours=1), array("d"), array("d"), array("h"), array("d"))
+
+    def _index_days(self) -> None:
+        # data ("YYYY-MM-DD") -> posição do dia; bounds[pos]..bounds[pos + 1] são as horas do dia
+        self.days, self.bounds = {}, []
+        for i in range(len(self)):
+            day = self.timestamp(i)[:10]
+            if day not in self.days:
+                self.days[day] = len(self.bounds)
+                self.bounds.append(i)
+        self.bounds.append(len(self))
+
+    # ------------------------------------------------------------------
+    # Views
+    # ------------------------------------------------------------------
+    def _view(self, start: int, stop: int) -> "HourlyForecast":
+        view = HourlyForecast(
+            self.base, self.step, self.temperature, self.precipitation,
+            self.precipitation_probability, self.wind_speed,
+            times=self._times, start=start, stop=stop,
+        )
+        view.fetched_at = self.fetched_at
+        return view
+
+    def days_view(self, forecast_days: int, date: Optional[str] = None) -> "HourlyForecast":
+        """Primeiros `forecast_days` dias, ou só o dia `date` (se estiver nessa janela)."""
+        if self.days is None:
+            self._index_days()
+        if date:
+            pos = self.days.get(date)
+            if pos is None or pos >= forecast_days:
+                return self[0:0]
+            return self[self.bounds[pos]:self.bounds[pos + 1]]
+        if forecast_days >= len(self.days):
+            return self
+        return self[:self.bounds[forecast_days]]
+
+    def buffer(self, name: str) -> memoryview:
+        """Trecho contíguo do array da variável correspondente a esta view (sem cópia)."""
+        return memoryview(getattr(self, name))[self._start:self._stop]
+
+    def fingerprint(self) -> str:
+        """
+        Digest do conteúdo desta view (horários e valores), estável entre
+        processos: a mesma previsão dá o mesmo fingerprint mesmo se for
+        buscada de novo (usado nos ETags)
+        """
+        h = hashlib.blake2b(digest_size=16)
+        if len(self):
+            h.update(f"{self.timestamp(0)}|{self.timestamp(len(self) - 1)}|{len(self)}".encode())
+        for name in ("temperature", "precipitation", "precipitation_probability", "wind_speed"):
+            h.update(self.buffer(name))
+        return h.hexdigest()
+
+    # ------------------------------------------------------------------
+    # Protocolo de sequência (compatível com a lista de dicts)
+    # ------------------------------------------------------------------
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    def timestamp(self, i: int) -> str:
+        j = self._start + i
+        if self._times is not None:
+            return self._times[j]
+        return (self.base + j * self.step).strftime(TIME_FORMAT)
+
+    def _point(self, i: int) -> Dict:
+        j = self._start + i
+        prob = self.precipitation_probability[j]
+        return {
+            "timestamp": self.timestamp(i),
+            "temperature": _opt(self.temperature[j]),
+            "precipitation": _opt(self.precipitation[j]),
+            "precipitation_probability": None if prob < 0 else prob,
+            "wind_speed": _opt(self.wind_speed[j]),
+        }
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, stride = key.indices(len(self))
+            if stride != 1:
+                return [self._point(i) for i in range(start, stop, stride)]
+            return self._view(self._start + start, self._start + max(start, stop))
+        n = len(self)
+        if key < 0:
+            key += n
+        if not 0 <= key < n:
+            raise IndexError("HourlyForecast index out of range")
+        return self._point(key)
+
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(len(self)):
+            yield self._point(i)
+
+    def to_list(self) -> List[Dict]:
+        """Lista de dicts (formato da resposta JSON)."""
+        return list(self)
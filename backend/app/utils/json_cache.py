@@ -0,0 +1,69 @@
+"""
+Respostas JSON com orjson e cache de corpos já codificados
+
+As respostas da API usam ORJSONResponse (default_response_class em main.py):
+orjson é bem mais rápido que o json da stdlib, grava UTF-8 direto (nomes com
+acento saem sem escape) e converte NaN/Infinity em null em vez de gerar JSON
+inválido.
+
+EncodedCache guarda o corpo já codificado de respostas cujas entradas não
+mudaram (ex.: /states enquanto o catálogo IBGE é o mesmo), evitando montar e
+serializar o mesmo conteúdo a cada requisição.
+"""
+
+from typing import Any, Callable, Hashable, Optional
+
+import orjson
+from cachetools import TTLCache
+from fastapi.responses import ORJSONResponse, Response
+
+# mesmas opções do ORJSONResponse do FastAPI
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def encode_json(content: Any) -> bytes:
+    return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+
+def json_bytes_response(payload: bytes, status_code: int = 200) -> Response:
+    """Resposta com um corpo JSON já codificado (sem nova serialização)."""
+    return Response(content=payload, status_code=status_code, media_type=ORJSONResponse.media_type)
+
+
+class EncodedCache:
+    """
+    Corpos JSON codificados por chave, com TTL
+
+    A chave deve incluir tudo de que a resposta depende (parâmetros e versão
+    dos dados); o TTL só limita por quanto tempo uma entrada sem uso fica na memória.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 300):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get_or_encode(self, key: Hashable, build: Callable[[], Any]) -> Optional[bytes]:
+        """
+        Corpo codificado da chave; na falta, chama build() e codifica o resultado
+
+        Returns:
+            bytes, ou None se build() retornar None (nada é guardado)
+        """
+        payload = self._cache.get(key)
+        if payload is not None:
+            self.stats["hits"] += 1
+            return payload
+        self.stats["misses"] += 1
+        content = build()
+        if content is None:
+            return None
+        payload = encode_json(content)
+        self._cache[key] = payload
+        return payload
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+# Instância única do processo
+encoded_cache = EncodedCache()
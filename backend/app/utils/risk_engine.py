@@ -1,58 +1,59 @@
-﻿from typing import Dict, List
+﻿from itertools import accumulate
 from statistics import mean
+from typing import Dict, List, Optional, Sequence, Union
+
+try:  # cálculo vetorizado em lote (compute_risk_batch); sem NumPy cai no laço escalar
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from .hourly_forecast import HourlyForecast
 
 # Pesos (máximo 1.0)
 W_RAIN = 0.70  # chuva total 6h
 W_WIND = 0.25  # vento médio 6h
 W_TEMP = 0.05  # ajuste leve por temperatura
 
+WINDOW_HOURS = 6
+
+# Normalizações simples (ajuste conforme calibração real):
+# - chuva: 0..30 mm em 6h -> 0..1
+# - vento: 0..60 km/h -> 0..1
+# - temp:  10..35 °C -> 0..1 (usada só como ajuste)
+RAIN_BOUNDS = (0.0, 30.0)
+WIND_BOUNDS = (0.0, 60.0)
+TEMP_BOUNDS = (10.0, 35.0)
+
+# (limite mínimo do score, nível, mensagem), do mais alto para o mais baixo
+LEVELS = (
+    (0.8, "Crítico", "Risco crítico de alagamento. Evite áreas de risco."),
+    (0.6, "Alto", "Risco alto. Fique atento a alagamentos."),
+    (0.4, "Moderado", "Risco moderado nas próximas horas."),
+)
+BASE_LEVEL = ("Baixo", "Risco baixo.")
+
 def _normalize(val: float, min_v: float, max_v: float) -> float:
     if max_v <= min_v:
         return 0.0
     x = (val - min_v) / (max_v - min_v)
     return max(0.0, min(1.0, x))
 
-def compute_risk(hourly: List[Dict]) -> Dict:
-    """
-    hourly: lista de pontos horários: {timestamp, temperature, precipitation, wind_speed}
-    Janela de 6h mais recentes (ou primeiras 6h, conforme ordenação da API).
-    """
-    if not hourly:
-        return {
-            "risk_score": 0.0,
-            "level": "Baixo",
-            "message": "Sem dados meteorológicos.",
-            "factors": {"precipitation_6h_mm": 0.0, "wind_avg_6h_kmh": 0.0, "temp_avg_6h_c": 0.0},
-            "forecast_window": [],
-        }
-
-    # Open-Meteo retorna em ordem cronológica. Considera as primeiras 6 leituras (6h).
-    window = hourly[:6] if len(hourly) >= 6 else hourly
-
-    rain_6h = sum([(p.get("precipitation") or 0.0) for p in window])
-    wind_avg = mean([(p.get("wind_speed") or 0.0) for p in window])
-    temp_avg = mean([(p.get("temperature") or 0.0) for p in window])
-
-    # Normalizações simples (ajuste conforme calibração real):
-    # - chuva: 0..30 mm em 6h -> 0..1
-    # - vento: 0..60 km/h -> 0..1
-    # - temp:  10..35 °C -> 0..1 (usada só como ajuste)
-    n_rain = _normalize(rain_6h, 0.0, 30.0)
-    n_wind = _normalize(wind_avg, 0.0, 60.0)
-    n_temp = _normalize(temp_avg, 10.0, 35.0)
+def _score(rain_6h: float, wind_avg: float, temp_avg: float) -> float:
+    n_rain = _normalize(rain_6h, *RAIN_BOUNDS)
+    n_wind = _normalize(wind_avg, *WIND_BOUNDS)
+    n_temp = _normalize(temp_avg, *TEMP_BOUNDS)
 
     score = (n_rain * W_RAIN) + (n_wind * W_WIND) + (n_temp * W_TEMP)
-    score = max(0.0, min(1.0, score))
-
-    if score >= 0.8:
-        level, msg = "Crítico", "Risco crítico de alagamento. Evite áreas de risco."
-    elif score >= 0.6:
-        level, msg = "Alto", "Risco alto. Fique atento a alagamentos."
-    elif score >= 0.4:
-        level, msg = "Moderado", "Risco moderado nas próximas horas."
-    else:
-        level, msg = "Baixo", "Risco baixo."
+    return max(0.0, min(1.0, score))
+
+def _level(score: float):
+    for threshold, level, msg in LEVELS:
+        if score >= threshold:
+            return level, msg
+    return BASE_LEVEL
 
+def _result(score: float, rain_6h: float, wind_avg: float, temp_avg: float) -> Dict:
+    level, msg = _level(score)
     return {
         "risk_score": round(score, 3),
         "level": level,
@@ -62,5 +63,203 @@ def compute_risk(hourly: List[Dict]) -> Dict:
             "wind_avg_6h_kmh": round(wind_avg, 2),
             "temp_avg_6h_c": round(temp_avg, 2),
         },
-        "forecast_window": window,
     }
+
+def _no_data() -> Dict:
+    return {
+        "risk_score": 0.0,
+        "level": "Baixo",
+        "message": "Sem dados meteorológicos.",
+        "factors": {"precipitation_6h_mm": 0.0, "wind_avg_6h_kmh": 0.0, "temp_avg_6h_c": 0.0},
+    }
+
+def _window_risk(precs: List[float], winds: List[float], temps: List[float]) -> Dict:
+    rain_6h = sum(precs)
+    wind_avg = mean(winds)
+    temp_avg = mean(temps)
+    return _result(_score(rain_6h, wind_avg, temp_avg), rain_6h, wind_avg, temp_avg)
+
+def compute_risk(hourly: Union[HourlyForecast, List[Dict]]) -> Dict:
+    """
+    hourly: HourlyForecast ou lista de pontos horários: {timestamp, temperature, precipitation, wind_speed}
+    Janela de 6h mais recentes (ou primeiras 6h, conforme ordenação da API).
+    """
+    if not hourly:
+        return {**_no_data(), "forecast_window": []}
+
+    # Open-Meteo retorna em ordem cronológica. Considera as primeiras 6 leituras (6h).
+    window = hourly[:WINDOW_HOURS] if len(hourly) >= WINDOW_HOURS else hourly
+
+    if isinstance(window, HourlyForecast):
+        # buffers contíguos; valor ausente (NaN) conta como 0, como no formato em dict
+        precs = [v if v == v else 0.0 for v in window.buffer("precipitation")]
+        winds = [v if v == v else 0.0 for v in window.buffer("wind_speed")]
+        temps = [v if v == v else 0.0 for v in window.buffer("temperature")]
+    else:
+        precs = [(p.get("precipitation") or 0.0) for p in window]
+        winds = [(p.get("wind_speed") or 0.0) for p in window]
+        temps = [(p.get("temperature") or 0.0) for p in window]
+
+    result = _window_risk(precs, winds, temps)
+    result["forecast_window"] = window.to_list() if isinstance(window, HourlyForecast) else window
+    return result
+
+def compute_risk_timeline(hourly: Union[HourlyForecast, List[Dict]]) -> Dict:
+    """
+    Série de risco hora a hora sobre todo o horizonte da previsão
+
+    Para cada hora i usa a janela de 6h que começa em i (menor no fim do
+    horizonte). Somas e médias móveis saem de somas de prefixo, em O(T).
+
+    Returns:
+        {"window_hours", "series": [{"timestamp", "risk_score", "level"}],
+         "peak": {"timestamp", "risk_score", "level"} | None,
+         "first_crossings": {nível: timestamp | None}}
+    """
+    n = len(hourly) if hourly else 0
+    if isinstance(hourly, HourlyForecast):
+        precs = [v if v == v else 0.0 for v in hourly.buffer("precipitation")]
+        winds = [v if v == v else 0.0 for v in hourly.buffer("wind_speed")]
+        temps = [v if v == v else 0.0 for v in hourly.buffer("temperature")]
+        times = [hourly.timestamp(i) for i in range(n)]
+    else:
+        hourly = hourly or []
+        precs = [(p.get("precipitation") or 0.0) for p in hourly]
+        winds = [(p.get("wind_speed") or 0.0) for p in hourly]
+        temps = [(p.get("temperature") or 0.0) for p in hourly]
+        times = [p.get("timestamp") for p in hourly]
+
+    # prefixo[k] = soma dos k primeiros valores
+    p_rain = list(accumulate(precs, initial=0.0))
+    p_wind = list(accumulate(winds, initial=0.0))
+    p_temp = list(accumulate(temps, initial=0.0))
+
+    series = []
+    peak: Optional[Dict] = None
+    first_crossings: Dict[str, Optional[str]] = {level: None for _, level, _ in reversed(LEVELS)}
+    for i in range(n):
+        j = min(n, i + WINDOW_HOURS)
+        hours = j - i
+        score = _score(
+            p_rain[j] - p_rain[i],
+            (p_wind[j] - p_wind[i]) / hours,
+            (p_temp[j] - p_temp[i]) / hours,
+        )
+        level, _ = _level(score)
+        point = {"timestamp": times[i], "risk_score": round(score, 3), "level": level}
+        series.append(point)
+        if peak is None or score > peak["_score"]:
+            peak = {**point, "_score": score}
+        for threshold, name, _ in LEVELS:
+            if score >= threshold and first_crossings[name] is None:
+                first_crossings[name] = times[i]
+
+    if peak is not None:
+        peak.pop("_score")
+    return {
+        "window_hours": WINDOW_HOURS,
+        "series": series,
+        "peak": peak,
+        "first_crossings": first_crossings,
+    }
+
+def compute_risk_batch(precipitation, wind_speed, temperature) -> List[Dict]:
+    """
+    Risco de N localizações de uma vez, em uma passada vetorizada
+
+    Args:
+        precipitation, wind_speed, temperature: matrizes N x T (localizações x horas);
+            NaN conta como 0, como valor ausente em compute_risk
+
+    Returns:
+        Lista com N resultados {"risk_score", "level", "message", "factors"},
+        idênticos aos de compute_risk sobre as mesmas horas (sem "forecast_window")
+
+    Somas e médias em ponto flutuante podem diferir das de compute_risk (sum e
+    statistics.mean) no último bit; só importa quando o valor está colado num
+    limite de arredondamento ou de nível, e essas linhas (raras) são refeitas
+    pelo caminho escalar.
+    """
+    if np is None:
+        return [
+            _scalar_row(p, w, t)
+            for p, w, t in zip(precipitation, wind_speed, temperature)
+        ]
+
+    P = np.nan_to_num(np.asarray(precipitation, dtype=np.float64), nan=0.0)
+    W = np.nan_to_num(np.asarray(wind_speed, dtype=np.float64), nan=0.0)
+    T = np.nan_to_num(np.asarray(temperature, dtype=np.float64), nan=0.0)
+    n, hours = P.shape
+    hours = min(hours, WINDOW_HOURS)
+    if n == 0:
+        return []
+    if hours == 0:
+        return [_no_data() for _ in range(n)]
+
+    P, W, T = P[:, :hours], W[:, :hours], T[:, :hours]
+    rain = P.sum(axis=1)
+    wind = W.sum(axis=1) / hours
+    temp = T.sum(axis=1) / hours
+
+    def norm(x, bounds):
+        lo, hi = bounds
+        if hi <= lo:
+            return np.zeros_like(x)
+        return np.clip((x - lo) / (hi - lo), 0.0, 1.0)
+
+    score = (norm(rain, RAIN_BOUNDS) * W_RAIN) + (norm(wind, WIND_BOUNDS) * W_WIND) + (norm(temp, TEMP_BOUNDS) * W_TEMP)
+    score = np.clip(score, 0.0, 1.0)
+
+    # linhas em que um erro de arredondamento mudaria a saída: caminho escalar
+    recheck = _near_half(score, 3) | _near_half(rain, 2) | _near_half(wind, 2) | _near_half(temp, 2)
+    for threshold, _, _ in LEVELS:
+        recheck |= np.abs(score - threshold) < _BOUNDARY_TOL
+
+    # arredondamento feito com round() do Python para bater com compute_risk
+    return [
+        _scalar_row(P[i], W[i], T[i]) if check else _result(s, r, w, t)
+        for i, (check, s, r, w, t) in enumerate(
+            zip(recheck.tolist(), score.tolist(), rain.tolist(), wind.tolist(), temp.tolist())
+        )
+    ]
+
+# folga (bem acima do erro de arredondamento da soma de 6 valores) para refazer uma linha no caminho escalar
+_BOUNDARY_TOL = 1e-9
+
+def _near_half(x, ndigits: int):
+    # perto de um empate de round(x, ndigits) (x.xx5 para ndigits=2)
+    scaled = x * 10 ** ndigits
+    return np.abs(scaled - np.floor(scaled) - 0.5) < _BOUNDARY_TOL * 10 ** ndigits
+
+def _scalar_row(precs: Sequence[float], winds: Sequence[float], temps: Sequence[float]) -> Dict:
+    # mesmo cálculo de compute_risk (NaN conta como 0)
+    precs = [float(v) if v == v else 0.0 for v in precs[:WINDOW_HOURS]]
+    winds = [float(v) if v == v else 0.0 for v in winds[:WINDOW_HOURS]]
+    temps = [float(v) if v == v else 0.0 for v in temps[:WINDOW_HOURS]]
+    if not precs:
+        return _no_data()
+    return _window_risk(precs, winds, temps)
+
+def compute_risk_many(forecasts: Sequence[HourlyForecast]) -> List[Dict]:
+    """
+    compute_risk_batch a partir de previsões horárias (ex.: todos os municípios de
+    uma UF). Previsões com janelas de tamanhos diferentes são agrupadas por tamanho.
+    """
+    results: List[Optional[Dict]] = [None] * len(forecasts)
+    groups: Dict[int, List[int]] = {}
+    for i, fc in enumerate(forecasts):
+        groups.setdefault(min(len(fc), WINDOW_HOURS), []).append(i)
+
+    for hours, idxs in groups.items():
+        if hours == 0:
+            for i in idxs:
+                results[i] = _no_data()
+            continue
+        cols = {
+            name: [forecasts[i].buffer(name)[:hours].tolist() for i in idxs]
+            for name in ("precipitation", "wind_speed", "temperature")
+        }
+        batch = compute_risk_batch(cols["precipitation"], cols["wind_speed"], cols["temperature"])
+        for i, res in zip(idxs, batch):
+            results[i] = res
+    return results
@@ -0,0 +1,194 @@
+"""
+Simplificação de geometrias por nível de zoom (pirâmide de LOD)
+
+Douglas–Peucker aplicado a cada anel, preservando a topologia entre polígonos
+vizinhos: os anéis são cortados nos vértices onde muda o conjunto de anéis que
+compartilham o ponto, e cada trecho é simplificado com as pontas fixas. Uma
+divisa comum a dois municípios vira o mesmo trecho nos dois anéis e sai
+simplificada da mesma forma, sem frestas nem sobreposições entre eles.
+
+A tolerância de cada nível é o tamanho de LOD_PIXEL_TOLERANCE pixels (tile de
+256 px) no zoom do nível.
+"""
+
+import os
+from typing import Dict, Hashable, List, Optional, Sequence, Set, Tuple
+
+try:  # trechos longos com NumPy (cálculo de distâncias vetorizado)
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+# Zooms em que uma versão simplificada é pré-calculada; acima do maior, geometria original
+LOD_ZOOMS = tuple(int(z) for z in os.getenv("LOD_ZOOMS", "4,7,10").split(",") if z.strip())
+LOD_PIXEL_TOLERANCE = float(os.getenv("LOD_PIXEL_TOLERANCE", "1.0"))
+
+Point = Tuple[float, float]
+
+
+def zoom_tolerance(zoom: int) -> float:
+    """Graus por pixel no zoom (tile de 256 px), vezes LOD_PIXEL_TOLERANCE."""
+    return 360.0 / (256 * (2 ** zoom)) * LOD_PIXEL_TOLERANCE
+
+
+def lod_level(zoom: Optional[int], levels: Optional[Sequence[Optional[int]]] = None) -> Optional[int]:
+    """
+    Nível pré-calculado para o zoom pedido (None = geometria original), entre
+    `levels` (padrão: LOD_ZOOMS)
+    """
+    if zoom is None:
+        return None
+    for level in sorted(l for l in (LOD_ZOOMS if levels is None else levels) if l is not None):
+        if zoom <= level:
+            return level
+    return None
+
+
+def _dist2_to_point(p: Sequence[float], a: Sequence[float]) -> float:
+    ex, ey = p[0] - a[0], p[1] - a[1]
+    return ex * ex + ey * ey
+
+
+# a partir deste tamanho o trecho é medido com NumPy
+_NUMPY_MIN_SPAN = 64
+
+
+def douglas_peucker(points: Sequence[Sequence[float]], tolerance: float) -> List[Sequence[float]]:
+    """Douglas–Peucker iterativo; mantém sempre o primeiro e o último ponto."""
+    n = len(points)
+    if n <= 2:
+        return list(points)
+    tol2 = tolerance * tolerance
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    xs = ys = None
+    if np is not None and n > _NUMPY_MIN_SPAN:
+        arr = np.asarray(points, dtype=np.float64)
+        xs, ys = arr[:, 0], arr[:, 1]
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        ax, ay = points[start][0], points[start][1]
+        dx, dy = points[end][0] - ax, points[end][1] - ay
+        seg2 = dx * dx + dy * dy
+        if xs is not None and end - start > _NUMPY_MIN_SPAN:
+            px, py = xs[start + 1:end] - ax, ys[start + 1:end] - ay
+            if seg2 > 0:
+                t = np.clip((px * dx + py * dy) / seg2, 0.0, 1.0)
+                px, py = px - t * dx, py - t * dy
+            d = px * px + py * py
+            k = int(np.argmax(d))
+            best, best_i = float(d[k]), start + 1 + k
+        else:
+            best, best_i = -1.0, -1
+            for i in range(start + 1, end):
+                px, py = points[i][0] - ax, points[i][1] - ay
+                if seg2 > 0:
+                    t = (px * dx + py * dy) / seg2
+                    t = 0.0 if t < 0 else (1.0 if t > 1 else t)
+                    px, py = px - t * dx, py - t * dy
+                d = px * px + py * py
+                if d > best:
+                    best, best_i = d, i
+        if best > tol2:
+            keep[best_i] = True
+            stack.append((start, best_i))
+            stack.append((best_i, end))
+    return [p for p, k in zip(points, keep) if k]
+
+
+def _key(p: Sequence[float]) -> Tuple[float, float]:
+    return (round(p[0], 9), round(p[1], 9))
+
+
+def _split_ring(ring: Sequence[Sequence[float]], owners: Dict[Point, Set[Hashable]]) -> Optional[List[List]]:
+    """
+    Trechos do anel entre vértices de corte (onde muda o conjunto de anéis
+    donos do ponto). None se o anel for pequeno demais para simplificar.
+    """
+    pts = list(ring[:-1]) if len(ring) > 1 and _key(ring[0]) == _key(ring[-1]) else list(ring)
+    n = len(pts)
+    if n < 4:
+        return None
+
+    sets = [owners[_key(p)] for p in pts]
+    breaks = [i for i in range(n) if sets[i] != sets[i - 1] or sets[i] != sets[(i + 1) % n]]
+    if not breaks:
+        # anel sem vizinhos: fixa o primeiro ponto e o mais distante dele
+        far = max(range(n), key=lambda i: _dist2_to_point(pts[i], pts[0]))
+        breaks = [0, far] if far else [0]
+
+    pieces = []
+    for k, start in enumerate(breaks):
+        end = breaks[(k + 1) % len(breaks)]
+        span = end - start if end > start else end + n - start
+        pieces.append([pts[(start + j) % n] for j in range(span + 1)])
+    return pieces
+
+
+def _simplify_pieces(ring: Sequence[Sequence[float]], pieces: Optional[List[List]], tolerance: float) -> List:
+    if pieces is None:
+        return list(ring)
+    out: List = []
+    for piece in pieces:
+        out.extend(douglas_peucker(piece, tolerance)[:-1])
+    if len(out) < 3:
+        # colapsou: mantém o anel original (pequeno de qualquer forma)
+        return list(ring)
+    out.append(out[0])
+    return out
+
+
+def _polygons(geometry: Optional[Dict]) -> List[List]:
+    if not geometry:
+        return []
+    if geometry.get("type") == "Polygon":
+        return [geometry["coordinates"]]
+    if geometry.get("type") == "MultiPolygon":
+        return list(geometry["coordinates"])
+    return []
+
+
+def _prepare(features: Sequence[Dict]) -> List[Optional[List]]:
+    """Trechos de cada anel, por feature/polígono (None para geometrias que não são polígonos)."""
+    owners: Dict[Point, Set[Hashable]] = {}
+    for fi, feature in enumerate(features):
+        for pi, polygon in enumerate(_polygons(feature.get("geometry"))):
+            for ri, ring in enumerate(polygon):
+                for p in ring:
+                    owners.setdefault(_key(p), set()).add((fi, pi, ri))
+
+    return [
+        [[_split_ring(ring, owners) for ring in polygon] for polygon in _polygons(feature.get("geometry"))]
+        or None
+        for feature in features
+    ]
+
+
+def _apply(features: Sequence[Dict], prepared: List[Optional[List]], tolerance: float) -> List[Dict]:
+    out = []
+    for feature, pieces in zip(features, prepared):
+        if pieces is None:
+            out.append(feature)
+            continue
+        geometry = feature["geometry"]
+        polygons = [
+            [_simplify_pieces(ring, ring_pieces, tolerance) for ring, ring_pieces in zip(polygon, poly_pieces)]
+            for polygon, poly_pieces in zip(_polygons(geometry), pieces)
+        ]
+        coords = polygons[0] if geometry["type"] == "Polygon" else polygons
+        out.append({**feature, "geometry": {"type": geometry["type"], "coordinates": coords}})
+    return out
+
+
+def build_lod(features: Sequence[Dict], zooms: Sequence[int] = LOD_ZOOMS) -> Dict[Optional[int], List[Dict]]:
+    """
+    Pirâmide de LOD: {zoom do nível: features simplificadas, None: originais}
+    """
+    prepared = _prepare(features)
+    pyramid: Dict[Optional[int], List[Dict]] = {None: list(features)}
+    for zoom in zooms:
+        pyramid[zoom] = _apply(features, prepared, zoom_tolerance(zoom))
+    return pyramid
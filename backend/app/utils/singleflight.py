@@ -0,0 +1,89 @@
+"""
+Single-flight: deduplicação de chamadas concorrentes pela mesma chave
+
+Quando várias requisições erram o cache ao mesmo tempo, só a primeira dispara a
+chamada upstream; as demais aguardam o mesmo resultado. A chamada roda em uma
+task própria, então o cancelamento de quem a iniciou não afeta os demais, e um
+erro é repassado a todos sem ser guardado (a próxima chamada tenta de novo).
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional
+
+
+def _consume(fut: asyncio.Future) -> None:
+    # evita "exception was never retrieved" quando ninguém mais aguarda
+    if not fut.cancelled():
+        fut.exception()
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        # leaders: chamadas upstream disparadas; coalesced: quem pegou carona; errors: falhas
+        self.stats = {"leaders": 0, "coalesced": 0, "errors": 0}
+
+    def pending(self, key: Hashable) -> Optional[asyncio.Future]:
+        """Future em andamento para a chave, se houver (e conta o chamador como coalescido)."""
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.stats["coalesced"] += 1
+        return fut
+
+    def inflight(self, key: Hashable) -> bool:
+        """Se há chamada em andamento para a chave (sem contar como coalescido)."""
+        return key in self._inflight
+
+    def _start(self, keys: Iterable[Hashable], coro: Awaitable[Any], per_key: bool) -> asyncio.Task:
+        task = asyncio.ensure_future(coro)
+        task.add_done_callback(_consume)
+        self.stats["leaders"] += 1
+
+        entries = []
+        for key in keys:
+            if per_key:
+                fut = task.get_loop().create_future()
+                fut.add_done_callback(_consume)
+            else:
+                fut = task
+            self._inflight[key] = fut
+            entries.append((key, fut))
+
+        def _done(t: asyncio.Task) -> None:
+            exc = None if t.cancelled() else t.exception()
+            if exc is not None:
+                self.stats["errors"] += 1
+            for key, fut in entries:
+                if per_key and not fut.done():
+                    if t.cancelled():
+                        fut.cancel()
+                    elif exc is not None:
+                        fut.set_exception(exc)
+                    elif key in t.result():
+                        fut.set_result(t.result()[key])
+                    else:
+                        fut.set_exception(KeyError(key))
+                if self._inflight.get(key) is fut:
+                    del self._inflight[key]
+
+        task.add_done_callback(_done)
+        return task
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Executa fn() uma única vez por chave entre chamadores concorrentes."""
+        fut = self.pending(key)
+        if fut is None:
+            fut = self._start([key], fn(), per_key=False)
+        return await asyncio.shield(fut)
+
+    def do_many(self, keys: Iterable[Hashable], fn: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """
+        Dispara fn() uma vez registrando-a como em andamento para todas as `keys`
+        (ex.: uma chamada em lote). fn() deve retornar um dict chave -> resultado;
+        quem pedir uma dessas chaves via pending()/do() recebe o valor da sua chave.
+
+        O registro é imediato (antes do primeiro await), e o retorno é um
+        awaitable com o dict completo.
+        """
+        task = self._start(keys, fn(), per_key=True)
+        return asyncio.shield(task)
@@ -0,0 +1,92 @@
+"""
+Índice espacial estático: R-tree empacotada por Sort-Tile-Recursive (STR)
+
+Construída uma única vez com as caixas (bbox) de todas as geometrias. As
+folhas são agrupadas em nós de até `node_capacity` entradas, ordenando por x em
+faixas verticais e por y dentro de cada faixa, e o mesmo é repetido nível a
+nível até a raiz. A consulta por caixa desce só pelos nós que a intersectam.
+"""
+
+import math
+from typing import List, Sequence, Tuple
+
+from .geo import BBox
+
+
+def _str_order(boxes: Sequence[BBox], capacity: int) -> List[int]:
+    n = len(boxes)
+    if n <= capacity:
+        return list(range(n))
+    slabs = math.ceil(math.sqrt(math.ceil(n / capacity)))
+    per_slab = slabs * capacity
+    by_x = sorted(range(n), key=lambda i: boxes[i][0] + boxes[i][2])
+    order: List[int] = []
+    for start in range(0, n, per_slab):
+        order.extend(sorted(by_x[start:start + per_slab], key=lambda i: boxes[i][1] + boxes[i][3]))
+    return order
+
+
+def _pack(boxes: Sequence[BBox], capacity: int) -> List[Tuple[float, float, float, float, int, int]]:
+    nodes = []
+    for start in range(0, len(boxes), capacity):
+        group = boxes[start:start + capacity]
+        nodes.append((
+            min(b[0] for b in group),
+            min(b[1] for b in group),
+            max(b[2] for b in group),
+            max(b[3] for b in group),
+            start,
+            start + len(group),
+        ))
+    return nodes
+
+
+class STRTree:
+    """
+    R-tree estática sobre caixas (min_lon, min_lat, max_lon, max_lat)
+
+    query() devolve as posições (na sequência original) das caixas que
+    intersectam a caixa consultada.
+    """
+
+    def __init__(self, boxes: Sequence[BBox], node_capacity: int = 16):
+        self.node_capacity = max(2, node_capacity)
+        order = _str_order(boxes, self.node_capacity)
+        self._ids = order
+        self._boxes = [tuple(boxes[i]) for i in order]
+        # níveis internos, das folhas até a raiz: (min_lon, min_lat, max_lon, max_lat, início, fim)
+        # com início/fim apontando para o nível de baixo
+        self._levels: List[List[Tuple[float, float, float, float, int, int]]] = []
+
+        entries: List[BBox] = self._boxes
+        while entries:
+            nodes = _pack(entries, self.node_capacity)
+            if len(nodes) > 1:
+                # reordena os nós do nível antes de agrupá-los no próximo
+                order = _str_order([n[:4] for n in nodes], self.node_capacity)
+                nodes = [nodes[i] for i in order]
+            self._levels.append(nodes)
+            if len(nodes) == 1:
+                break
+            entries = [n[:4] for n in nodes]
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def query(self, bbox: BBox) -> List[int]:
+        if not self._levels:
+            return []
+        min_x, min_y, max_x, max_y = bbox
+        frontier = range(len(self._levels[-1]))
+        for nodes in reversed(self._levels):
+            children: List[int] = []
+            for i in frontier:
+                x0, y0, x1, y1, start, end = nodes[i]
+                if x0 <= max_x and x1 >= min_x and y0 <= max_y and y1 >= min_y:
+                    children.extend(range(start, end))
+            frontier = children
+        boxes = self._boxes
+        return [
+            self._ids[i] for i in frontier
+            if boxes[i][0] <= max_x and boxes[i][2] >= min_x and boxes[i][1] <= max_y and boxes[i][3] >= min_y
+        ]
@@ -0,0 +1,58 @@
+"""
+Respostas em streaming (NDJSON ou Server-Sent Events)
+
+Cada registro gerado pelo serviço sai como uma linha JSON (NDJSON) ou um
+evento SSE assim que fica pronto, sem montar a lista completa na memória. O
+último registro é um resumo ({"type": "summary", ...}), ou {"type": "error"}
+se o serviço falhar no meio (o status 200 já foi enviado).
+"""
+
+import logging
+from typing import AsyncIterator, Dict
+
+from fastapi.responses import StreamingResponse
+
+from .json_cache import encode_json
+
+logger = logging.getLogger(__name__)
+
+_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+
+async def _guarded(records: AsyncIterator[Dict]) -> AsyncIterator[Dict]:
+    # depois do primeiro byte o status HTTP já foi enviado: erro vira um registro final
+    try:
+        async for record in records:
+            yield record
+    except Exception as exc:  # noqa: BLE001
+        logger.warning("Falha durante resposta em streaming: %s", exc)
+        yield {"type": "error", "detail": f"{type(exc).__name__}: {exc}"}
+
+
+async def _ndjson(records: AsyncIterator[Dict]) -> AsyncIterator[bytes]:
+    async for record in _guarded(records):
+        yield encode_json(record) + b"\n"
+
+
+async def _sse(records: AsyncIterator[Dict]) -> AsyncIterator[bytes]:
+    async for record in _guarded(records):
+        event = str(record.get("type") or "message").lower()
+        yield b"event: " + event.encode() + b"\ndata: " + encode_json(record) + b"\n\n"
+
+
+def streaming_response(records: AsyncIterator[Dict], fmt: str) -> StreamingResponse:
+    """
+    Args:
+        records: registros na ordem em que devem sair
+        fmt: "ndjson" (uma linha JSON por registro) ou "sse" (evento = campo "type")
+    """
+    body = _sse(records) if fmt == "sse" else _ndjson(records)
+    return StreamingResponse(
+        body,
+        media_type=_MEDIA_TYPES[fmt],
+        # sem cache e sem buffer em proxies (nginx), para cada registro sair na hora
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
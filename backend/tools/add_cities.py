@@ -3,10 +3,13 @@ import csv, json, sys
 from pathlib import Path
 
 ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
 IBGE_DIR = ROOT / "data" / "ibge"
 MUN_JSON = IBGE_DIR / "municipios.json"
 MUN_GEOJSON = IBGE_DIR / "municipios.geojson"
 
+from app.services.regions import build_region_stores  # noqa: E402
+
 def load_json(path: Path):
     if not path.exists():
         return None
@@ -24,7 +27,12 @@ def add_city(uf: str, nome: str, lat: float, lon: float, box: float = 0.15):
     # atualiza municipios.json
     mun = load_json(MUN_JSON) or []
     if not any(m.get("uf")==uf and str(m.get("nome","")).lower()==nome.lower() for m in mun):
-        mun.append({"uf": uf, "nome": nome, "centroid": {"lat": lat, "lon": lon}})
+        mun.append({
+            "uf": uf,
+            "nome": nome,
+            "centroid": {"lat": lat, "lon": lon},
+            "bbox": [lon - box, lat - box, lon + box, lat + box],
+        })
         MUN_JSON.write_text(json.dumps(mun, ensure_ascii=False, indent=2), encoding="utf-8")
 
     # adiciona polígono retangular em municipios.geojson
@@ -58,6 +66,9 @@ def main():
             lat = float(row["lat"])
             lon = float(row["lon"])
             add_city(uf, nome, lat, lon)
+    # o app lê as geometrias do .geostore: regenera a partir do GeoJSON atualizado
+    for path in build_region_stores():
+        print(f"OK: {path} regenerado.")
 
 if __name__ == "__main__":
     main()
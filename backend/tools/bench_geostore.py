@@ -0,0 +1,87 @@
+# backend/tools/bench_geostore.py
+"""
+Benchmark do GeoStore: N municípios sintéticos (polígonos de V vértices numa
+grade sobre o Brasil), comparando carregar o GeoJSON indentado (leitura +
+decodificação) com abrir o .geostore via mmap, e o custo de montar o GeoJSON
+de uma UF sob demanda. Confere que a UF montada é igual à original.
+
+Uso: python tools/bench_geostore.py [N] [V]
+(padrão: N=5570, V=400)
+"""
+import gc, json, math, os, sys, tempfile, time, tracemalloc
+from pathlib import Path
+
+import orjson
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.utils.geostore import GeoStore, write_store  # noqa: E402
+
+UFS = ["AC", "AL", "AM", "AP", "BA", "CE", "DF", "ES", "GO", "MA", "MG", "MS", "MT", "PA", "PB", "PE", "PI",
+       "PR", "RJ", "RN", "RO", "RR", "RS", "SC", "SE", "SP", "TO"]
+
+def _collection(n, vertices):
+    side = math.ceil(math.sqrt(n))
+    cell = 35.0 / side
+    features = []
+    for i in range(n):
+        cx, cy = -73.0 + (i % side + 0.5) * cell, 5.0 - (i // side + 0.5) * cell
+        ring = [
+            [round(cx + cell / 2 * math.cos(2 * math.pi * k / vertices), 6),
+             round(cy + cell / 2 * math.sin(2 * math.pi * k / vertices), 6)]
+            for k in range(vertices)
+        ]
+        ring.append(ring[0])
+        features.append({
+            "type": "Feature",
+            "properties": {"nome": f"Município {i}", "uf": UFS[i * len(UFS) // n]},
+            "geometry": {"type": "Polygon", "coordinates": [ring]},
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+def _measure(load):
+    """(tempo sem tracemalloc, heap retido medido numa segunda carga)"""
+    gc.collect()
+    t0 = time.perf_counter()
+    load()
+    dt = time.perf_counter() - t0
+    tracemalloc.start()
+    kept = load()  # noqa: F841
+    heap = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return dt, heap
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5570
+    vertices = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+    collection = _collection(n, vertices)
+    groups = {}
+    for i, f in enumerate(collection["features"]):
+        groups.setdefault(f["properties"]["uf"], []).append(i)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        geojson = Path(tmp) / "municipios.geojson"
+        geojson.write_text(json.dumps(collection, ensure_ascii=False, indent=2), encoding="utf-8")
+        store_path = Path(tmp) / "municipios.geostore"
+        write_store(store_path, {None: collection["features"]}, {"groups": groups})
+        print(f"N={n}, V={vertices}: GeoJSON {os.path.getsize(geojson) / 2**20:.1f} MB, "
+              f"geostore {os.path.getsize(store_path) / 2**20:.1f} MB")
+
+        dt, heap = _measure(lambda: GeoStore.open(store_path))
+        print(f"mmap   : abertura em {dt * 1000:6.2f} ms, heap {heap / 2**20:6.2f} MB")
+        dt, heap = _measure(lambda: orjson.loads(geojson.read_bytes()))
+        print(f"GeoJSON: carga em {dt * 1000:7.1f} ms, heap {heap / 2**20:6.1f} MB")
+
+        store = GeoStore.open(store_path)
+
+        ids = groups["SP"]
+        t0 = time.perf_counter()
+        part = [store.feature(i) for i in ids]
+        dt = time.perf_counter() - t0
+        print(f"UF SP  : {len(ids)} features montadas em {dt * 1000:.1f} ms")
+        assert part == [collection["features"][i] for i in ids]
+        print("conteúdo idêntico ao original")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# backend/tools/bench_json.py
+"""
+Benchmark de serialização das respostas: JSONResponse (json da stdlib, caminho
+antigo) x ORJSONResponse x corpo já codificado em EncodedCache.
+
+Payloads sintéticos no formato das respostas reais:
+- by-uf: 853 municípios (tamanho de MG) de /risk/by-uf
+- neighborhoods: 300 bairros com polígonos de 64 vértices (/risk/neighborhoods)
+- risk-forecast: /risk/by-city com janela e timeline de 7 dias
+
+Uso: python tools/bench_json.py [repetições]
+"""
+import json, random, sys, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+
+from app.utils.json_cache import EncodedCache  # noqa: E402
+
+def _by_uf(rng):
+    return {
+        "uf": "MG", "complete": True, "total": 853, "failures": [], "pending": [], "elapsed_ms": 1234,
+        "results": [
+            {"city": f"Município {i} de Minas", "uf": "MG", "lat": rng.uniform(-22, -15), "lon": rng.uniform(-51, -40),
+             "risk": "Baixo", "risk_score": round(rng.random(), 3), "forecast_status": "fresh"}
+            for i in range(853)
+        ],
+    }
+
+def _neighborhoods(rng):
+    feats = []
+    for i in range(300):
+        lat, lon = rng.uniform(-23.7, -23.4), rng.uniform(-46.8, -46.4)
+        ring = [[lon + 0.005 * rng.random(), lat + 0.005 * rng.random()] for _ in range(64)]
+        ring.append(ring[0])
+        feats.append({
+            "type": "Feature",
+            "geometry": {"type": "Polygon", "coordinates": [ring]},
+            "properties": {
+                "name": f"Bairro São João {i}", "risk_level": "medium", "color": "#FFA500",
+                "weather": {"total_precipitation_mm": rng.uniform(0, 40), "avg_probability": rng.randint(0, 100),
+                            "max_precipitation_mm": rng.uniform(0, 10)},
+            },
+        })
+    return {"type": "FeatureCollection", "features": feats}
+
+def _risk_forecast(rng):
+    hours = [
+        {"timestamp": f"2026-10-{18 + h // 24:02d}T{h % 24:02d}:00", "temperature": rng.uniform(15, 30),
+         "precipitation": rng.uniform(0, 5), "precipitation_probability": rng.randint(0, 100), "wind_speed": rng.uniform(0, 40)}
+        for h in range(168)
+    ]
+    return {
+        "risk_score": 0.42, "level": "Moderado", "message": "Risco moderado nas próximas horas.",
+        "factors": {"precipitation_6h_mm": 12.3, "wind_avg_6h_kmh": 20.1, "temp_avg_6h_c": 22.0},
+        "forecast_window": hours[:6],
+        "timeline": {"window_hours": 6, "series": [{"timestamp": h["timestamp"], "risk_score": 0.4, "level": "Moderado"} for h in hours]},
+        "location": {"uf": "SP", "city": "São Paulo", "lat": -23.55, "lon": -46.63},
+    }
+
+def _best(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    rng = random.Random(7)
+    payloads = {"by-uf": _by_uf(rng), "neighborhoods": _neighborhoods(rng), "risk-forecast": _risk_forecast(rng)}
+    cache = EncodedCache()
+
+    print(f"{'payload':<15}{'KB':>8}{'json (ms)':>12}{'orjson (ms)':>13}{'cache (ms)':>12}{'speedup':>10}")
+    for name, content in payloads.items():
+        old = JSONResponse(content).body
+        new = ORJSONResponse(content).body
+        cache.get_or_encode(name, lambda: content)
+        t_json = _best(lambda: JSONResponse(content), repeat)
+        t_orjson = _best(lambda: ORJSONResponse(content), repeat)
+        t_cache = _best(lambda: cache.get_or_encode(name, lambda: content), repeat)
+        # mesmo documento, só muda a formatação
+        assert json.loads(old) == json.loads(new)
+        print(f"{name:<15}{len(new) / 1024:>8.0f}{t_json * 1000:>12.2f}{t_orjson * 1000:>13.2f}{t_cache * 1000:>12.4f}{t_json / t_orjson:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
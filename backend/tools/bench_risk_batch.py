@@ -0,0 +1,87 @@
+# backend/tools/bench_risk_batch.py
+"""
+Microbenchmark: compute_risk (um município por vez) x compute_risk_many (lote
+vetorizado) para N localizações com previsões sintéticas, conferindo que os
+resultados são idênticos. A conferência roda também sobre valores escolhidos
+para cair em empates de arredondamento (média x.xx5), onde o lote precisa
+refazer as linhas pelo caminho escalar.
+
+Uso: python tools/bench_risk_batch.py [N] [repetições]
+(padrão: N=5570, o número de municípios do Brasil)
+"""
+import random, sys, time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.utils.hourly_forecast import HourlyForecast, TIME_FORMAT  # noqa: E402
+from app.utils.risk_engine import compute_risk, compute_risk_many  # noqa: E402
+
+HOURS = 24
+
+def _forecast(rng):
+    base = datetime(2024, 1, 1)
+    return HourlyForecast.from_open_meteo({
+        "time": [(base + timedelta(hours=h)).strftime(TIME_FORMAT) for h in range(HOURS)],
+        "temperature_2m": [round(rng.uniform(5, 40), 1) for _ in range(HOURS)],
+        "precipitation": [round(rng.expovariate(0.3), 1) if rng.random() < 0.6 else 0.0 for _ in range(HOURS)],
+        "precipitation_probability": [rng.randint(0, 100) for _ in range(HOURS)],
+        "wind_speed_10m": [None if rng.random() < 0.01 else round(rng.uniform(0, 80), 1) for _ in range(HOURS)],
+    })
+
+def _tie_forecast(rng):
+    # múltiplos de 0.005 (chuva) e de 0.03 (vento, temperatura): somas e médias caem em x.xx5
+    base = datetime(2024, 1, 1)
+    return HourlyForecast.from_open_meteo({
+        "time": [(base + timedelta(hours=h)).strftime(TIME_FORMAT) for h in range(HOURS)],
+        "temperature_2m": [rng.randint(300, 1200) * 0.03 for _ in range(HOURS)],
+        "precipitation": [rng.randint(0, 2000) * 0.005 for _ in range(HOURS)],
+        "precipitation_probability": [rng.randint(0, 100) for _ in range(HOURS)],
+        "wind_speed_10m": [rng.randint(0, 2500) * 0.03 for _ in range(HOURS)],
+    })
+
+def _scalar(forecasts):
+    out = []
+    for fc in forecasts:
+        r = compute_risk(fc)
+        r.pop("forecast_window")
+        out.append(r)
+    return out
+
+def _check(name, forecasts):
+    ref, got = _scalar(forecasts), compute_risk_many(forecasts)
+    if got != ref:
+        diff = next(i for i, (a, b) in enumerate(zip(got, ref)) if a != b)
+        print(f"ERRO ({name}): resultado divergente na posição {diff}: {got[diff]} != {ref[diff]}")
+        sys.exit(1)
+
+def _best(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best, out
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5570
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    rng = random.Random(42)
+    forecasts = [_forecast(rng) for _ in range(n)]
+
+    _check("aleatórios", forecasts)
+    _check("empates", [_tie_forecast(rng) for _ in range(n)])
+
+    t_scalar, _ = _best(lambda: _scalar(forecasts), repeat)
+    t_batch, _ = _best(lambda: compute_risk_many(forecasts), repeat)
+
+    print(f"N={n}  janela={HOURS}h  melhor de {repeat}")
+    print(f"compute_risk (laço): {t_scalar * 1000:8.1f} ms  ({t_scalar / n * 1e6:.1f} µs/local)")
+    print(f"compute_risk_many  : {t_batch * 1000:8.1f} ms  ({t_batch / n * 1e6:.1f} µs/local)")
+    print(f"speedup: {t_scalar / t_batch:.1f}x  (resultados idênticos)")
+
+if __name__ == "__main__":
+    main()
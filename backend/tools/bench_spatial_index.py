@@ -0,0 +1,93 @@
+# backend/tools/bench_spatial_index.py
+"""
+Benchmark do índice espacial de áreas de risco: N polígonos sintéticos
+espalhados pelas regiões metropolitanas, consultas por raio e por bbox via
+R-tree (find_areas_within / find_areas_in_bbox) x varredura completa,
+conferindo que os resultados são iguais.
+
+Uso: python tools/bench_spatial_index.py [N] [consultas]
+(padrão: N=100000, 200 consultas)
+"""
+import random, sys, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.services import risk_areas  # noqa: E402
+from app.utils.geo import polygon_distance_km, polygon_intersects_bbox  # noqa: E402
+
+# (lat, lon) de algumas capitais; polígonos num raio de ~40 km de cada uma
+METROS = [
+    (-23.55, -46.63), (-22.91, -43.17), (-19.92, -43.94), (-25.43, -49.27), (-30.03, -51.23),
+    (-12.97, -38.50), (-8.05, -34.88), (-3.73, -38.52), (-15.79, -47.88), (-1.46, -48.50),
+]
+
+def _polygon(rng, lat, lon):
+    # quadrilátero irregular de ~100 a 600 m
+    size = rng.uniform(0.001, 0.006)
+    ring = [
+        [lon, lat],
+        [lon + size, lat + rng.uniform(-size, size) / 4],
+        [lon + size, lat + size],
+        [lon + rng.uniform(-size, size) / 4, lat + size],
+    ]
+    ring.append(ring[0])
+    return ring
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    rng = random.Random(3)
+
+    areas = []
+    for i in range(n):
+        lat, lon = rng.choice(METROS)
+        areas.append({
+            "name": f"Área {i}",
+            "base_risk": rng.choice(["low", "medium", "high"]),
+            "polygon": _polygon(rng, lat + rng.uniform(-0.35, 0.35), lon + rng.uniform(-0.35, 0.35)),
+        })
+
+    t0 = time.perf_counter()
+    risk_areas.load_risk_areas(areas)
+    print(f"N={n}: índice montado em {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    points = []
+    for _ in range(queries):
+        lat, lon = rng.choice(METROS)
+        points.append((lat + rng.uniform(-0.3, 0.3), lon + rng.uniform(-0.3, 0.3)))
+
+    for radius in (0.5, 2.0, 10.0):
+        t0 = time.perf_counter()
+        found = [risk_areas.find_areas_within(lat, lon, radius) for lat, lon in points]
+        dt = (time.perf_counter() - t0) / queries
+        hits = sum(len(f) for f in found) / queries
+        print(f"raio {radius:>4} km: {dt * 1000:8.3f} ms/consulta  ({hits:.0f} áreas em média)")
+
+    for side in (0.01, 0.05):
+        boxes = [(lon - side, lat - side, lon + side, lat + side) for lat, lon in points]
+        t0 = time.perf_counter()
+        found_box = [risk_areas.find_areas_in_bbox(b) for b in boxes]
+        dt = (time.perf_counter() - t0) / queries
+        hits = sum(len(f) for f in found_box) / queries
+        print(f"bbox {2 * side:.2f}°   : {dt * 1000:8.3f} ms/consulta  ({hits:.0f} áreas em média)")
+
+    # conferência com varredura completa (algumas consultas)
+    sample = points[:5]
+    t0 = time.perf_counter()
+    for lat, lon in sample:
+        brute = sorted(
+            ((i, d) for i, a in enumerate(areas) if (d := polygon_distance_km(lat, lon, [a["polygon"]])) <= 2.0),
+            key=lambda item: (item[1], item[0]),
+        )
+        assert brute == risk_areas.find_areas_within(lat, lon, 2.0)
+    scan = (time.perf_counter() - t0) / len(sample)
+    for lat, lon in sample:
+        box = (lon - 0.01, lat - 0.01, lon + 0.01, lat + 0.01)
+        brute = [i for i, a in enumerate(areas) if polygon_intersects_bbox([a["polygon"]], box)]
+        assert brute == risk_areas.find_areas_in_bbox(box)
+    print(f"varredura completa (raio 2 km): {scan * 1000:.0f} ms/consulta (resultados idênticos)")
+
+if __name__ == "__main__":
+    main()
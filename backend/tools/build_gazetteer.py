@@ -0,0 +1,141 @@
+# backend/tools/build_gazetteer.py
+"""
+Gera data/ibge/municipios.json com TODOS os municípios do IBGE:
+código, nome, UF, centroide e bbox (calculados a partir da malha municipal).
+
+Uso: python tools/build_gazetteer.py [UF ...]
+     (sem argumentos processa as 27 UFs)
+     python tools/build_gazetteer.py --bbox-from-geojson
+     (offline: preenche a bbox que faltar a partir de data/ibge/municipios.geojson)
+"""
+import json, sys, unicodedata
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[1]
+MUN_JSON = ROOT / "data" / "ibge" / "municipios.json"
+MUN_GEOJSON = ROOT / "data" / "ibge" / "municipios.geojson"
+
+LOCALIDADES_URL = "https://servicodados.ibge.gov.br/api/v1/localidades/municipios?view=nivelado"
+MALHA_URL = (
+    "https://servicodados.ibge.gov.br/api/v3/malhas/estados/{uf}"
+    "?formato=application/vnd.geo+json&intrarregiao=municipio&qualidade=minima"
+)
+
+UFS = [
+    "AC", "AL", "AP", "AM", "BA", "CE", "DF", "ES", "GO", "MA", "MT", "MS", "MG", "PA",
+    "PB", "PR", "PE", "PI", "RJ", "RN", "RS", "RO", "RR", "SC", "SP", "SE", "TO",
+]
+
+def _rings(geometry):
+    if not geometry:
+        return []
+    if geometry["type"] == "Polygon":
+        return [geometry["coordinates"][0]]
+    if geometry["type"] == "MultiPolygon":
+        return [poly[0] for poly in geometry["coordinates"]]
+    return []
+
+def centroid_and_bbox(geometry):
+    """Centroide ponderado pela área (fórmula do polígono) e bbox do anel externo."""
+    area_sum = cx_sum = cy_sum = 0.0
+    min_lon = min_lat = float("inf")
+    max_lon = max_lat = float("-inf")
+    for ring in _rings(geometry):
+        for x, y in ring:
+            min_lon, max_lon = min(min_lon, x), max(max_lon, x)
+            min_lat, max_lat = min(min_lat, y), max(max_lat, y)
+        for (x0, y0), (x1, y1) in zip(ring, ring[1:]):
+            cross = x0 * y1 - x1 * y0
+            area_sum += cross
+            cx_sum += (x0 + x1) * cross
+            cy_sum += (y0 + y1) * cross
+    if min_lon == float("inf"):
+        return None, None
+    if abs(area_sum) < 1e-12:
+        centroid = {"lat": (min_lat + max_lat) / 2, "lon": (min_lon + max_lon) / 2}
+    else:
+        centroid = {"lat": round(cy_sum / (3 * area_sum), 5), "lon": round(cx_sum / (3 * area_sum), 5)}
+    bbox = [round(min_lon, 5), round(min_lat, 5), round(max_lon, 5), round(max_lat, 5)]
+    return centroid, bbox
+
+def _key(nome, uf):
+    nome = unicodedata.normalize("NFKD", nome or "").encode("ascii", "ignore").decode()
+    return " ".join(nome.lower().split()), (uf or "").upper()
+
+def _inline(value):
+    if isinstance(value, dict):
+        return "{ " + ", ".join(f"{json.dumps(k)}: {_inline(v)}" for k, v in value.items()) + " }"
+    return json.dumps(value, ensure_ascii=False, separators=(", ", ": "))
+
+def _dumps(rows):
+    # um campo por linha, centroide e bbox inline (formato do arquivo versionado)
+    items = [
+        "  {\n" + ",\n".join(f"    {json.dumps(k)}: {_inline(v)}" for k, v in row.items()) + "\n  }"
+        for row in rows
+    ]
+    return "[\n" + ",\n".join(items) + "\n]\n"
+
+def fill_bbox_from_geojson():
+    """Completa a bbox das entradas sem bbox com a geometria de municipios.geojson (nome + UF)."""
+    mun = json.loads(MUN_JSON.read_text(encoding="utf-8-sig"))
+    gj = json.loads(MUN_GEOJSON.read_text(encoding="utf-8-sig"))
+    boxes = {}
+    for f in gj.get("features", []):
+        props = f.get("properties") or {}
+        _, bbox = centroid_and_bbox(f.get("geometry"))
+        if bbox is not None:
+            boxes[_key(props.get("nome"), props.get("uf") or props.get("UF"))] = bbox
+    filled = 0
+    for m in mun:
+        if not m.get("bbox") and _key(m.get("nome"), m.get("uf")) in boxes:
+            m["bbox"] = boxes[_key(m.get("nome"), m.get("uf"))]
+            filled += 1
+        elif not m.get("bbox"):
+            print(f"AVISO: sem geometria para {m.get('nome')}/{m.get('uf')}")
+    MUN_JSON.write_text(_dumps(mun), encoding="utf-8")
+    print(f"OK: bbox preenchida em {filled} municípios de {MUN_JSON}")
+
+def main():
+    if sys.argv[1:] == ["--bbox-from-geojson"]:
+        fill_bbox_from_geojson()
+        return
+    ufs = [a.upper() for a in sys.argv[1:]] or UFS
+    with httpx.Client(timeout=60) as client:
+        r = client.get(LOCALIDADES_URL)
+        r.raise_for_status()
+        names = {
+            int(m["municipio-id"]): (m["municipio-nome"], m["UF-sigla"])
+            for m in r.json()
+        }
+
+        geo = {}
+        for uf in ufs:
+            r = client.get(MALHA_URL.format(uf=uf))
+            r.raise_for_status()
+            for f in r.json().get("features", []):
+                code = int(f["properties"]["codarea"])
+                geo[code] = centroid_and_bbox(f.get("geometry"))
+            print(f"OK: malha {uf}")
+
+    # preserva entradas manuais (tools/add_cities.py) de UFs não reprocessadas
+    old = []
+    if MUN_JSON.exists():
+        old = json.loads(MUN_JSON.read_text(encoding="utf-8-sig"))
+    out = [m for m in old if m.get("uf") not in ufs]
+
+    for code, (nome, uf) in sorted(names.items()):
+        if uf not in ufs:
+            continue
+        centroid, bbox = geo.get(code, (None, None))
+        if centroid is None:
+            print(f"AVISO: sem malha para {nome}/{uf} ({code})")
+            continue
+        out.append({"codigo": code, "uf": uf, "nome": nome, "centroid": centroid, "bbox": bbox})
+
+    MUN_JSON.write_text(json.dumps(out, ensure_ascii=False, indent=1), encoding="utf-8")
+    print(f"OK: {len(out)} municípios gravados em {MUN_JSON}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+# backend/tools/build_geostore.py
+"""
+Gera data/ibge/uf.geostore e data/ibge/municipios.geostore a partir do GeoJSON
+(uf.json, municipios.geojson): geometrias em vetores binários com a pirâmide de
+LOD já calculada, abertos com mmap por app/services/regions.py.
+
+Rodar sempre que o GeoJSON de data/ibge mudar (tools/add_cities.py já roda).
+
+Uso: python tools/build_geostore.py
+"""
+import sys, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.services.regions import build_region_stores  # noqa: E402
+
+def main():
+    t0 = time.perf_counter()
+    written = build_region_stores()
+    if not written:
+        print("ERRO: nenhum GeoJSON encontrado em data/ibge")
+        sys.exit(1)
+    for path, size in written.items():
+        print(f"OK: {path} ({size / 1024:.1f} KB)")
+    print(f"Concluído em {time.perf_counter() - t0:.1f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+# backend/tools/preload_geocode.py
+"""
+Pré-carrega coordenadas de bairros no cache persistente de geocodificação,
+evitando consultas ao Nominatim para bairros já conhecidos.
+
+Uso: python tools/preload_geocode.py bairros.csv
+CSV esperado: uf,cidade,bairro,lat,lon
+"""
+import csv, sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.services.geocode import _normalize  # noqa: E402
+from app.services.geocode_store import geocode_store  # noqa: E402
+
+def main():
+    if len(sys.argv) < 2:
+        print("Uso: python tools/preload_geocode.py bairros.csv")
+        print("CSV esperado: uf,cidade,bairro,lat,lon")
+        sys.exit(1)
+    items = []
+    with open(sys.argv[1], newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            key = f"{_normalize(row['bairro'])}|{_normalize(row['cidade'])}|{row['uf'].strip().lower()}"
+            items.append((key, {"lat": float(row["lat"]), "lon": float(row["lon"])}))
+    n = geocode_store.preload("district", items)
+    print(f"OK: {n} bairros gravados em {geocode_store.path}")
+
+if __name__ == "__main__":
+    main()
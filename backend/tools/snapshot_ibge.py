@@ -0,0 +1,34 @@
+# backend/tools/snapshot_ibge.py
+"""
+Gera data/ibge/localidades.json: snapshot do catálogo de estados e municípios
+do IBGE usado por app/services/ibge_catalog.py quando não há cópia local.
+
+Rodar quando o IBGE publicar alterações (criação de municípios, raro).
+
+Uso: python tools/snapshot_ibge.py
+"""
+import json, sys, time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.services.ibge_catalog import IBGE_LOCALIDADES_URL, SNAPSHOT_PATH, _from_nivelado  # noqa: E402
+
+def main():
+    r = httpx.get(IBGE_LOCALIDADES_URL, timeout=60)
+    r.raise_for_status()
+    municipios = _from_nivelado(r.json())
+    if not municipios:
+        print("ERRO: resposta vazia do IBGE")
+        sys.exit(1)
+    data = {"etag": r.headers.get("ETag"), "fetched_at": time.time(), "municipios": municipios}
+    SNAPSHOT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    SNAPSHOT_PATH.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    ufs = {m["uf"] for m in municipios}
+    print(f"OK: {len(municipios)} municípios de {len(ufs)} UFs gravados em {SNAPSHOT_PATH}")
+
+if __name__ == "__main__":
+    main()